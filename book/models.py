@@ -16,7 +16,21 @@ class Book(Document):
     meta = {
         'db_alias': 'book',  # Sử dụng kết nối đã định nghĩa ở trên
         'collection': 'books',  # Tên collection trong MongoDB
-        'ordering': ['-created']
+        'ordering': ['-created'],
+        # Index chỉ được tạo bởi `manage.py catalog_indexes --build`, không tạo ngầm khi save
+        'auto_create_index': False,
+        'indexes': [
+            # Text index cho tìm kiếm theo tiêu đề / tác giả
+            {
+                'fields': ['$title', '$author'],
+                'default_language': 'none',
+                'weights': {'title': 10, 'author': 5},
+            },
+            # Danh sách mặc định + phân trang keyset theo (created, id)
+            ('-created', '-id'),
+            # Lọc sản phẩm còn hàng theo khoảng giá
+            ('available', 'price'),
+        ]
     }
 
     def __str__(self):
@@ -1,7 +1,8 @@
 from rest_framework_mongoengine.serializers import DocumentSerializer
+from ecommerce.fieldsets import SparseFieldsetSerializerMixin
 from .models import Book
 
-class BookSerializer(DocumentSerializer):
+class BookSerializer(SparseFieldsetSerializerMixin, DocumentSerializer):
     class Meta:
         model = Book
         fields = '__all__'
\ No newline at end of file
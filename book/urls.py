@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from ecommerce.pagination import StandardResultsSetPagination
 from .views import BookViewSet, BookDetailView, BookListView, BookCreateView
 
 router = DefaultRouter()
@@ -12,4 +13,8 @@ urlpatterns = [
     # Optional: class-based view URLs if you need them separately
     path('list/', BookListView.as_view(), name='book-list'),
     path('detail/<str:id>/', BookDetailView.as_view(), name='book-detail'),
+    path('batch/', BookViewSet.as_view({'post': 'batch'}), name='book-batch'),
+    path('search/', BookViewSet.as_view({'get': 'search'}, pagination_class=StandardResultsSetPagination),
+         name='book-search'),
+    path('facets/', BookViewSet.as_view({'get': 'facets'}), name='book-facets'),
 ]
\ No newline at end of file
@@ -2,18 +2,39 @@ from rest_framework_mongoengine.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from ecommerce.fieldsets import SparseFieldsetMixin
+from ecommerce.filters import CatalogFilterMixin, CatalogFilterSet
+from ecommerce.mixins import BatchRetrieveMixin, LazyQuerySet
+from ecommerce.pagination import CreatedKeysetPagination, StandardResultsSetPagination
+from ecommerce.product_cache import product_cache
+from ecommerce.search import search_backend
 from .models import Book
 from .serializers import BookSerializer
 
 from rest_framework import generics, permissions
 import datetime
 
-class BookListView(generics.ListCreateAPIView):
+BOOK_FILTERSET = CatalogFilterSet(
+    Book,
+    filters={
+        'author': 'in',
+        'publisher': 'in',
+        'available': 'bool',
+        'price': 'range',
+    },
+    ordering=('price', 'created', 'title', 'publication_date'),
+    facets=('author', 'publisher'),
+    price_buckets=(0, 10, 25, 50, 100),
+)
+
+class BookListView(SparseFieldsetMixin, CatalogFilterMixin, generics.ListCreateAPIView):
     """
     Tạo sách mới hoặc lấy danh sách tất cả sách.
     """
-    queryset = Book.objects.all()
+    queryset = LazyQuerySet(Book)
     serializer_class = BookSerializer
+    pagination_class = CreatedKeysetPagination
+    filterset = BOOK_FILTERSET
     # permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
@@ -22,6 +43,7 @@ class BookListView(generics.ListCreateAPIView):
         serializer.validated_data['created'] = current_time
         serializer.validated_data['updated'] = current_time
         serializer.save()
+        search_backend.update(serializer.instance)
 
     def list(self, request, *args, **kwargs):
         # Lấy danh sách tất cả sách, mặc định sắp xếp theo thời gian tạo mới nhất
@@ -36,11 +58,11 @@ class BookListView(generics.ListCreateAPIView):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-class BookDetailView(generics.RetrieveUpdateDestroyAPIView):
+class BookDetailView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Xem chi tiết, cập nhật hoặc xóa một quyển sách.
     """
-    queryset = Book.objects.all()
+    queryset = LazyQuerySet(Book)
     serializer_class = BookSerializer
     # permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'  # MongoEngine sử dụng id dạng ObjectId
@@ -49,6 +71,13 @@ class BookDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Cập nhật lại trường updated khi cập nhật sách
         serializer.validated_data['updated'] = datetime.datetime.now()
         serializer.save()
+        search_backend.update(serializer.instance)
+        product_cache.invalidate('book', serializer.instance.id)
+
+    def perform_destroy(self, instance):
+        search_backend.remove(type(instance), instance.id)
+        product_cache.invalidate('book', instance.id)
+        instance.delete()
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -58,7 +87,7 @@ class BookCreateView(generics.CreateAPIView):
     """
     Tạo sách mới.
     """
-    queryset = Book.objects.all()
+    queryset = LazyQuerySet(Book)
     serializer_class = BookSerializer
     # permission_classes = [permissions.IsAuthenticated]
     # authentication_classes = [BearerTokenAuthentication]
@@ -69,6 +98,7 @@ class BookCreateView(generics.CreateAPIView):
         serializer.validated_data['created'] = current_time
         serializer.validated_data['updated'] = current_time
         serializer.save()
+        search_backend.update(serializer.instance)
 
     # @action(detail=True, methods=['post'])
     def create(self, request, *args, **kwargs):
@@ -94,34 +124,47 @@ class BookCreateView(generics.CreateAPIView):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-class BookViewSet(ModelViewSet):
+class BookViewSet(SparseFieldsetMixin, CatalogFilterMixin, BatchRetrieveMixin, ModelViewSet):
     serializer_class = BookSerializer
     lookup_field = 'id'  # MongoEngine sử dụng id dạng ObjectId
-    queryset = Book.objects.all()
+    queryset = LazyQuerySet(Book)
+    pagination_class = CreatedKeysetPagination
+    filterset = BOOK_FILTERSET
 
     def perform_create(self, serializer):
         # Cập nhật thời gian tạo và cập nhật
         serializer.validated_data['created'] = serializer.validated_data.get('created', None) or datetime.datetime.utcnow()
         serializer.validated_data['updated'] = datetime.datetime.utcnow()
         serializer.save()
+        search_backend.update(serializer.instance)
 
     def perform_update(self, serializer):
         # Cập nhật lại trường updated khi cập nhật sách
         serializer.validated_data['updated'] = datetime.datetime.utcnow()
         serializer.save()
+        search_backend.update(serializer.instance)
+        product_cache.invalidate('book', serializer.instance.id)
+
+    def perform_destroy(self, instance):
+        search_backend.remove(type(instance), instance.id)
+        product_cache.invalidate('book', instance.id)
+        instance.delete()
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=StandardResultsSetPagination)
     def search(self, request):
         """
         Tìm kiếm sách theo tiêu đề hoặc tác giả.
         Ví dụ: /api/books/search/?q=Harry
+        Kết quả được sắp xếp theo độ liên quan và phân trang (?page=).
         """
         query = request.query_params.get('q', '')
         if not query:
             return Response({"detail": "Please provide a search query using parameter 'q'."}, status=status.HTTP_400_BAD_REQUEST)
-        books = Book.objects.filter(title__icontains=query) | Book.objects.filter(author__icontains=query)
-        serializer = self.get_serializer(books, many=True)
-        return Response(serializer.data)
+        # Tìm kiếm full-text (không phân biệt hoa thường và dấu), xếp theo độ liên quan
+        books = search_backend.search(Book, query)
+        page = self.paginate_queryset(books)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['patch'])
     def update_price(self, request, id=None):
@@ -138,6 +181,7 @@ class BookViewSet(ModelViewSet):
             book.price = float(new_price)
             book.updated = datetime.datetime.utcnow()
             book.save()
+            product_cache.invalidate('book', book.id)
             serializer = self.get_serializer(book)
             return Response(serializer.data)
         except Exception as e:
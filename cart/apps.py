@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cart'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from ecommerce.connections import create_cache_tables
+        # Cache 'shared' (DatabaseCache) cần bảng trước khi cart / payment / idempotency dùng tới
+        post_migrate.connect(create_cache_tables, sender=self, dispatch_uid='ecommerce.create_cache_tables')
@@ -0,0 +1,193 @@
+"""
+HTTP clients for the services the cart depends on (product catalogs, customer).
+
+All calls share one pooled ``requests.Session`` so connections are kept alive
+between requests. Batched product lookups go through each catalog's
+``batch/`` endpoint and run concurrently on a bounded thread pool: the latency
+of ``fetch_products`` is that of the slowest lookup, not the sum of all of them.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from ecommerce.instrumentation import InstrumentedSession
+from ecommerce.product_cache import PRODUCT_BATCH_SIZE, SNAPSHOT_FIELDS, product_cache
+
+PRODUCT_SERVICE_URLS = getattr(settings, 'PRODUCT_SERVICE_URLS', {
+    'book': 'http://127.0.0.1:9191/api/books',
+    'mobile': 'http://127.0.0.1:9191/api/mobile',
+    'shoes': 'http://127.0.0.1:9191/api/shoes',
+    'clothes': 'http://127.0.0.1:9191/api/clothes',
+})
+# Đường dẫn chi tiết sản phẩm theo từng service (mặc định: '<base>/<id>/')
+PRODUCT_DETAIL_PATHS = getattr(settings, 'PRODUCT_DETAIL_PATHS', {
+    'book': 'detail/{id}/',
+})
+CUSTOMER_SERVICE_URL = getattr(settings, 'CUSTOMER_SERVICE_URL',
+                               "http://127.0.0.1:9191/api/customer/")
+
+SERVICE_TIMEOUT = getattr(settings, 'SERVICE_CLIENT_TIMEOUT', 5)
+SERVICE_POOL_SIZE = getattr(settings, 'SERVICE_CLIENT_POOL_SIZE', 20)
+SERVICE_MAX_WORKERS = getattr(settings, 'SERVICE_CLIENT_MAX_WORKERS', 10)
+
+
+class ServiceClient:
+    """
+    Base client holding a keep-alive connection pool and a bounded worker pool.
+    """
+    # Nhãn ``service`` trong metrics service_request_*
+    service = None
+
+    def __init__(self, timeout=SERVICE_TIMEOUT, pool_size=SERVICE_POOL_SIZE,
+                 max_workers=SERVICE_MAX_WORKERS):
+        self.timeout = timeout
+        # Thời gian các call được tính vào request đang chạy (Server-Timing)
+        self.session = InstrumentedSession(service=self.service)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=self.__class__.__name__,
+        )
+
+    def get_json(self, url, service_name):
+        """GET ``url`` and return ``(data, error)`` like the cart views expect."""
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            if response.status_code == 200:
+                return response.json(), None
+            return None, f"{service_name} error: {response.status_code}"
+        except requests.RequestException as e:
+            return None, f"{service_name} unavailable: {str(e)}"
+
+
+class ProductServiceClient(ServiceClient):
+    """
+    Client for the catalog services (book, mobile, shoes, clothes).
+    """
+    service = 'product'
+
+    def __init__(self, base_urls=None, detail_paths=None, batch_size=PRODUCT_BATCH_SIZE,
+                 cache=product_cache, **kwargs):
+        super().__init__(**kwargs)
+        self.batch_size = batch_size
+        self.cache = cache
+        self.base_urls = base_urls if base_urls is not None else PRODUCT_SERVICE_URLS
+        self.detail_paths = detail_paths if detail_paths is not None else PRODUCT_DETAIL_PATHS
+
+    def product_url(self, product_type, product_id):
+        product_type = product_type.lower()
+        base_url = self.base_urls.get(product_type)
+        if not base_url:
+            return None
+        path = self.detail_paths.get(product_type, '{id}/')
+        return f"{base_url.rstrip('/')}/{path.format(id=product_id)}"
+
+    def fetch_product(self, product_type, product_id):
+        """Fetch one product (read through the cache), returning ``(product_data, error)``."""
+        if self.cache is not None:
+            cached = self.cache.get(product_type, product_id)
+            if cached is not None:
+                return cached, None
+        url = self.product_url(product_type, product_id)
+        if url is None:
+            return None, f"Unsupported product type: {product_type}"
+        product_data, error = self.get_json(url, "Product service")
+        if product_data is not None and self.cache is not None:
+            self.cache.set(product_type, product_id, product_data)
+        return product_data, error
+
+    def batch_url(self, product_type):
+        base_url = self.base_urls.get(product_type.lower())
+        if not base_url:
+            return None
+        return f"{base_url.rstrip('/')}/batch/"
+
+    def fetch_batch(self, product_type, product_ids):
+        """
+        Resolve many products of one type with a single ``POST batch/`` call.
+
+        Returns ``{product_id: (product_data, error)}``.
+        """
+        url = self.batch_url(product_type)
+        if url is None:
+            error = f"Unsupported product type: {product_type}"
+            return {product_id: (None, error) for product_id in product_ids}
+        try:
+            response = self.session.post(url, json={'ids': product_ids, 'fields': list(SNAPSHOT_FIELDS)}, timeout=self.timeout)
+            if response.status_code != 200:
+                error = f"Product service error: {response.status_code}"
+                return {product_id: (None, error) for product_id in product_ids}
+            results = response.json().get('results', {})
+        except (requests.RequestException, ValueError) as e:
+            error = f"Product service unavailable: {str(e)}"
+            return {product_id: (None, error) for product_id in product_ids}
+        return {
+            product_id: (results[product_id], None) if results.get(product_id)
+            else (None, f"Product not found: {product_id}")
+            for product_id in product_ids
+        }
+
+    def fetch_products(self, products):
+        """
+        Fetch many products concurrently.
+
+        ``products`` is an iterable of ``(product_type, product_id)`` pairs;
+        the result is a list of ``(product_data, error)`` in the same order.
+        Cached snapshots are served directly; the misses are grouped by type
+        and resolved through the catalogs' batch endpoints, one request per
+        ``batch_size`` ids, all in parallel.
+        """
+        products = [(product_type, str(product_id)) for product_type, product_id in products]
+        resolved = {}
+        ids_by_type = {}
+        for product_type, product_id in dict.fromkeys(products):
+            cached = self.cache.get(product_type, product_id) if self.cache is not None else None
+            if cached is not None:
+                resolved[(product_type, product_id)] = (cached, None)
+            else:
+                ids_by_type.setdefault(product_type, []).append(product_id)
+
+        futures = {}
+        for product_type, product_ids in ids_by_type.items():
+            for start in range(0, len(product_ids), self.batch_size):
+                chunk = product_ids[start:start + self.batch_size]
+                # Chạy trong bản sao context của request để instrumentation ghi nhận call
+                futures[(product_type, start)] = self.executor.submit(
+                    contextvars.copy_context().run, self.fetch_batch, product_type, chunk
+                )
+
+        for (product_type, _), future in futures.items():
+            for product_id, (product_data, error) in future.result().items():
+                if product_data is not None and self.cache is not None:
+                    self.cache.set(product_type, product_id, product_data)
+                resolved[(product_type, product_id)] = (product_data, error)
+        return [resolved[key] for key in products]
+
+
+class CustomerServiceClient(ServiceClient):
+    """
+    Client for the customer service.
+    """
+    service = 'customer'
+
+    def __init__(self, base_url=None, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url or CUSTOMER_SERVICE_URL
+
+    def fetch_customer(self, customer_id):
+        """Fetch customer data, returning ``(customer_data, error)``."""
+        return self.get_json(f"{self.base_url}{customer_id}/", "Customer service")
+
+
+product_client = ProductServiceClient()
+customer_client = CustomerServiceClient()
+
+
+def fetch_products(products):
+    """Shortcut for ``product_client.fetch_products``."""
+    return product_client.fetch_products(products)
@@ -0,0 +1,89 @@
+"""
+Benchmark các query của cart view trước / sau khi có index.
+
+    python manage.py bench_cart_queries                      # seed 1M cart + 1M item
+    python manage.py bench_cart_queries --rows 100000 --runs 500
+    python manage.py bench_cart_queries --skip-seed --keep   # dùng lại dữ liệu đã seed
+    python manage.py bench_cart_queries --destructive        # đo thêm khi chưa có index (chỉ DEBUG)
+
+Dữ liệu seed có ``customer_id`` bắt đầu bằng ``bench-`` và bị xóa khi kết thúc
+(trừ khi có ``--keep``).
+"""
+import random
+
+from cart.models import Cart, CartItem
+from ecommerce import benchmark
+
+BENCH_PREFIX = 'bench-'
+PRODUCT_TYPES = ('book', 'mobile', 'shoes', 'clothes')
+
+
+class Command(benchmark.QueryBenchmarkCommand):
+    help = 'Seed carts and report p50/p99 latency of the cart view querysets with and without indexes.'
+    model = Cart
+    rows_help = 'Carts (and cart items) to seed.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--customers', type=int, default=50_000, help='Distinct customer_id values.')
+
+    def seeded_carts(self, using):
+        return Cart.objects.using(using).filter(customer_id__startswith=BENCH_PREFIX)
+
+    def cases(self, using, options):
+        items = list(
+            CartItem.objects.using(using)
+            .filter(cart__customer_id__startswith=BENCH_PREFIX)
+            .values_list('cart_id', 'product_type', 'product_id')[:10_000]
+        )
+        if not items:
+            return {}
+        customers = min(options['customers'], self.seeded_carts(using).count())
+        rng = random.Random(0)
+        return {
+            'CustomerCartView': lambda: list(
+                Cart.objects.using(using)
+                .filter(customer_id=f'{BENCH_PREFIX}{rng.randrange(customers)}')
+                .with_totals().order_by('-created', '-id')[:20]
+            ),
+            'CartListView': lambda: list(
+                Cart.objects.using(using).with_totals().order_by('-created', '-id')[:20]
+            ),
+            'CartItem (cart, type, product)': lambda: (
+                CartItem.objects.using(using).filter(
+                    **dict(zip(('cart_id', 'product_type', 'product_id'), rng.choice(items)))
+                ).first()
+            ),
+        }
+
+    def indexes(self):
+        return benchmark.model_indexes(Cart) + benchmark.model_indexes(CartItem)
+
+    def describe(self, using):
+        return f"{self.seeded_carts(using).count()} carts"
+
+    def cleanup(self, using):
+        CartItem.objects.using(using).filter(cart__customer_id__startswith=BENCH_PREFIX).delete()
+        self.seeded_carts(using).delete()
+
+    def seed(self, using, options):
+        rows, customers, batch_size = options['rows'], options['customers'], options['batch_size']
+        self.stdout.write(f"Seeding {rows} carts and {rows} cart items ...")
+        benchmark.seed(
+            Cart,
+            lambda i: Cart(customer_id=f'{BENCH_PREFIX}{i % customers}'),
+            rows, using, batch_size=batch_size, progress=self.progress,
+        )
+        cart_ids = list(self.seeded_carts(using).order_by('id').values_list('id', flat=True))
+        benchmark.seed(
+            CartItem,
+            lambda i: CartItem(
+                cart_id=cart_ids[i % len(cart_ids)],
+                product_type=PRODUCT_TYPES[i % len(PRODUCT_TYPES)],
+                product_id=f'product-{i}',
+                product_name=f'Product {i}',
+                quantity=1 + i % 5,
+                price='10.00',
+            ),
+            rows, using, batch_size=batch_size, progress=self.progress,
+        )
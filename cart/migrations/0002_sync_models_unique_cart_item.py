@@ -0,0 +1,85 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import Cast
+
+
+def copy_user_to_customer_id(apps, schema_editor):
+    """Cart cũ gắn với user: customer_id lấy từ user_id (cột user không còn trong models từ 0004)."""
+    Cart = apps.get_model('cart', 'Cart')
+    Cart.objects.using(schema_editor.connection.alias).filter(customer_id='').update(
+        customer_id=Cast('user_id', models.CharField(max_length=255)),
+    )
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """Trước khi có constraint: gộp các dòng trùng sản phẩm vào dòng cũ nhất, cộng dồn quantity."""
+    CartItem = apps.get_model('cart', 'CartItem')
+    items = CartItem.objects.using(schema_editor.connection.alias)
+    duplicates = (
+        items.values('cart_id', 'product_type', 'product_id')
+        .annotate(rows=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates.iterator():
+        same_product = items.filter(
+            cart_id=group['cart_id'], product_type=group['product_type'], product_id=group['product_id'],
+        )
+        same_product.filter(id=group['keep']).update(quantity=group['total'])
+        same_product.exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='cart',
+            options={},
+        ),
+        migrations.AlterModelOptions(
+            name='cartitem',
+            options={},
+        ),
+        migrations.RenameField(
+            model_name='cart',
+            old_name='created_at',
+            new_name='created',
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='customer_id',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='product_name',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='cartitem',
+            name='product_id',
+            field=models.CharField(help_text='ID sản phẩm từ service tương ứng (có thể là ObjectId dạng chuỗi)', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='cartitem',
+            name='product_type',
+            field=models.CharField(help_text="Loại sản phẩm (ví dụ: 'book', 'mobile', 'shoes', 'clothes')", max_length=50),
+        ),
+        migrations.RunPython(copy_user_to_customer_id, migrations.RunPython.noop),
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product_type', 'product_id'), name='cart_item_unique_product'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_sync_models_unique_cart_item'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['customer_id', '-created', '-id'], name='cart_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['-created', '-id'], name='cart_created_idx'),
+        ),
+    ]
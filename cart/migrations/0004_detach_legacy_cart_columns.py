@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    Các cột cũ (``user``, ``is_active``, ``updated_at``) không còn trong models
+    nhưng được giữ lại trong bảng ``carts`` / ``cart_items`` cùng dữ liệu của
+    chúng: chỉ cho phép NULL để insert từ models không cần giá trị.
+    """
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cart', '0003_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name='cart',
+                    name='user',
+                    field=models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name='cart',
+                    name='is_active',
+                    field=models.BooleanField(default=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='cart',
+                    name='updated_at',
+                    field=models.DateTimeField(auto_now=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='cartitem',
+                    name='updated_at',
+                    field=models.DateTimeField(auto_now=True, null=True),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='cart',
+                    name='is_active',
+                ),
+                migrations.RemoveField(
+                    model_name='cart',
+                    name='updated_at',
+                ),
+                migrations.RemoveField(
+                    model_name='cart',
+                    name='user',
+                ),
+                migrations.RemoveField(
+                    model_name='cartitem',
+                    name='updated_at',
+                ),
+            ],
+        ),
+    ]
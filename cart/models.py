@@ -1,10 +1,141 @@
-from django.db import models
+from decimal import Decimal
+from django.db import connections, models, router, transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Prefetch items và tính tổng tiền / tổng số lượng ngay trong DB,
+        tránh N+1 query khi serialize danh sách cart.
+        """
+        return self.prefetch_related('items').annotate(
+            total_price=Coalesce(
+                Sum(F('items__price') * F('items__quantity'),
+                    output_field=DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            item_count=Coalesce(Sum('items__quantity'), Value(0)),
+        )
+
+def merge_duplicate_items(items):
+    """
+    Gộp các item trùng (product_type, product_id) trong cùng một request:
+    cộng số lượng, giữ tên / giá của lần xuất hiện cuối.
+    """
+    merged = {}
+    for item in items:
+        key = (item['product_type'], str(item['product_id']))
+        if key in merged:
+            merged[key] = {**item, 'quantity': merged[key]['quantity'] + item['quantity']}
+        else:
+            merged[key] = dict(item)
+    return list(merged.values())
+
+
+class CartItemQuerySet(models.QuerySet):
+    # Cột được ghi bởi merge_items, theo thứ tự VALUES
+    MERGE_FIELDS = ('cart', 'product_type', 'product_id', 'product_name', 'quantity', 'price', 'added_at')
+
+    def merge_items(self, cart_id, items):
+        """
+        Upsert nhiều item vào cart bằng một câu INSERT duy nhất (mỗi batch).
+
+        Item đã có trong cart (trùng ``cart, product_type, product_id``) được cộng
+        dồn số lượng ngay trong DB và cập nhật tên / giá mới nhất, nên không có
+        read-modify-write và không mất cập nhật khi nhiều request chạy song song.
+        ``items`` là các dict có product_type, product_id, product_name, quantity, price.
+
+        Trả về số item được thêm mới (phần còn lại là cộng dồn vào dòng đã có).
+        """
+        items = merge_duplicate_items(items)
+        if not items:
+            return 0
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        opts = self.model._meta
+        fields = [opts.get_field(name) for name in self.MERGE_FIELDS]
+        now = timezone.now()
+
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        columns = ', '.join(qn(field.column) for field in fields)
+        row_sql = '(%s)' % ', '.join(['%s'] * len(fields))
+        if connection.vendor == 'mysql':
+            conflict_sql = (
+                'ON DUPLICATE KEY UPDATE {quantity} = {quantity} + VALUES({quantity}), '
+                '{name} = VALUES({name}), {price} = VALUES({price})'
+            )
+        else:
+            # PostgreSQL và SQLite
+            conflict_sql = (
+                'ON CONFLICT ({cart}, {type}, {id}) DO UPDATE SET '
+                '{quantity} = {table}.{quantity} + EXCLUDED.{quantity}, '
+                '{name} = EXCLUDED.{name}, {price} = EXCLUDED.{price}'
+            )
+        conflict_sql = conflict_sql.format(
+            table=table,
+            cart=qn(opts.get_field('cart').column),
+            type=qn('product_type'),
+            id=qn('product_id'),
+            quantity=qn('quantity'),
+            name=qn('product_name'),
+            price=qn('price'),
+        )
+
+        returning_params = []
+        if connection.vendor == 'postgresql':
+            # xmax = 0 chỉ với dòng vừa insert; dòng đi vào DO UPDATE có xmax khác 0
+            conflict_sql += ' RETURNING (xmax = 0)'
+        elif connection.vendor == 'sqlite':
+            # Không có xmax: DO UPDATE không đổi added_at, nên dòng mới là dòng có added_at = now
+            conflict_sql += ' RETURNING ({} = %s)'.format(qn(opts.get_field('added_at').column))
+            returning_params = [opts.get_field('added_at').get_db_prep_save(now, connection)]
+        returning = connection.vendor != 'mysql'
+
+        created = 0
+        batch_size = max(connection.ops.bulk_batch_size(fields, items), 1)
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                params = []
+                for item in batch:
+                    values = {**item, 'cart': cart_id, 'added_at': now}
+                    params.extend(
+                        field.get_db_prep_save(values[field.name], connection) for field in fields
+                    )
+                sql = 'INSERT INTO {} ({}) VALUES {} {}'.format(
+                    table, columns, ', '.join([row_sql] * len(batch)), conflict_sql
+                )
+                if returning:
+                    cursor.execute(sql, params + returning_params)
+                    created += sum(1 for (inserted,) in cursor.fetchall() if inserted)
+                else:
+                    # MySQL: affected rows = 1 cho mỗi dòng insert, 2 cho mỗi dòng update
+                    # (quantity luôn tăng nên dòng đã có luôn thay đổi)
+                    cursor.execute(sql, params)
+                    created += 2 * len(batch) - cursor.rowcount
+        return created
+
 
 class Cart(models.Model):
     customer_id = models.CharField(max_length=255)
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'carts'
+        indexes = [
+            # CustomerCartView: filter customer_id, sort (-created, -id)
+            models.Index(fields=['customer_id', '-created', '-id'], name='cart_customer_created_idx'),
+            # CartListView: keyset pagination theo (-created, -id)
+            models.Index(fields=['-created', '-id'], name='cart_created_idx'),
+        ]
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(
@@ -25,5 +156,17 @@ class CartItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'cart_items'
+        constraints = [
+            # Mỗi sản phẩm chỉ có một dòng trong cart, để upsert gộp số lượng
+            models.UniqueConstraint(
+                fields=['cart', 'product_type', 'product_id'],
+                name='cart_item_unique_product',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product_name} in Cart {self.cart.id}"
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from ecommerce.fieldsets import SparseFieldsetSerializerMixin
 from .models import Cart, CartItem
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -11,8 +12,11 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'cart', 'product_type', 'product_id', 'product_name',
                   'quantity', 'price', 'added_at']
         read_only_fields = ['id', 'added_at']
+        # Không kiểm tra cart_item_unique_product ở đây: CartItemDetailView gộp vào
+        # dòng đã có, thêm mới đi qua CartItem.objects.merge_items
+        validators = []
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Cart model with nested items.
     Used for read operations and displaying cart details.
@@ -21,6 +25,9 @@ class CartSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
     item_count = serializers.SerializerMethodField()
 
+    # Tổng tiền / số lượng lấy từ annotate của Cart.objects.with_totals()
+    projection_dependencies = {'total_price': (), 'item_count': ()}
+
     class Meta:
         model = Cart
         fields = ['id', 'customer_id', 'created', 'items', 'total_price', 'item_count']
@@ -28,10 +35,15 @@ class CartSerializer(serializers.ModelSerializer):
 
     def get_total_price(self, obj):
         """Calculate the total price of all items in the cart"""
+        # Dùng giá trị đã annotate bởi Cart.objects.with_totals() nếu có
+        if hasattr(obj, 'total_price'):
+            return obj.total_price
         return sum(item.price * item.quantity for item in obj.items.all())
 
     def get_item_count(self, obj):
         """Calculate the total number of items in the cart"""
+        if hasattr(obj, 'item_count'):
+            return obj.item_count
         return sum(item.quantity for item in obj.items.all())
 
 class CartItemCreateSerializer(serializers.ModelSerializer):
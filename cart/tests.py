@@ -1,3 +1,265 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ecommerce.instrumentation import current_metrics
+from .clients import product_client
+from .models import Cart, CartItem
+
+
+class CartListQueryCountTests(TestCase):
+    """
+    Số query khi liệt kê cart phải cố định, không phụ thuộc số cart/item.
+    """
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_carts(self, count, customer_id='customer-1', items_per_cart=3):
+        for _ in range(count):
+            cart = Cart.objects.create(customer_id=customer_id)
+            for index in range(items_per_cart):
+                CartItem.objects.create(
+                    cart=cart,
+                    product_type='book',
+                    product_id=f'book-{index}',
+                    product_name=f'Book {index}',
+                    quantity=index + 1,
+                    price=Decimal('10.00'),
+                )
+
+    def test_cart_list_query_count_is_constant(self):
+        self.create_carts(5)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('cart-list'))
+        self.assertEqual(response.status_code, 200)
+
+        self.create_carts(20)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('cart-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_customer_carts_query_count_is_constant(self):
+        self.create_carts(10, customer_id='customer-2')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('customer-carts', args=['customer-2']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_totals_match_items(self):
+        self.create_carts(1)
+        cart = Cart.objects.get()
+        response = self.client.get(reverse('cart-detail', args=[cart.id]))
+        self.assertEqual(response.status_code, 200)
+        # 3 item: số lượng 1, 2, 3 với giá 10.00
+        self.assertEqual(Decimal(str(response.data['total_price'])), Decimal('60.00'))
+        self.assertEqual(response.data['item_count'], 6)
+
+    def test_sparse_fieldset_skips_items(self):
+        self.create_carts(5)
+        # Không yêu cầu 'items' thì không prefetch: chỉ còn 1 query
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart-list'), {'fields': 'id,total_price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'total_price'})
+        self.assertEqual(Decimal(str(response.data['results'][0]['total_price'])), Decimal('60.00'))
+
+    def test_sparse_fieldset_keeps_writable_fields(self):
+        self.create_carts(1)
+        cart = Cart.objects.get()
+        response = self.client.patch(
+            reverse('cart-detail', args=[cart.id]) + '?fields=id',
+            {'customer_id': 'customer-9'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'id'})
+        cart.refresh_from_db()
+        self.assertEqual(cart.customer_id, 'customer-9')
+
+
+class CartItemBulkMergeTests(TestCase):
+    """
+    Bulk merge: item mới được thêm, item đã có được cộng dồn số lượng.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.cart = Cart.objects.create(customer_id='customer-1')
+        CartItem.objects.create(
+            cart=self.cart, product_type='book', product_id='book-1',
+            product_name='Book 1', quantity=2, price=Decimal('10.00'),
+        )
+
+    def fetch_products(self, items):
+        return [
+            ({'title': f'{product_type} {product_id}', 'price': '5.00'}, None)
+            if product_id != 'missing' else (None, 'Product not found')
+            for product_type, product_id in items
+        ]
+
+    def test_bulk_merge_upserts_items(self):
+        items = [
+            {'product_type': 'book', 'product_id': 'book-1', 'quantity': 3},
+            {'product_type': 'book', 'product_id': 'book-2', 'quantity': 1},
+            {'product_type': 'book', 'product_id': 'book-2', 'quantity': 4},
+            {'product_type': 'shoes', 'product_id': 'missing', 'quantity': 1},
+        ]
+        with mock.patch.object(product_client, 'fetch_products', side_effect=self.fetch_products):
+            response = self.client.post(
+                reverse('cart-item-bulk-merge', args=[self.cart.id]), {'items': items}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        quantities = dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {'book-1': 5, 'book-2': 5})
+        # Tên / giá được cập nhật theo dữ liệu mới nhất của product service
+        self.assertEqual(CartItem.objects.get(product_id='book-1').price, Decimal('5.00'))
+        self.assertEqual(len(response.data['failed_items']), 1)
+        self.assertEqual(response.data['data']['item_count'], 10)
+
+    def test_merge_items_counts_created_rows(self):
+        # Dòng đã có với quantity 0 vẫn là cập nhật, không phải dòng mới
+        CartItem.objects.filter(product_id='book-1').update(quantity=0)
+        items = [
+            {'product_type': 'book', 'product_id': 'book-1', 'product_name': 'Book 1',
+             'quantity': 3, 'price': Decimal('5.00')},
+            {'product_type': 'book', 'product_id': 'book-2', 'product_name': 'Book 2',
+             'quantity': 1, 'price': Decimal('5.00')},
+        ]
+        self.assertEqual(CartItem.objects.merge_items(self.cart.id, items), 1)
+        self.assertEqual(CartItem.objects.merge_items(self.cart.id, items), 0)
+
+    def test_changing_to_a_product_in_the_cart_merges_the_items(self):
+        other = CartItem.objects.create(
+            cart=self.cart, product_type='book', product_id='book-2',
+            product_name='Book 2', quantity=1, price=Decimal('4.00'),
+        )
+        with mock.patch.object(product_client, 'fetch_product', return_value=({'title': 'Book 1', 'price': '5.00'}, None)):
+            response = self.client.patch(
+                reverse('cart-item-detail', args=[other.id]), {'product_id': 'book-1'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity', 'price')),
+            [('book-1', 3, Decimal('5.00'))],
+        )
+        self.assertEqual(response.data['quantity'], 3)
+
+    def test_create_cart_bulk_inserts_items(self):
+        items = [
+            {'product_type': 'book', 'product_id': 'book-1', 'quantity': 1},
+            {'product_type': 'book', 'product_id': 'book-2', 'quantity': 2},
+        ]
+        with mock.patch.object(product_client, 'fetch_products', side_effect=self.fetch_products), \
+                mock.patch('cart.views.customer_client.fetch_customer', return_value=({'id': 'c'}, None)):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    reverse('cart-create'), {'customer_id': 'customer-2', 'items': items}, format='json'
+                )
+        self.assertEqual(response.status_code, 201)
+        # Toàn bộ item được ghi bằng một câu INSERT
+        item_inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT INTO') and CartItem._meta.db_table in query['sql'].split('(')[0]
+        ]
+        self.assertEqual(len(item_inserts), 1)
+        self.assertEqual(len(response.data['data']['items']), 2)
+
+    def test_customer_lookup_runs_in_the_request_context(self):
+        contexts = []
+
+        def fetch_customer(customer_id):
+            contexts.append(current_metrics())
+            return {'id': customer_id}, None
+
+        items = [{'product_type': 'book', 'product_id': 'book-1', 'quantity': 1}]
+        with mock.patch.object(product_client, 'fetch_products', side_effect=self.fetch_products), \
+                mock.patch('cart.views.customer_client.fetch_customer', side_effect=fetch_customer):
+            response = self.client.post(
+                reverse('cart-create'), {'customer_id': 'customer-2', 'items': items}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        # Call tới customer service được tính vào metrics của request
+        self.assertIsNotNone(contexts[0])
+
+
+# Request chậm vì tranh chấp lock là bình thường ở đây: không log request chậm
+@override_settings(INSTRUMENTATION={'SLOW_REQUEST_MS': 60000})
+class CartItemConcurrentAddTests(TransactionTestCase):
+    """
+    Nhiều request thêm cùng một sản phẩm song song không được mất cập nhật.
+    """
+    threads = 8
+    requests_per_thread = 25
+
+    def add_items(self, cart_id, count):
+        client = APIClient()
+        try:
+            statuses = []
+            for _ in range(count):
+                response = client.post(
+                    reverse('cart-item-list-create', args=[cart_id]),
+                    {'product_type': 'book', 'product_id': 'book-1', 'quantity': 2},
+                    format='json',
+                )
+                statuses.append(response.status_code)
+            return statuses
+        finally:
+            connections.close_all()
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('In-memory SQLite does not support concurrent writers')
+
+    def test_concurrent_adds_keep_every_quantity(self):
+        cart = Cart.objects.create(customer_id='customer-1')
+        product = ({'title': 'Book 1', 'price': '10.00'}, None)
+        with mock.patch.object(product_client, 'fetch_product', return_value=product):
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                futures = [
+                    executor.submit(self.add_items, cart.id, self.requests_per_thread)
+                    for _ in range(self.threads)
+                ]
+                statuses = [code for future in futures for code in future.result()]
+
+        total = self.threads * self.requests_per_thread
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(200), total - 1)
+        item = CartItem.objects.get(cart=cart)
+        self.assertEqual(item.quantity, total * 2)
+
+
+@skipUnless(connection.vendor == 'mysql', 'INSERT ... ON DUPLICATE KEY UPDATE path of merge_items')
+class CartItemMySQLMergeTests(TransactionTestCase):
+    """
+    MySQL: nhiều lần thêm đầu tiên cùng sản phẩm song song không deadlock và đếm đúng dòng mới.
+    """
+    threads = 8
+
+    def merge(self, barrier, cart_id, items):
+        try:
+            barrier.wait()
+            return CartItem.objects.merge_items(cart_id, items)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_first_adds(self):
+        cart = Cart.objects.create(customer_id='customer-1')
+        for round_number in range(5):
+            items = [
+                {'product_type': 'book', 'product_id': f'book-{round_number}-{index}', 'product_name': 'Book',
+                 'quantity': 1, 'price': Decimal('5.00')}
+                for index in range(3)
+            ]
+            barrier = threading.Barrier(self.threads)
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                created = list(executor.map(lambda _: self.merge(barrier, cart.id, items), range(self.threads)))
+            self.assertEqual(sum(created), len(items))
+            self.assertEqual(
+                set(CartItem.objects.filter(product_id__startswith=f'book-{round_number}-')
+                    .values_list('quantity', flat=True)),
+                {self.threads},
+            )
@@ -4,8 +4,10 @@ from .views import (
     CartListView,
     CartDetailView,
     CartItemListCreateView,
+    CartItemBulkMergeView,
     CartItemDetailView,
-    CustomerCartView
+    CustomerCartView,
+    ProductCacheStatsView
 )
 
 urlpatterns = [
@@ -19,5 +21,9 @@ urlpatterns = [
 
     # Cart Item URLs
     path('<int:cart_id>/items/', CartItemListCreateView.as_view(), name='cart-item-list-create'),
+    path('<int:cart_id>/items/bulk/', CartItemBulkMergeView.as_view(), name='cart-item-bulk-merge'),
     path('items/<int:id>/', CartItemDetailView.as_view(), name='cart-item-detail'),
+
+    # Product snapshot cache
+    path('product-cache/stats/', ProductCacheStatsView.as_view(), name='product-cache-stats'),
 ]
\ No newline at end of file
@@ -1,10 +1,15 @@
-from rest_framework import generics, status
+import contextvars
+
+from rest_framework import generics, serializers, status
 from rest_framework.response import Response
-import requests
-import json
+from rest_framework.views import APIView
+from django.db import IntegrityError, router, transaction
 from django.shortcuts import get_object_or_404
-from django.conf import settings
-from .models import Cart, CartItem
+from ecommerce.fieldsets import SparseFieldsetMixin
+from ecommerce.pagination import CreatedKeysetPagination
+from ecommerce.product_cache import product_cache
+from .clients import customer_client, product_client
+from .models import Cart, CartItem, merge_duplicate_items
 from .serializers import (
     CartSerializer,
     CartItemSerializer,
@@ -12,12 +17,32 @@ from .serializers import (
     CartItemCreateSerializer
 )
 
-# Service URLs - ideally these would be in settings.py
-PRODUCT_SERVICE_URLS = getattr(settings, 'PRODUCT_SERVICE_URLS', {
-    'book': 'http://127.0.0.1:9191/api/books',
-})
-CUSTOMER_SERVICE_URL = getattr(settings, 'CUSTOMER_SERVICE_URL',
-                              "http://127.0.0.1:9191/api/customer/")
+
+def resolve_items(items_data, products_data):
+    """
+    Ghép item của request với dữ liệu sản phẩm đã fetch.
+    Trả về ``(resolved, failed)``; ``resolved`` là dict sẵn sàng để ghi vào CartItem.
+    """
+    resolved = []
+    failed = []
+    for item, (product_data, error) in zip(items_data, products_data):
+        if error:
+            failed.append({
+                "item": item,
+                "reason": error
+            })
+            continue
+
+        # Extract product details - adjust field names based on your API response
+        resolved.append({
+            'product_type': item['product_type'],
+            'product_id': item['product_id'],
+            'product_name': product_data.get('title', product_data.get('name', 'Unknown')),
+            'quantity': item['quantity'],
+            'price': product_data.get('price', 0),
+        })
+    return resolved, failed
+
 
 class CartCreateView(generics.CreateAPIView):
     """
@@ -28,29 +53,13 @@ class CartCreateView(generics.CreateAPIView):
 
     def fetch_customer_data(self, customer_id):
         """Fetch customer data from customer service"""
-        url = f"{CUSTOMER_SERVICE_URL}{customer_id}/"
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                return response.json(), None
-            return None, f"Customer service error: {response.status_code}"
-        except requests.RequestException as e:
-            return None, f"Customer service unavailable: {str(e)}"
-
-    def fetch_product_data(self, product_type, product_id):
-        """Fetch product data from product service"""
-        base_url = PRODUCT_SERVICE_URLS.get(product_type.lower())
-        if not base_url:
-            return None, f"Unsupported product type: {product_type}"
-
-        url = f"{base_url}/detail/{product_id}/"
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                return response.json(), None
-            return None, f"Product service error: {response.status_code}"
-        except requests.RequestException as e:
-            return None, f"Product service unavailable: {str(e)}"
+        return customer_client.fetch_customer(customer_id)
+
+    def fetch_products_data(self, items_data):
+        """Fetch product data for all items concurrently from product services"""
+        return product_client.fetch_products(
+            (item['product_type'], item['product_id']) for item in items_data
+        )
 
     def create(self, request, *args, **kwargs):
         request_data = request.data
@@ -59,60 +68,31 @@ class CartCreateView(generics.CreateAPIView):
         customer_id = request_data.get('customer_id')
         items_data = request_data.get('items', [])
 
-        # Step 1: Fetch customer data
-        customer_data, error = self.fetch_customer_data(customer_id)
+        # Step 1: Fetch customer data while the product lookups run concurrently
+        # (trong bản sao context của request, như ServiceClient.fetch_products)
+        customer_future = customer_client.executor.submit(
+            contextvars.copy_context().run, self.fetch_customer_data, customer_id
+        )
+        products_data = self.fetch_products_data(items_data)
+        customer_data, error = customer_future.result()
         if error:
             return Response(
                 {"success": False, "message": error},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Step 2: Create the cart
-        cart = Cart.objects.create(customer_id=customer_id)
+        # Step 2: Resolve items against the fetched product data
+        resolved_items, failed_items = resolve_items(items_data, products_data)
 
-        print(cart)
-
-        # Step 3: Process cart items
-        processed_items = []
-        failed_items = []
-
-        for item in items_data:
-            product_type = item['product_type']
-            product_id = item['product_id']
-            quantity = item['quantity']
-
-            # Fetch product data
-            product_data, error = self.fetch_product_data(product_type, product_id)
-            if error:
-                failed_items.append({
-                    "item": item,
-                    "reason": error
-                })
-                continue
-
-            # Extract product details - adjust field names based on your API response
-            product_name = product_data.get('title', product_data.get('name', 'Unknown'))
-            price = product_data.get('price', 0)
-
-            # Create cart item
-            cart_item = CartItem.objects.create(
-                cart=cart,
-                product_type=product_type,
-                product_id=product_id,
-                product_name=product_name,
-                quantity=quantity,
-                price=price
+        # Step 3: Create the cart and all of its items atomically, items in one INSERT
+        with transaction.atomic(using=router.db_for_write(Cart)):
+            cart = Cart.objects.create(customer_id=customer_id)
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, **item) for item in merge_duplicate_items(resolved_items)
             )
 
-            processed_items.append({
-                "id": cart_item.id,
-                "product_name": product_name,
-                "quantity": quantity,
-                "price": price
-            })
-
         # Get the full cart data with serializer that includes items
-        cart_serializer = CartSerializer(cart)
+        cart_serializer = CartSerializer(Cart.objects.with_totals().get(id=cart.id))
 
         # Prepare response
         response_data = {
@@ -128,12 +108,13 @@ class CartCreateView(generics.CreateAPIView):
 
         return Response(response_data, status=status.HTTP_201_CREATED)
 
-class CartListView(generics.ListAPIView):
+class CartListView(SparseFieldsetMixin, generics.ListAPIView):
     """
     List all carts, optionally filtered by customer_id.
     """
-    queryset = Cart.objects.all()
+    queryset = Cart.objects.with_totals()
     serializer_class = CartSerializer
+    pagination_class = CreatedKeysetPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -142,11 +123,11 @@ class CartListView(generics.ListAPIView):
             queryset = queryset.filter(customer_id=customer_id)
         return queryset
 
-class CartDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CartDetailView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a cart.
     """
-    queryset = Cart.objects.all()
+    queryset = Cart.objects.with_totals()
     serializer_class = CartSerializer
     lookup_field = 'id'
 
@@ -178,25 +159,10 @@ class CartItemListCreateView(generics.ListCreateAPIView):
         cart = get_object_or_404(Cart, id=cart_id)
 
         # Get product information from product service
-        base_url = PRODUCT_SERVICE_URLS.get(product_type.lower())
-        if not base_url:
-            return Response(
-                {"detail": f"Unsupported product type: {product_type}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        url = f"{base_url}/{product_id}/"
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code != 200:
-                return Response(
-                    {"detail": f"Product service error: {response.status_code}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            product_data = response.json()
-        except requests.RequestException as e:
+        product_data, error = product_client.fetch_product(product_type, product_id)
+        if error:
             return Response(
-                {"detail": f"Product service unavailable: {str(e)}"},
+                {"detail": error},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
@@ -204,40 +170,62 @@ class CartItemListCreateView(generics.ListCreateAPIView):
         product_name = product_data.get('title', product_data.get('name', 'Unknown'))
         price = product_data.get('price', 0)
 
-        # Check if product already exists in cart
-        existing_item = CartItem.objects.filter(
-            cart_id=cart_id,
+        # Upsert: thêm mới hoặc cộng dồn số lượng ngay trong DB (không read-modify-write)
+        created = CartItem.objects.merge_items(cart.id, [{
+            'product_type': product_type,
+            'product_id': product_id,
+            'product_name': product_name,
+            'quantity': quantity,
+            'price': price
+        }])
+        cart_item = CartItem.objects.get(
+            cart_id=cart.id,
             product_type=product_type,
             product_id=product_id
-        ).first()
+        )
 
-        if existing_item:
-            # Update quantity if product already in cart
-            existing_item.quantity += quantity
-            existing_item.save()
-            serializer = self.get_serializer(existing_item)
+        serializer = self.get_serializer(cart_item)
+        if not created:
+            # Product was already in the cart
             return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
-            # Create new cart item
-            cart_item_data = {
-                'cart': cart_id,
-                'product_type': product_type,
-                'product_id': product_id,
-                'product_name': product_name,
-                'quantity': quantity,
-                'price': price
-            }
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED,
+            headers=headers
+        )
+
+class CartItemBulkMergeView(APIView):
+    """
+    Merge many items into an existing cart in one statement.
+    Items already in the cart have their quantities added up (upsert).
+    """
+    def post(self, request, *args, **kwargs):
+        cart = get_object_or_404(Cart, id=self.kwargs.get('cart_id'))
 
-            serializer = self.get_serializer(data=cart_item_data)
-            serializer.is_valid(raise_exception=True)
-            self.perform_create(serializer)
-            headers = self.get_success_headers(serializer.data)
+        serializer = CartItemCreateSerializer(data=request.data.get('items', []), many=True)
+        serializer.is_valid(raise_exception=True)
+        items_data = serializer.validated_data
+        if not items_data:
             return Response(
-                serializer.data,
-                status=status.HTTP_201_CREATED,
-                headers=headers
+                {"detail": "No items provided"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        products_data = product_client.fetch_products(
+            (item['product_type'], item['product_id']) for item in items_data
+        )
+        resolved_items, failed_items = resolve_items(items_data, products_data)
+        CartItem.objects.merge_items(cart.id, resolved_items)
+
+        response_data = {
+            "success": True,
+            "data": CartSerializer(Cart.objects.with_totals().get(id=cart.id)).data
+        }
+        if failed_items:
+            response_data["failed_items"] = failed_items
+        return Response(response_data, status=status.HTTP_200_OK)
+
 class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a cart item.
@@ -248,7 +236,8 @@ class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def perform_update(self, serializer):
         """
-        When updating a cart item, fetch new product info if product changes
+        When updating a cart item, fetch new product info if product changes.
+        Changing to a product already in the cart merges this item into it.
         """
         instance = serializer.instance
         validated_data = serializer.validated_data
@@ -260,33 +249,47 @@ class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
             product_type = validated_data.get('product_type', instance.product_type)
             product_id = validated_data.get('product_id', instance.product_id)
 
-            # Get product base URL
-            base_url = PRODUCT_SERVICE_URLS.get(product_type.lower())
-            if not base_url:
-                raise serializers.ValidationError(f"Unsupported product type: {product_type}")
-
             # Fetch product data
-            url = f"{base_url}/{product_id}/"
-            try:
-                response = requests.get(url, timeout=5)
-                if response.status_code != 200:
-                    raise serializers.ValidationError(f"Product service error: {response.status_code}")
-                product_data = response.json()
-            except requests.RequestException as e:
-                raise serializers.ValidationError(f"Product service unavailable: {str(e)}")
+            product_data, error = product_client.fetch_product(product_type, product_id)
+            if error:
+                raise serializers.ValidationError(error)
 
             # Update product details
             validated_data['product_name'] = product_data.get('title', product_data.get('name', 'Unknown'))
             validated_data['price'] = product_data.get('price', 0)
 
-        serializer.save()
+        db = router.db_for_write(CartItem)
+        try:
+            with transaction.atomic(using=db):
+                serializer.save()
+        except IntegrityError:
+            # Sản phẩm mới đã có trong cart (cart_item_unique_product): gộp vào dòng đó.
+            # ``instance`` đã mang các giá trị mới từ lần save thất bại.
+            item = {
+                field: getattr(instance, field)
+                for field in ('product_type', 'product_id', 'product_name', 'quantity', 'price')
+            }
+            with transaction.atomic(using=db):
+                CartItem.objects.merge_items(instance.cart_id, [item])
+                CartItem.objects.filter(pk=instance.pk).delete()
+            serializer.instance = CartItem.objects.get(
+                cart_id=instance.cart_id, product_type=item['product_type'], product_id=item['product_id'],
+            )
 
-class CustomerCartView(generics.ListAPIView):
+class CustomerCartView(SparseFieldsetMixin, generics.ListAPIView):
     """
     Get all carts for a specific customer
     """
     serializer_class = CartSerializer
+    pagination_class = CreatedKeysetPagination
 
     def get_queryset(self):
         customer_id = self.kwargs.get('customer_id')
-        return Cart.objects.filter(customer_id=customer_id).order_by('-created')
\ No newline at end of file
+        return Cart.objects.filter(customer_id=customer_id).with_totals().order_by('-created', '-id')
+
+class ProductCacheStatsView(APIView):
+    """
+    Hit/miss/eviction counters of the product snapshot cache, used to size it.
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(product_cache.stats())
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class CatalogConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'catalog'
+
+    def ready(self):
+        # Các alias đã được django_mongoengine đăng ký (đứng trước trong INSTALLED_APPS)
+        if getattr(settings, 'MONGO_CONNECT_EAGERLY', False):
+            from ecommerce.connections import connect_mongo_aliases
+            connect_mongo_aliases(settings.MONGODB_DATABASES)
@@ -0,0 +1,125 @@
+"""
+Federated search/listing over the Book, Mobile, Shoe and Clothes catalogs.
+
+Every catalog lives in its own MongoDB database (its own MongoEngine alias),
+so the sources are queried concurrently on a thread pool with a per-source
+timeout and their already-sorted results are merged into a single stream:
+by relevance when a query is given, by recency otherwise. Total latency is
+that of the slowest source, capped by the timeout; every MongoDB query also
+carries ``max_time_ms`` so the server aborts it and frees the worker thread
+instead of letting slow queries pile up on the pool.
+
+Text scores are not comparable between collections (each has its own
+vocabulary, weights and size), so relevance results are merged by rank with
+Reciprocal Rank Fusion: a hit at position ``r`` of its source gets
+``1 / (RRF_K + r)``, and the raw score only breaks ties.
+"""
+import contextvars
+import datetime
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait
+from operator import itemgetter
+
+from django.conf import settings
+from pymongo.errors import ExecutionTimeout
+
+from book.models import Book
+from book.serializers import BookSerializer
+from clothes.models import Clothes
+from clothes.serializers import ClothesSerializer
+from ecommerce.search import search_backend
+from mobile.models import Mobile
+from mobile.serializers import MobileSerializer
+from shoes.models import Shoe
+from shoes.serializers import ShoeSerializer
+
+FEDERATION_TIMEOUT = getattr(settings, 'CATALOG_FEDERATION_TIMEOUT', 2.0)
+# Số bản ghi tối đa mỗi source phải trả về cho một trang (page * page_size)
+FEDERATION_MAX_WINDOW = getattr(settings, 'CATALOG_FEDERATION_MAX_WINDOW', 500)
+FEDERATION_MAX_WORKERS = getattr(settings, 'CATALOG_FEDERATION_MAX_WORKERS', 16)
+# Hằng số k của Reciprocal Rank Fusion
+RRF_K = 60
+
+
+class CatalogSource:
+    """
+    Một catalog tham gia federation. Các key trùng với ``product_type`` của cart.
+    """
+    def __init__(self, name, document, serializer_class):
+        self.name = name
+        self.document = document
+        self.serializer_class = serializer_class
+
+    def fetch(self, query, limit, max_time_ms=None):
+        """
+        ``limit`` kết quả đầu tiên dạng ``[(sort_key, data), ...]``, giảm dần theo key.
+        """
+        if query:
+            scored = search_backend.search_scored(self.document, query, limit, max_time_ms=max_time_ms)
+            ranked = [
+                ((1 / (RRF_K + rank), score), doc)
+                for rank, (score, doc) in enumerate(scored, start=1)
+            ]
+        else:
+            documents = self.document.objects.order_by('-created', '-id')
+            if max_time_ms:
+                documents = documents.max_time_ms(max_time_ms)
+            documents = documents[:limit]
+            ranked = [(doc.created or datetime.datetime.min, doc) for doc in documents]
+
+        data = self.serializer_class([doc for _, doc in ranked], many=True).data
+        return [
+            (key, {'product_type': self.name, **item})
+            for (key, _), item in zip(ranked, data)
+        ]
+
+
+CATALOG_SOURCES = {
+    source.name: source for source in (
+        CatalogSource('book', Book, BookSerializer),
+        CatalogSource('mobile', Mobile, MobileSerializer),
+        CatalogSource('shoes', Shoe, ShoeSerializer),
+        CatalogSource('clothes', Clothes, ClothesSerializer),
+    )
+}
+
+executor = ThreadPoolExecutor(max_workers=FEDERATION_MAX_WORKERS, thread_name_prefix='catalog-federation')
+
+
+def federated_query(query=None, types=None, offset=0, limit=20, timeout=FEDERATION_TIMEOUT):
+    """
+    Query the selected catalogs concurrently and merge them into one page.
+
+    Returns ``(results, sources, has_more)`` where ``sources`` maps each catalog
+    to ``'ok'``, ``'timeout'`` or an error message, so a slow or failing catalog
+    degrades the response instead of failing it.
+    """
+    sources = [CATALOG_SOURCES[name] for name in types] if types else list(CATALOG_SOURCES.values())
+    window = offset + limit
+    max_time_ms = int(timeout * 1000)
+    # Chạy trong bản sao context của request để instrumentation thấy các query MongoDB
+    futures = {
+        executor.submit(contextvars.copy_context().run, source.fetch, query, window, max_time_ms): source.name
+        for source in sources
+    }
+    _, pending = wait(futures, timeout=timeout)
+
+    status = {}
+    streams = []
+    for future, name in futures.items():
+        if future in pending:
+            future.cancel()
+            status[name] = 'timeout'
+        elif isinstance(future.exception(), ExecutionTimeout):
+            status[name] = 'timeout'
+        elif future.exception() is not None:
+            status[name] = f"error: {future.exception()}"
+        else:
+            status[name] = 'ok'
+            streams.append(future.result())
+
+    merged = heapq.merge(*streams, key=itemgetter(0), reverse=True)
+    results = [item for _, item in itertools.islice(merged, offset, window)]
+    has_more = sum(len(stream) for stream in streams) > window or any(len(stream) == window for stream in streams)
+    return results, status, has_more
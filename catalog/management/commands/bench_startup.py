@@ -0,0 +1,75 @@
+"""
+Đo thời gian khởi động (cold start) khi kết nối MongoDB lazy và eager.
+
+    python manage.py bench_startup                  # 10 lần mỗi trường hợp
+    python manage.py bench_startup --runs 30
+
+Mỗi lần chạy là một tiến trình Python mới, với ``MONGO_CONNECT_EAGERLY=0``
+(mặc định: alias chỉ kết nối khi được dùng) và ``=1`` (kết nối khi
+app registry sẵn sàng, như trước):
+
+* ``manage.py check``: thời gian của cả tiến trình.
+* WSGI worker boot: thời gian ``import ecommerce.wsgi`` trong tiến trình con
+  và số thread đang chạy sau khi boot (pymongo mở thread monitor cho mỗi client).
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce import benchmark
+
+WSGI_BOOT = (
+    "import json, threading, time\n"
+    "start = time.perf_counter()\n"
+    "import ecommerce.wsgi\n"
+    "elapsed = (time.perf_counter() - start) * 1000\n"
+    "print(json.dumps({'ms': elapsed, 'threads': threading.active_count()}))\n"
+)
+
+MODES = (('lazy', '0'), ('eager', '1'))
+
+
+class Command(BaseCommand):
+    help = 'Compare cold-start time of `manage.py check` and WSGI worker boot with lazy vs eager MongoDB connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help='Processes started per case.')
+
+    def handle(self, *args, **options):
+        base_env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')}
+        manage_py = str(settings.BASE_DIR / 'manage.py')
+        runs = options['runs']
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{runs} cold starts per case"))
+
+        for mode, flag in MODES:
+            env = {**base_env, 'MONGO_CONNECT_EAGERLY': flag}
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, manage_py, 'check'], env=env, cwd=settings.BASE_DIR,
+                    check=True, stdout=subprocess.DEVNULL,
+                )
+                samples.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(benchmark.format_summary(f'manage.py check ({mode})', benchmark.summarize(samples)))
+
+        for mode, flag in MODES:
+            env = {**base_env, 'MONGO_CONNECT_EAGERLY': flag}
+            samples, threads = [], 0
+            for _ in range(runs):
+                result = subprocess.run(
+                    [sys.executable, '-c', WSGI_BOOT], env=env, cwd=settings.BASE_DIR,
+                    check=True, capture_output=True, text=True,
+                )
+                boot = json.loads(result.stdout.strip().splitlines()[-1])
+                samples.append(boot['ms'])
+                threads = boot['threads']
+            self.stdout.write(
+                benchmark.format_summary(f'WSGI boot ({mode})', benchmark.summarize(samples))
+                + f"  threads={threads}"
+            )
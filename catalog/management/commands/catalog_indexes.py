@@ -0,0 +1,130 @@
+"""
+Kiểm tra / tạo index MongoDB cho các catalog.
+
+    python manage.py catalog_indexes                 # báo cáo index đã có / còn thiếu
+    python manage.py catalog_indexes --build         # tạo index còn thiếu (background)
+    python manage.py catalog_indexes --explain       # in explain() plan của các query của viewset
+
+Các Document của catalog đặt ``'auto_create_index': False``: index trong
+``meta['indexes']`` chỉ được tạo ở đây, không phải ở lần save đầu tiên.
+"""
+import datetime
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine.queryset.visitor import Q
+
+from catalog.federation import CATALOG_SOURCES
+
+
+def index_key(spec_fields):
+    """Chuẩn hóa key của index để so sánh (text index được so theo '_fts')."""
+    fields = list(spec_fields)
+    if any(kind == 'text' for _, kind in fields):
+        return (('_fts', 'text'),)
+    return tuple((name, kind) for name, kind in fields)
+
+
+def existing_index_keys(collection):
+    keys = {}
+    for name, info in collection.index_information().items():
+        key = tuple(info['key'])
+        if any(field == '_fts' for field, _ in key):
+            key = (('_fts', 'text'),)
+        keys[key] = name
+    return keys
+
+
+def plan_stages(plan):
+    """Tất cả các stage (COLLSCAN, IXSCAN, ...) trong một winning plan."""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+def viewset_queries(document):
+    """Các query mà viewset của catalog thực sự chạy."""
+    now = datetime.datetime.utcnow()
+    queries = {
+        'list': document.objects.order_by('-created', '-id')[:20],
+        'list (keyset page)': document.objects.filter(
+            Q(created__lt=now) | Q(created=now, id__lt=ObjectId())
+        ).order_by('-created', '-id')[:20],
+        'batch': document.objects.filter(id__in=[ObjectId()]),
+        'search': document.objects.search_text('sample'),
+        'available + price': document.objects.filter(available=True, price__lte=100).order_by('price'),
+    }
+    if 'brand' in document._fields:
+        queries['brand'] = document.objects.filter(brand='sample')
+    if 'size' in document._fields:
+        size = document._fields['size'].to_python('42')
+        queries['size + color'] = document.objects.filter(size=size, color='black')
+        queries['color'] = document.objects.filter(color='black')
+    return queries
+
+
+class Command(BaseCommand):
+    help = 'Report, build and explain the MongoDB indexes of the catalog collections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', default='', help='Comma separated catalogs (default: all).')
+        parser.add_argument('--build', action='store_true', help='Create missing indexes in the background.')
+        parser.add_argument('--explain', action='store_true', help='Print explain() plans for viewset queries.')
+        parser.add_argument('--fail-on-collscan', action='store_true',
+                            help='Exit with an error if any viewset query is a COLLSCAN.')
+
+    def handle(self, *args, **options):
+        names = [name for name in options['types'].split(',') if name] or list(CATALOG_SOURCES)
+        unknown = [name for name in names if name not in CATALOG_SOURCES]
+        if unknown:
+            raise CommandError(f"Unknown catalog types: {', '.join(unknown)}")
+
+        collscans = []
+        for name in names:
+            document = CATALOG_SOURCES[name].document
+            # Dùng collection "thô" để không kích hoạt auto_create_index của MongoEngine
+            collection = document._get_db()[document._get_collection_name()]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({collection.full_name})"))
+            self.report_indexes(document, collection, build=options['build'])
+            if options['explain'] or options['fail_on_collscan']:
+                collscans += [f"{name}: {query}" for query in self.explain(document)]
+
+        if collscans and options['fail_on_collscan']:
+            raise CommandError(f"COLLSCAN in: {', '.join(collscans)}")
+
+    def report_indexes(self, document, collection, build=False):
+        existing = existing_index_keys(collection)
+        for spec in document._meta['index_specs']:
+            spec = dict(spec)
+            fields = spec.pop('fields')
+            spec.pop('cls', None)
+            key = index_key(fields)
+            label = ', '.join(f"{field} {kind}" for field, kind in fields)
+            if key in existing:
+                self.stdout.write(f"  exists   {label} ({existing[key]})")
+            elif build:
+                created = collection.create_index(fields, background=True, **spec)
+                self.stdout.write(self.style.SUCCESS(f"  created  {label} ({created})"))
+            else:
+                self.stdout.write(self.style.WARNING(f"  missing  {label}"))
+
+    def explain(self, document):
+        """In plan của từng query, trả về tên các query bị COLLSCAN."""
+        collscans = []
+        for label, queryset in viewset_queries(document).items():
+            plan = queryset.explain()
+            stages = plan_stages(plan.get('queryPlanner', {}).get('winningPlan', {}))
+            summary = ' > '.join(stages) or 'EOF'
+            if 'COLLSCAN' in stages:
+                collscans.append(label)
+                self.stdout.write(self.style.ERROR(f"  explain  {label}: {summary}"))
+            else:
+                self.stdout.write(f"  explain  {label}: {summary}")
+        return collscans
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import CatalogView
+
+urlpatterns = [
+    # Tìm kiếm / liệt kê gộp trên tất cả các catalog
+    path('', CatalogView.as_view(), name='catalog'),
+]
@@ -0,0 +1,49 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from .federation import CATALOG_SOURCES, FEDERATION_MAX_WINDOW, federated_query
+
+
+class CatalogView(APIView):
+    """
+    Tìm kiếm / liệt kê sản phẩm trên tất cả catalog cùng lúc.
+    Ví dụ: /api/catalog/?q=Nike&types=shoes,clothes&page=2&page_size=20
+    Có 'q' thì kết quả xếp theo độ liên quan, không có thì theo thời gian tạo mới nhất.
+    """
+    default_page_size = 20
+    max_page_size = 100
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        types = [t for t in request.query_params.get('types', '').split(',') if t]
+        unknown = [t for t in types if t not in CATALOG_SOURCES]
+        if unknown:
+            return Response(
+                {"detail": f"Unknown catalog types: {', '.join(unknown)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', self.default_page_size)), 1),
+                            self.max_page_size)
+        except ValueError:
+            return Response({"detail": "Invalid page or page_size."}, status=status.HTTP_400_BAD_REQUEST)
+
+        offset = (page - 1) * page_size
+        if offset + page_size > FEDERATION_MAX_WINDOW:
+            return Response(
+                {"detail": f"Cannot page beyond the first {FEDERATION_MAX_WINDOW} results."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results, sources, has_more = federated_query(query or None, types, offset, page_size)
+        next_link = None
+        if has_more and offset + 2 * page_size <= FEDERATION_MAX_WINDOW:
+            next_link = replace_query_param(request.build_absolute_uri(), 'page', page + 1)
+        return Response({
+            'next': next_link,
+            'sources': sources,
+            'results': results,
+        })
@@ -16,7 +16,24 @@ class Clothes(Document):
     meta = {
         'db_alias': 'clothes',  # Sử dụng kết nối với alias 'clothes'
         'collection': 'clothes',  # Tên collection trong MongoDB
-        'ordering': ['-created']
+        'ordering': ['-created'],
+        # Index chỉ được tạo bởi `manage.py catalog_indexes --build`, không tạo ngầm khi save
+        'auto_create_index': False,
+        'indexes': [
+            # Text index cho tìm kiếm theo tên / thương hiệu
+            {
+                'fields': ['$name', '$brand'],
+                'default_language': 'none',
+                'weights': {'name': 10, 'brand': 5},
+            },
+            # Danh sách mặc định + phân trang keyset theo (created, id)
+            ('-created', '-id'),
+            # Lọc sản phẩm còn hàng theo khoảng giá
+            ('available', 'price'),
+            'brand',
+            ('size', 'color'),
+            'color',
+        ]
     }
 
     def __str__(self):
@@ -1,7 +1,8 @@
 from rest_framework_mongoengine.serializers import DocumentSerializer
+from ecommerce.fieldsets import SparseFieldsetSerializerMixin
 from .models import Clothes
 
-class ClothesSerializer(DocumentSerializer):
+class ClothesSerializer(SparseFieldsetSerializerMixin, DocumentSerializer):
     class Meta:
         model = Clothes
         fields = '__all__'
@@ -3,33 +3,64 @@ from rest_framework_mongoengine.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from ecommerce.fieldsets import SparseFieldsetMixin
+from ecommerce.filters import CatalogFilterMixin, CatalogFilterSet
+from ecommerce.mixins import BatchRetrieveMixin, LazyQuerySet
+from ecommerce.pagination import CreatedKeysetPagination, StandardResultsSetPagination
+from ecommerce.product_cache import product_cache
+from ecommerce.search import search_backend
 from .models import Clothes
 from .serializers import ClothesSerializer
 
-class ClothesViewSet(ModelViewSet):
+class ClothesViewSet(SparseFieldsetMixin, CatalogFilterMixin, BatchRetrieveMixin, ModelViewSet):
     serializer_class = ClothesSerializer
     lookup_field = 'id'  # MongoEngine sử dụng id dạng ObjectId
-    queryset = Clothes.objects.all()
+    queryset = LazyQuerySet(Clothes)
+    pagination_class = CreatedKeysetPagination
+    filterset = CatalogFilterSet(
+        Clothes,
+        filters={
+            'brand': 'in',
+            'size': 'in',
+            'color': 'in',
+            'material': 'in',
+            'available': 'bool',
+            'price': 'range',
+        },
+        ordering=('price', 'created'),
+        facets=('brand', 'size', 'color', 'material'),
+        price_buckets=(0, 20, 50, 100, 200),
+    )
 
     def perform_create(self, serializer):
         serializer.validated_data['created'] = serializer.validated_data.get('created', None) or datetime.datetime.now()
         serializer.validated_data['updated'] = datetime.datetime.now()
         serializer.save()
+        search_backend.update(serializer.instance)
 
     def perform_update(self, serializer):
         serializer.validated_data['updated'] = datetime.datetime.now()
         serializer.save()
+        search_backend.update(serializer.instance)
+        product_cache.invalidate('clothes', serializer.instance.id)
 
-    @action(detail=False, methods=['get'])
+    def perform_destroy(self, instance):
+        search_backend.remove(type(instance), instance.id)
+        product_cache.invalidate('clothes', instance.id)
+        instance.delete()
+
+    @action(detail=False, methods=['get'], pagination_class=StandardResultsSetPagination)
     def search(self, request):
         """
         Tìm kiếm quần áo theo tên hoặc thương hiệu.
         Ví dụ: /api/clothes/search/?q=Nike
+        Kết quả được sắp xếp theo độ liên quan và phân trang (?page=).
         """
         query = request.query_params.get('q', '')
         if not query:
             return Response({"detail": "Vui lòng cung cấp tham số tìm kiếm 'q'."}, status=status.HTTP_400_BAD_REQUEST)
-        # Tìm kiếm theo tên hoặc thương hiệu (không phân biệt hoa thường)
-        results = Clothes.objects.filter(name__icontains=query) | Clothes.objects.filter(brand__icontains=query)
-        serializer = self.get_serializer(results, many=True)
-        return Response(serializer.data)
+        # Tìm kiếm full-text (không phân biệt hoa thường và dấu), xếp theo độ liên quan
+        results = search_backend.search(Clothes, query)
+        page = self.paginate_queryset(results)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
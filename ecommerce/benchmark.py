@@ -0,0 +1,193 @@
+"""
+Helpers for the ``bench_*`` management commands: seeding, latency
+percentiles and toggling a model's indexes to compare query plans.
+
+``QueryBenchmarkCommand`` is the shared base of ``bench_cart_queries`` and
+``bench_payment_queries``. Dropping indexes for the "no index" run alters
+live tables, so it only happens with ``--destructive``, with ``DEBUG`` on,
+after a confirmation prompt (skipped by ``--noinput``).
+"""
+import contextlib
+import math
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models, router, transaction
+
+
+def percentile(samples, pct):
+    """Percentile (nearest-rank) của danh sách thời gian."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def measure(func, runs, warmup=3):
+    """Chạy ``func`` ``runs`` lần, trả về thời gian mỗi lần (ms)."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    return {
+        'p50': percentile(samples, 50),
+        'p99': percentile(samples, 99),
+        'max': max(samples, default=0.0),
+    }
+
+
+def format_summary(label, summary):
+    return f"{label:<44} p50={summary['p50']:8.2f}ms  p99={summary['p99']:8.2f}ms  max={summary['max']:8.2f}ms"
+
+
+def seed(model, make_instance, total, using, batch_size=10000, progress=None):
+    """
+    ``bulk_create`` ``total`` bản ghi theo batch, ``make_instance(i)`` tạo từng instance.
+    Kiểm tra khóa ngoại được tắt trong lúc seed (như ``loaddata``).
+    """
+    connection = connections[using]
+    with connection.constraint_checks_disabled(), transaction.atomic(using=using):
+        for start in range(0, total, batch_size):
+            stop = min(start + batch_size, total)
+            model.objects.using(using).bulk_create(
+                [make_instance(i) for i in range(start, stop)], batch_size=batch_size
+            )
+            if progress:
+                progress(model, stop, total)
+
+
+def model_indexes(model, names=None):
+    """Index và constraint khai báo trong ``Meta`` của model (lọc theo tên nếu có)."""
+    items = list(model._meta.indexes) + list(model._meta.constraints)
+    return [(model, item) for item in items if names is None or item.name in names]
+
+
+@contextlib.contextmanager
+def indexes_dropped(using, indexes):
+    """
+    Tạm xóa các index / constraint để đo "trước khi có index", tạo lại khi thoát.
+    """
+    connection = connections[using]
+    with connection.schema_editor() as editor:
+        for model, item in indexes:
+            if isinstance(item, models.Index):
+                editor.remove_index(model, item)
+            else:
+                editor.remove_constraint(model, item)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model, item in indexes:
+                if isinstance(item, models.Index):
+                    editor.add_index(model, item)
+                else:
+                    editor.add_constraint(model, item)
+
+
+def compare(cases, indexes, using, runs, write):
+    """
+    Đo p50/p99 của từng query khi chưa có và khi đã có index.
+    ``cases`` là ``{label: callable}``; ``write`` nhận từng dòng kết quả.
+    Không có ``indexes`` thì chỉ đo với index hiện có.
+    """
+    results = {label: {} for label in cases}
+    if indexes:
+        with indexes_dropped(using, indexes):
+            for label, func in cases.items():
+                results[label]['before'] = summarize(measure(func, runs))
+    for label, func in cases.items():
+        results[label]['after'] = summarize(measure(func, runs))
+
+    for label, result in results.items():
+        if 'before' in result:
+            write(format_summary(f"{label} (no index)", result['before']))
+        write(format_summary(f"{label} (indexed)", result['after']))
+    return results
+
+
+class QueryBenchmarkCommand(BaseCommand):
+    """
+    Seed ``--rows`` bản ghi rồi đo p50/p99 của các queryset trong ``cases()``.
+
+    Lớp con khai báo ``model`` (chọn database qua router) và cài đặt ``seed``,
+    ``cases`` (``{label: callable}``, rỗng nếu chưa có dữ liệu seed),
+    ``indexes``, ``describe`` và ``cleanup``.
+    """
+    model = None
+    rows_help = 'Rows to seed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help=self.rows_help)
+        parser.add_argument('--runs', type=int, default=200, help='Timed runs per query.')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse previously seeded rows.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows afterwards.')
+        parser.add_argument(
+            '--destructive', action='store_true',
+            help='Also measure without indexes: drops and recreates them on the live tables (DEBUG only).',
+        )
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not prompt before dropping indexes.')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(self.model)
+        indexes = []
+        if options['destructive']:
+            indexes = self.indexes()
+            self.confirm_destructive(using, indexes, options['interactive'])
+
+        if not options['skip_seed']:
+            self.seed(using, options)
+        cases = self.cases(using, options)
+        if not cases:
+            self.stderr.write('No seeded rows found, run without --skip-seed first.')
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{self.describe(using)} on '{using}', {options['runs']} runs per query"
+        ))
+        compare(cases, indexes, using, options['runs'], self.stdout.write)
+
+        if not options['keep']:
+            self.cleanup(using)
+
+    def confirm_destructive(self, using, indexes, interactive):
+        if not settings.DEBUG:
+            raise CommandError('--destructive drops live indexes and is refused when DEBUG is off.')
+        if not interactive:
+            return
+        names = ', '.join(item.name for _, item in indexes)
+        answer = input(
+            f"This drops {names} on '{using}' ({connections[using].settings_dict['NAME']}) "
+            f"while the benchmark runs.\nType 'yes' to continue, or 'no' to cancel: "
+        )
+        if answer != 'yes':
+            raise CommandError('Benchmark cancelled.')
+
+    def seed(self, using, options):
+        raise NotImplementedError
+
+    def cases(self, using, options):
+        raise NotImplementedError
+
+    def indexes(self):
+        raise NotImplementedError
+
+    def describe(self, using):
+        raise NotImplementedError
+
+    def cleanup(self, using):
+        raise NotImplementedError
+
+    def progress(self, model, done, total):
+        self.stdout.write(f"  {model.__name__}: {done}/{total}", ending='\n' if done == total else '\r')
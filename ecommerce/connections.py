@@ -0,0 +1,359 @@
+"""
+Connection management for the SQL and MongoDB backends.
+
+Every connection setting comes from the environment, so each deployment can
+tune it without a code change. A per-alias variable wins over the global one:
+
+    DB_CONN_MAX_AGE=300                  # persistent SQL connections (seconds)
+    POSTGRESQL_DB_CONN_MAX_AGE=60        # ... but shorter for 'postgresql'
+    DB_CONN_HEALTH_CHECKS=true
+    DEFAULT_DB_HOST=mysql.internal       # NAME / USER / PASSWORD / HOST / PORT
+    POSTGRESQL_DB_REPLICAS=pg-ro-1*3,pg-ro-2:5433   # read replicas (host[:port][*weight])
+    MONGO_MAX_POOL_SIZE=100              # pymongo pool of every alias
+    MONGO_BOOK_MAX_POOL_SIZE=200         # ... but bigger for 'book'
+    MONGO_WAIT_QUEUE_TIMEOUT_MS=2000
+
+SQL connections are kept open for ``CONN_MAX_AGE`` seconds and checked
+before reuse (``CONN_HEALTH_CHECKS``). Django keeps one connection per
+thread and alias, so the number of SQL connections is bounded by the number
+of worker threads. Every MongoEngine alias gets its own pymongo pool
+(``maxPoolSize``, ``minPoolSize``, timeouts). The aliases are registered
+once, by ``django_mongoengine`` when the app registry is ready; the client is
+created on first use (or at startup with ``MONGO_CONNECT_EAGERLY=1``, see
+``connect_mongo_aliases``) and re-created after a fork
+(``install_mongo_fork_handler``). ``pool_stats()`` reports the
+saturation of both: open / in use / waiting connections and checkout
+timeouts for Mongo, connections opened in total and currently open for SQL.
+
+This module is imported by the settings, so it must not touch
+``django.conf.settings`` at import time, nor import modules that do (the
+command timer of ``ecommerce.instrumentation`` is imported on first use).
+"""
+import os
+import threading
+import weakref
+
+from pymongo import monitoring
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def env(*names, default=None, cast=str):
+    """
+    Giá trị của biến môi trường đầu tiên có trong ``names`` (ép kiểu bằng ``cast``),
+    hoặc ``default``.
+    """
+    for key in names:
+        value = os.environ.get(key)
+        if value is not None and value != '':
+            if cast is bool:
+                return value.strip().lower() in TRUE_VALUES
+            return cast(value)
+    return default
+
+
+def sql_database(alias, engine, name, user, password, host, port, conn_max_age=60):
+    """
+    Cấu hình ``DATABASES[alias]``: kết nối persistent, health check và timeout
+    lấy từ ``<ALIAS>_DB_*`` / ``DB_*``.
+    """
+    prefix = f"{alias.upper()}_DB_"
+
+    def option(key, default, cast=int):
+        return env(prefix + key, 'DB_' + key, default=default, cast=cast)
+
+    options = {'connect_timeout': option('CONNECT_TIMEOUT', 5)}
+    if engine.endswith('mysql'):
+        options['read_timeout'] = option('READ_TIMEOUT', 30)
+        options['write_timeout'] = option('WRITE_TIMEOUT', 30)
+    elif engine.endswith('postgresql'):
+        options['options'] = f"-c statement_timeout={option('STATEMENT_TIMEOUT_MS', 30000)}"
+    return {
+        'ENGINE': engine,
+        'NAME': env(prefix + 'NAME', default=name),
+        'USER': env(prefix + 'USER', default=user),
+        'PASSWORD': env(prefix + 'PASSWORD', default=password),
+        'HOST': env(prefix + 'HOST', default=host),
+        'PORT': env(prefix + 'PORT', default=port),
+        'CONN_MAX_AGE': option('CONN_MAX_AGE', conn_max_age),
+        'CONN_HEALTH_CHECKS': option('CONN_HEALTH_CHECKS', True, bool),
+        'OPTIONS': options,
+    }
+
+
+def sql_replicas(databases):
+    """
+    Thêm các read replica khai báo trong ``<ALIAS>_DB_REPLICAS`` vào
+    ``databases`` và trả về ``DATABASE_REPLICAS`` (``{primary: {replica: weight}}``)::
+
+        POSTGRESQL_DB_REPLICAS=pg-replica-1:5432*3,pg-replica-2*1
+
+    Mỗi replica (``<alias>_replica_<n>``) dùng lại cấu hình của primary, chỉ
+    khác host / port (``*weight`` mặc định là 1); khi chạy test nó là mirror
+    của primary.
+    """
+    replicas = {}
+    for alias, primary in list(databases.items()):
+        spec = env(f"{alias.upper()}_DB_REPLICAS", default='')
+        for number, entry in enumerate(filter(None, (e.strip() for e in spec.split(','))), start=1):
+            address, _, weight = entry.partition('*')
+            host, _, port = address.partition(':')
+            replica = f"{alias}_replica_{number}"
+            databases[replica] = {
+                **primary,
+                'HOST': host,
+                'PORT': port or primary['PORT'],
+                'TEST': {'MIRROR': alias},
+            }
+            replicas.setdefault(alias, {})[replica] = int(weight or 1)
+    return replicas
+
+
+def mongo_database(alias, name, host='localhost', port=27017):
+    """
+    Tham số ``register_connection`` của một alias MongoEngine, lấy từ
+    ``MONGO_<ALIAS>_*`` / ``MONGO_*``; các key ngoài ``name`` / ``host`` /
+    ``port`` / ``authentication_source`` được chuyển cho ``MongoClient``.
+    """
+    prefix = f"MONGO_{alias.upper()}_"
+
+    def option(key, default, cast=int):
+        return env(prefix + key, 'MONGO_' + key, default=default, cast=cast)
+
+    max_pool_size = option('MAX_POOL_SIZE', 100)
+    monitor = mongo_pool_monitor(alias)
+    monitor.max_pool_size = max_pool_size
+    return {
+        'name': env(prefix + 'NAME', default=name),
+        'host': option('HOST', host, str),
+        'port': option('PORT', port),
+        'authentication_source': 'admin',
+        'maxPoolSize': max_pool_size,
+        'minPoolSize': option('MIN_POOL_SIZE', 0),
+        'maxIdleTimeMS': option('MAX_IDLE_TIME_MS', 300000),
+        'waitQueueTimeoutMS': option('WAIT_QUEUE_TIMEOUT_MS', 2000),
+        'connectTimeoutMS': option('CONNECT_TIMEOUT_MS', 5000),
+        'serverSelectionTimeoutMS': option('SERVER_SELECTION_TIMEOUT_MS', 5000),
+        'socketTimeoutMS': option('SOCKET_TIMEOUT_MS', 30000),
+        # Không mở kết nối / thread monitor khi tạo client, chỉ khi có thao tác đầu tiên
+        # (MONGO_CONNECT_EAGERLY=1: kết nối ngay như trước, để so sánh khi benchmark)
+        'connect': env('MONGO_CONNECT_EAGERLY', default=False, cast=bool),
+        'event_listeners': [monitor, MongoCommandListener(alias)],
+    }
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Chuyển event command của một alias cho ``MongoCommandTimer``, import ở
+    event đầu tiên chứ không phải lúc load settings.
+    """
+    def __init__(self, alias):
+        self.alias = alias
+        self._timer = None
+
+    @property
+    def timer(self):
+        if self._timer is None:
+            from ecommerce.instrumentation import MongoCommandTimer
+            self._timer = MongoCommandTimer(self.alias)
+        return self._timer
+
+    def started(self, event):
+        self.timer.started(event)
+
+    def succeeded(self, event):
+        self.timer.succeeded(event)
+
+    def failed(self, event):
+        self.timer.failed(event)
+
+
+def connect_mongo_aliases(aliases):
+    """
+    Tạo ngay ``MongoClient`` cho các alias (``MONGO_CONNECT_EAGERLY=1``). Các
+    alias do ``django_mongoengine`` đăng ký khi app registry sẵn sàng, nên hàm
+    này chỉ gọi được sau đó (``CatalogConfig.ready``).
+    """
+    from mongoengine import connection
+
+    for alias in aliases:
+        connection.get_connection(alias)
+
+
+_fork_handler_installed = False
+
+
+def install_mongo_fork_handler():
+    """
+    Sau khi fork (gunicorn ``--preload``, multiprocessing), tiến trình con bỏ
+    các client kế thừa từ tiến trình cha và tự kết nối lại ở lần dùng đầu tiên.
+    """
+    global _fork_handler_installed
+    if not _fork_handler_installed and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=reset_mongo_connections)
+        _fork_handler_installed = True
+
+
+def reset_mongo_connections():
+    """
+    Bỏ các ``MongoClient`` đã tạo (không ``close``: socket của chúng thuộc về
+    tiến trình cha) và collection đã cache trên các Document; cấu hình alias
+    được giữ nguyên nên lần dùng tiếp theo sẽ kết nối lại.
+    """
+    from mongoengine import connection
+    from mongoengine.base.common import _document_registry
+
+    connection._connections.clear()
+    connection._dbs.clear()
+    for document in _document_registry.values():
+        if '_collection' in document.__dict__:
+            document._collection = None
+    for monitor in _mongo_monitors.values():
+        monitor.reset()
+
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Đếm trạng thái pool của một alias qua các event CMAP của pymongo.
+    """
+    def __init__(self, alias):
+        self.alias = alias
+        self.max_pool_size = None
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.timeouts = 0
+        self.pool_clears = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.open = self.in_use = self.waiting = 0
+            self.checkouts = self.checkout_failures = self.timeouts = self.pool_clears = 0
+
+    def pool_created(self, event):
+        with self._lock:
+            self.max_pool_size = event.options.get('maxPoolSize', self.max_pool_size)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.timeouts += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_pool_size': self.max_pool_size,
+                'open': self.open,
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'timeouts': self.timeouts,
+                'pool_clears': self.pool_clears,
+                'saturation': self.in_use / self.max_pool_size if self.max_pool_size else 0.0,
+            }
+
+
+_mongo_monitors = {}
+_mongo_monitors_lock = threading.Lock()
+
+
+def mongo_pool_monitor(alias):
+    with _mongo_monitors_lock:
+        if alias not in _mongo_monitors:
+            _mongo_monitors[alias] = MongoPoolMonitor(alias)
+        return _mongo_monitors[alias]
+
+
+class SqlConnectionTracker:
+    """
+    Đếm kết nối SQL theo alias qua signal ``connection_created``: tổng số lần
+    mở kết nối và số kết nối (thread) đang mở.
+    """
+    def __init__(self):
+        self.opened = {}
+        self._wrappers = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def connection_created(self, sender, connection, **kwargs):
+        with self._lock:
+            self.opened[connection.alias] = self.opened.get(connection.alias, 0) + 1
+            self._wrappers.add(connection)
+
+    def install(self):
+        from django.db.backends.signals import connection_created
+        connection_created.connect(self.connection_created, dispatch_uid='ecommerce.sql_connection_tracker')
+
+    def stats(self):
+        with self._lock:
+            wrappers = list(self._wrappers)
+            opened = dict(self.opened)
+        stats = {}
+        for alias, count in opened.items():
+            open_wrappers = [w for w in wrappers if w.alias == alias and w.connection is not None]
+            stats[alias] = {
+                'opened': count,
+                'open': len(open_wrappers),
+                'conn_max_age': open_wrappers[0].settings_dict.get('CONN_MAX_AGE') if open_wrappers else None,
+            }
+        return stats
+
+
+sql_connection_tracker = SqlConnectionTracker()
+
+
+def create_cache_tables(using, **kwargs):
+    """
+    Receiver của ``post_migrate``: tạo bảng của các cache ``DatabaseCache``
+    (``shared``) như ``manage.py createcachetable``, nên ``migrate`` là đủ khi deploy.
+    """
+    from django.core.management import call_command
+    call_command('createcachetable', database=using, verbosity=0)
+
+
+def pool_stats():
+    """Trạng thái pool của các alias SQL và MongoDB."""
+    return {
+        'sql': sql_connection_tracker.stats(),
+        'mongo': {alias: monitor.stats() for alias, monitor in sorted(_mongo_monitors.items())},
+    }
@@ -0,0 +1,121 @@
+"""
+Sparse fieldsets: ``?fields=id,title,price``.
+
+``SparseFieldsetSerializerMixin`` trims the serializer output to the requested
+fields (input of POST / PUT / PATCH is validated against every field), and ``SparseFieldsetMixin`` pushes the same list down to the database
+as ``.only()`` (MongoEngine or Django ORM), so unused fields such as
+``description`` are never fetched.
+"""
+from functools import lru_cache
+
+from mongoengine.queryset.base import BaseQuerySet
+
+FIELDS_PARAM = 'fields'
+
+
+def requested_fields(request):
+    """Danh sách field trong ``?fields=``, hoặc ``None`` nếu không có."""
+    if request is None or not hasattr(request, 'query_params'):
+        return None
+    raw = request.query_params.get(FIELDS_PARAM)
+    if not raw:
+        return None
+    return [name.strip() for name in raw.split(',') if name.strip()]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Output chỉ giữ lại các field được yêu cầu qua ``?fields=`` (hoặc tham số
+    ``fields=``); các field ghi không bị bỏ, nên ``?fields=`` không làm mất input.
+
+    ``projection_dependencies`` khai báo các field của model mà một field tính
+    toán (property, method) cần, để view có thể projection an toàn.
+    """
+    projection_dependencies = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            fields = requested_fields(self.context.get('request'))
+        self.sparse_fields = frozenset(fields) if fields else None
+
+    @property
+    def _readable_fields(self):
+        # Chỉ to_representation dùng _readable_fields; _writable_fields giữ nguyên
+        for field in super()._readable_fields:
+            if self.sparse_fields is None or field.field_name in self.sparse_fields:
+                yield field
+
+
+@lru_cache(maxsize=None)
+def serializer_sources(serializer_class):
+    """``{serializer field: source gốc}`` của một serializer class (tính một lần)."""
+    return {name: field.source.split('.')[0] for name, field in serializer_class().fields.items()}
+
+
+def model_field_names(queryset):
+    """(field được projection, quan hệ ngược) của model/document của queryset."""
+    if isinstance(queryset, BaseQuerySet):
+        return set(queryset._document._fields), set()
+    opts = queryset.model._meta
+    return (
+        {field.name for field in opts.concrete_fields},
+        {rel.get_accessor_name() for rel in opts.related_objects},
+    )
+
+
+def projection_for(serializer_class, queryset, fields):
+    """
+    Các field của model cần load cho ``fields``, hoặc ``None`` nếu không thể
+    xác định chắc chắn (khi đó load toàn bộ như bình thường).
+    """
+    concrete, related = model_field_names(queryset)
+    sources = serializer_sources(serializer_class)
+    dependencies = getattr(serializer_class, 'projection_dependencies', {})
+    only = {'id'}
+    for name in fields:
+        if name in dependencies:
+            only.update(dependencies[name])
+        elif name not in sources or sources[name] in related:
+            continue
+        elif sources[name] in concrete:
+            only.add(sources[name])
+        else:
+            return None
+    return only
+
+
+class SparseFieldsetMixin:
+    """
+    Projection ``.only()`` cho các request GET có ``?fields=``.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request)
+        if not fields or self.request.method != 'GET':
+            return queryset
+
+        only = projection_for(self.get_serializer_class(), queryset, fields)
+        if only is None:
+            return queryset
+        # Phân trang keyset cần field dùng làm cursor
+        ordering_field = getattr(self.paginator, 'ordering_field', None)
+        if ordering_field:
+            only.add(ordering_field)
+
+        if not isinstance(queryset, BaseQuerySet):
+            # Bỏ các prefetch không còn được serialize (ví dụ 'items' của Cart)
+            lookups = [
+                lookup for lookup in queryset._prefetch_related_lookups
+                if str(lookup).split('__')[0] in fields
+            ]
+            queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+            # select_related chỉ được giữ cho các quan hệ vẫn được load
+            select_related = queryset.query.select_related
+            if isinstance(select_related, dict):
+                kept = [name for name in select_related if name in only]
+                queryset = queryset.select_related(None)
+                if kept:
+                    queryset = queryset.select_related(*kept)
+        return queryset.only(*only)
@@ -0,0 +1,189 @@
+"""
+Declarative filtering, sorting and faceting for the MongoEngine catalog viewsets.
+
+A ``CatalogFilterSet`` is declared once per viewset and compiles its filter
+spec into a lookup table up front. At request time the query params are
+turned into a single MongoEngine query (so it can use the catalog indexes).
+Facet counts for every facet field plus price buckets come from one
+``$facet`` aggregation instead of one count query per value.
+
+    ?brand=Nike,Adidas          -> brand in [...]
+    ?price_min=10&price_max=50  -> 10 <= price <= 50
+    ?available=true             -> available == True
+    ?ordering=-price            -> order_by('-price', '-id')
+"""
+from mongoengine.errors import ValidationError as MongoValidationError
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.response import Response
+
+from .pagination import StandardResultsSetPagination
+
+TRUE_VALUES = {'true', '1', 'yes'}
+FALSE_VALUES = {'false', '0', 'no'}
+
+
+def field_converter(field):
+    """Chuyển giá trị query param sang kiểu của field và validate."""
+    def convert(raw):
+        value = field.to_python(raw)
+        field.validate(value)
+        return value
+    return convert
+
+
+class CatalogFilterSet:
+    """
+    ``filters`` maps a field to one or more of ``'in'``, ``'range'``, ``'bool'``.
+    """
+    ordering_param = 'ordering'
+
+    def __init__(self, document, filters, ordering=(), facets=(), price_buckets=()):
+        self.document = document
+        self.ordering_fields = set(ordering)
+        self.facets = tuple(facets)
+        self.price_buckets = list(price_buckets)
+        # Compile: query param -> (field, lookup, converter)
+        self.params = {}
+        for field_name, kinds in filters.items():
+            kinds = (kinds,) if isinstance(kinds, str) else kinds
+            convert = field_converter(document._fields[field_name])
+            for kind in kinds:
+                if kind == 'in':
+                    self.params[field_name] = (field_name, 'in', convert)
+                elif kind == 'range':
+                    self.params[f'{field_name}_min'] = (field_name, 'gte', convert)
+                    self.params[f'{field_name}_max'] = (field_name, 'lte', convert)
+                elif kind == 'bool':
+                    self.params[field_name] = (field_name, 'bool', None)
+                else:
+                    raise ValueError(f"Unknown filter kind: {kind}")
+
+    def compile(self, query_params, only=None, exclude=()):
+        """Query params -> kwargs cho ``QuerySet.filter``."""
+        kwargs = {}
+        for param, (field_name, lookup, convert) in self.params.items():
+            raw = query_params.get(param)
+            if raw in (None, '') or field_name in exclude or (only is not None and field_name not in only):
+                continue
+            try:
+                if lookup == 'in':
+                    values = [convert(value) for value in raw.split(',') if value]
+                    if len(values) == 1:
+                        kwargs[field_name] = values[0]
+                    else:
+                        kwargs[f'{field_name}__in'] = values
+                elif lookup == 'bool':
+                    if raw.lower() not in TRUE_VALUES | FALSE_VALUES:
+                        raise ValueError(raw)
+                    kwargs[field_name] = raw.lower() in TRUE_VALUES
+                else:
+                    kwargs[f'{field_name}__{lookup}'] = convert(raw)
+            except (TypeError, ValueError, ArithmeticError, MongoValidationError):
+                raise serializers.ValidationError({param: f"Invalid value: {raw}"})
+        return kwargs
+
+    def get_ordering(self, query_params):
+        raw = query_params.get(self.ordering_param)
+        if not raw:
+            return None
+        ordering = []
+        for term in raw.split(','):
+            if term.lstrip('-') not in self.ordering_fields:
+                raise serializers.ValidationError({self.ordering_param: f"Cannot order by: {term}"})
+            ordering.append(term)
+        return ordering + ['-id']
+
+    def filter_queryset(self, queryset, query_params):
+        queryset = queryset.filter(**self.compile(query_params))
+        ordering = self.get_ordering(query_params)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def match(self, kwargs):
+        """kwargs -> raw Mongo query (dùng cho ``$match`` trong aggregation)."""
+        return self.document.objects.filter(**kwargs)._query if kwargs else {}
+
+    def facet_counts(self, queryset, query_params):
+        """
+        Đếm theo từng facet bằng một aggregation ``$facet`` duy nhất.
+
+        Bộ lọc của chính một facet không áp dụng cho facet đó (disjunctive
+        faceting), nên client vẫn thấy các lựa chọn khác của facet đang chọn.
+        """
+        queryset = queryset.filter(**self.compile(query_params, exclude=self.facets)).order_by()
+        branches = {}
+        for facet in self.facets:
+            others = self.compile(query_params, only=[f for f in self.facets if f != facet])
+            stages = [{'$match': self.match(others)}] if others else []
+            db_field = self.document._fields[facet].db_field
+            branches[facet] = stages + [
+                {'$group': {'_id': f'${db_field}', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+            ]
+        if self.price_buckets:
+            selected = self.compile(query_params, only=self.facets)
+            stages = [{'$match': self.match(selected)}] if selected else []
+            # Sản phẩm chưa có giá (hoặc giá dưới mốc đầu) không thuộc bucket nào;
+            # nếu không lọc, '$bucket' gom chúng vào 'other' cùng nhóm giá cao nhất
+            price_field = self.document._fields['price'].db_field
+            stages.append({'$match': {price_field: {'$ne': None, '$gte': self.price_buckets[0]}}})
+            branches['price'] = stages + [{'$bucket': {
+                'groupBy': '$price',
+                'boundaries': self.price_buckets,
+                'default': 'other',
+                'output': {'count': {'$sum': 1}},
+            }}]
+        if not branches:
+            return {}
+
+        result = next(iter(queryset.aggregate([{'$facet': branches}])), {})
+        facets = {}
+        for facet, buckets in result.items():
+            if facet == 'price':
+                bounds = dict(zip(self.price_buckets, self.price_buckets[1:]))
+                facets[facet] = [
+                    {'min': bucket['_id'], 'max': bounds.get(bucket['_id']), 'count': bucket['count']}
+                    if bucket['_id'] != 'other' else {'min': self.price_buckets[-1], 'max': None, 'count': bucket['count']}
+                    for bucket in buckets
+                ]
+            else:
+                facets[facet] = [{'value': bucket['_id'], 'count': bucket['count']} for bucket in buckets]
+        return facets
+
+
+class CatalogFilterBackend(BaseFilterBackend):
+    """
+    Áp dụng ``view.filterset`` cho danh sách của viewset.
+    """
+    def filter_queryset(self, request, queryset, view):
+        filterset = getattr(view, 'filterset', None)
+        if filterset is None or getattr(view, 'action', 'list') not in ('list', None):
+            return queryset
+        return filterset.filter_queryset(queryset, request.query_params)
+
+
+class CatalogFilterMixin:
+    """
+    Gắn bộ lọc / sắp xếp và endpoint ``facets/`` cho viewset của catalog.
+    """
+    filterset = None
+    filter_backends = [CatalogFilterBackend]
+
+    @property
+    def paginator(self):
+        # Phân trang keyset chỉ áp dụng cho thứ tự mặc định (created, id)
+        if not hasattr(self, '_paginator') and self.filterset is not None:
+            if self.filterset.get_ordering(self.request.query_params):
+                self._paginator = StandardResultsSetPagination()
+        return super().paginator
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Số lượng sản phẩm theo từng facet (brand, size, color, khoảng giá, ...).
+        Ví dụ: /api/shoes/facets/?brand=Nike&price_max=200
+        """
+        return Response(self.filterset.facet_counts(self.get_queryset(), request.query_params))
@@ -0,0 +1,132 @@
+"""
+``Idempotency-Key`` support for write endpoints (payments, checkout).
+
+The first request with a given key runs normally and its response is stored
+for ``TTL`` seconds; a retry with the same key gets the stored response back
+without touching the database write path or the payment gateway. While the
+first request is still running, a concurrent retry gets ``409 Conflict``;
+reusing a key with a different body gets ``422``.
+
+Entries are kept in Django's cache framework (``IDEMPOTENCY['CACHE_ALIAS']``,
+the ``shared`` cache by default) as a compact ``(fingerprint, status, data)``
+tuple and expire through the cache TTL. The alias must be shared by every
+worker (database, Redis, memcached): with a per-process cache a retry that
+lands on another worker would charge again. The in-progress marker expires
+after ``LOCK_TTL`` seconds; endpoints that may call a payment gateway pass a
+longer ``lock_ttl`` derived from the gateway timeouts
+(``payment.gateways.charge_lock_ttl``).
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY = getattr(settings, 'IDEMPOTENCY', {})
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+IN_PROGRESS = 'in-progress'
+
+
+class IdempotencyStore:
+    """
+    Key store: ``key -> (fingerprint, status_code, data)`` với TTL.
+    """
+    def __init__(self, ttl=86400, lock_ttl=60, cache_alias='shared'):
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def make_key(scope, user_id, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        return f"idem:{scope}:{user_id}:{digest}"
+
+    @staticmethod
+    def fingerprint(data):
+        body = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(body.encode('utf-8')).hexdigest()[:16]
+
+    def begin(self, cache_key, lock_ttl=None):
+        """
+        Đánh dấu key đang được xử lý (tối đa ``lock_ttl`` giây). Trả về ``None``
+        nếu request này được chạy, hoặc giá trị đang có (``IN_PROGRESS`` /
+        response đã lưu) nếu không.
+        """
+        if self.cache.add(cache_key, IN_PROGRESS, lock_ttl or self.lock_ttl):
+            return None
+        return self.cache.get(cache_key, IN_PROGRESS)
+
+    def finish(self, cache_key, fingerprint, response):
+        if response.status_code >= 500:
+            # Lỗi server: cho phép client retry với cùng key
+            self.cache.delete(cache_key)
+        else:
+            self.cache.set(cache_key, (fingerprint, response.status_code, response.data), self.ttl)
+
+    def abort(self, cache_key):
+        self.cache.delete(cache_key)
+
+
+idempotency_store = IdempotencyStore(
+    ttl=IDEMPOTENCY.get('TTL', 86400),
+    lock_ttl=IDEMPOTENCY.get('LOCK_TTL', 60),
+    cache_alias=IDEMPOTENCY.get('CACHE_ALIAS', 'shared'),
+)
+
+
+def idempotent(scope, store=idempotency_store, lock_ttl=None):
+    """
+    Decorator cho method ``create`` / ``post`` của view DRF.
+    Request không có header ``Idempotency-Key`` được xử lý như bình thường.
+    ``lock_ttl`` (giây, hoặc callable trả về số giây) thay ``LOCK_TTL`` của store.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            user_id = getattr(request.user, 'pk', None)
+            cache_key = store.make_key(scope, user_id, key)
+            fingerprint = store.fingerprint(request.data)
+
+            stored = store.begin(cache_key, lock_ttl() if callable(lock_ttl) else lock_ttl)
+            if stored == IN_PROGRESS:
+                return Response(
+                    {'error': 'A request with this Idempotency-Key is already in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if stored is not None:
+                stored_fingerprint, status_code, data = stored
+                if stored_fingerprint != fingerprint:
+                    return Response(
+                        {'error': f'{HEADER} was already used with a different request body'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return Response(data, status=status_code, headers={REPLAYED_HEADER: 'true'})
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except BaseException:
+                store.abort(cache_key)
+                raise
+            store.finish(cache_key, fingerprint, response)
+            return response
+        return wrapper
+    return decorator
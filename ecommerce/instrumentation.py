@@ -0,0 +1,249 @@
+"""
+Per-request performance instrumentation.
+
+``RequestInstrumentationMiddleware`` records for every request:
+
+* wall time;
+* SQL query count and time per alias (``connection.execute_wrapper``);
+* MongoDB command count and time per alias (a pymongo ``CommandListener``
+  registered on each alias by ``ecommerce.connections.mongo_database``);
+* outbound HTTP calls made through ``InstrumentedSession`` (the cart's
+  service clients), which also feed the ``service_request_*`` metrics.
+
+The totals are logged as one JSON line on the ``ecommerce.instrumentation``
+logger and, with ``INSTRUMENTATION['SERVER_TIMING']`` on, sent back as a
+``Server-Timing`` header (visible in the browser dev tools). The header
+exposes internal DB / service timings to every client, so it is off by
+default: turn it on in development only. Requests slower than
+``INSTRUMENTATION['SLOW_REQUEST_MS']`` are sampled
+(``INSTRUMENTATION['SLOW_SAMPLE_RATE']``) and logged at WARNING with their
+statements grouped by fingerprint (literals replaced by ``?``), which makes
+N+1 patterns stand out.
+
+Outside a request (management commands, workers) nothing is recorded. Work
+submitted to a thread pool is only attributed to the request when it runs in
+a copy of the request's context (``contextvars.copy_context().run``).
+"""
+import contextlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+import requests
+from pymongo import monitoring
+
+from ecommerce.metrics import observe_service_call
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('ecommerce_request_metrics', default=None)
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SQL_IN_LISTS = re.compile(r"\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def sql_fingerprint(sql):
+    """``SELECT ... WHERE id IN (1, 2, 3) AND name = 'x'`` -> ``... IN (...) AND name = ?``."""
+    sql = SQL_LITERALS.sub('?', sql)
+    sql = SQL_IN_LISTS.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def mongo_fingerprint(command_name, command):
+    """``find books {author, price}``: command, collection và các key của filter."""
+    collection = command.get(command_name)
+    query = command.get('filter') or command.get('query') or {}
+    if command_name == 'aggregate':
+        stages = [next(iter(stage), '') for stage in command.get('pipeline', ())]
+        return f"aggregate {collection} [{', '.join(stages)}]"
+    keys = ', '.join(sorted(query)) if isinstance(query, dict) else ''
+    return f"{command_name} {collection} {{{keys}}}"
+
+
+class RequestMetrics:
+    """
+    Số liệu của một request. Các thread của pool (HTTP song song) ghi vào
+    cùng một object nên mọi thao tác ghi đều lấy lock.
+    """
+    def __init__(self, max_statements=200):
+        self.start = time.perf_counter()
+        self.max_statements = max_statements
+        self.sql = {}    # alias -> [count, ms]
+        self.mongo = {}  # alias -> [count, ms]
+        self.http = [0, 0.0]
+        self.statements = []  # (kind, alias, text, ms), tối đa max_statements
+        self.dropped = 0
+        self.pending_commands = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, alias, text, ms):
+        with self._lock:
+            if kind == 'http':
+                counter = self.http
+            else:
+                counter = getattr(self, kind).setdefault(alias, [0, 0.0])
+            counter[0] += 1
+            counter[1] += ms
+            if len(self.statements) < self.max_statements:
+                self.statements.append((kind, alias, text, ms))
+            else:
+                self.dropped += 1
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, total_ms):
+        entries = [f"total;dur={total_ms:.1f}"]
+        for alias, (count, ms) in sorted(self.sql.items()):
+            entries.append(f'sql-{alias};dur={ms:.1f};desc="{count} queries"')
+        for alias, (count, ms) in sorted(self.mongo.items()):
+            entries.append(f'mongo-{alias};dur={ms:.1f};desc="{count} commands"')
+        if self.http[0]:
+            entries.append(f'http;dur={self.http[1]:.1f};desc="{self.http[0]} calls"')
+        return ', '.join(entries)
+
+    def summary(self, total_ms):
+        return {
+            'duration_ms': round(total_ms, 2),
+            'sql': {alias: {'count': c, 'ms': round(ms, 2)} for alias, (c, ms) in self.sql.items()},
+            'mongo': {alias: {'count': c, 'ms': round(ms, 2)} for alias, (c, ms) in self.mongo.items()},
+            'http': {'count': self.http[0], 'ms': round(self.http[1], 2)},
+        }
+
+    def fingerprints(self, limit=20):
+        """Các statement gom theo fingerprint, tốn thời gian nhất trước."""
+        groups = {}
+        for kind, alias, text, ms in self.statements:
+            fingerprint = sql_fingerprint(text) if kind == 'sql' else text
+            group = groups.setdefault((kind, alias, fingerprint), [0, 0.0])
+            group[0] += 1
+            group[1] += ms
+        ranked = sorted(groups.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [
+            {'kind': kind, 'alias': alias, 'fingerprint': fingerprint, 'count': count, 'ms': round(ms, 2)}
+            for (kind, alias, fingerprint), (count, ms) in ranked
+        ]
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def record_request(max_statements=200):
+    metrics = RequestMetrics(max_statements=max_statements)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record('sql', context['connection'].alias, sql, (time.perf_counter() - start) * 1000)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Thời gian các command MongoDB của một alias. pymongo phát event trong
+    thread gửi command, nên ``_current`` là request đang chạy.
+    """
+    def __init__(self, alias):
+        self.alias = alias
+
+    def started(self, event):
+        metrics = _current.get()
+        if metrics is not None:
+            key = (event.connection_id, event.request_id)
+            metrics.pending_commands[key] = mongo_fingerprint(event.command_name, event.command)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        metrics = _current.get()
+        if metrics is not None:
+            fingerprint = metrics.pending_commands.pop((event.connection_id, event.request_id), event.command_name)
+            metrics.record('mongo', self.alias, fingerprint, event.duration_micros / 1000)
+
+
+class InstrumentedSession(requests.Session):
+    """
+    ``requests.Session`` ghi lại thời gian mỗi request HTTP gửi đi: vào request
+    đang chạy và, nếu có ``service``, vào metrics ``service_request_*``.
+    """
+    def __init__(self, service=None):
+        super().__init__()
+        self.service = service
+
+    def request(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.service is not None:
+                observe_service_call(self.service, method, status, elapsed)
+            metrics = _current.get()
+            if metrics is not None:
+                parts = urlsplit(url)
+                metrics.record('http', parts.netloc, f"{method.upper()} {parts.netloc}{parts.path}", elapsed * 1000)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Đo mỗi request: header ``Server-Timing`` và một dòng log JSON; request
+    chậm được lấy mẫu kèm fingerprint của các statement.
+    """
+    def __init__(self, get_response):
+        from django.conf import settings
+        from django.db import connections
+        self.get_response = get_response
+        self.connections = connections
+        options = getattr(settings, 'INSTRUMENTATION', {})
+        self.server_timing = options.get('SERVER_TIMING', False)
+        self.slow_request_ms = options.get('SLOW_REQUEST_MS', 500)
+        self.slow_sample_rate = options.get('SLOW_SAMPLE_RATE', 1.0)
+        self.max_statements = options.get('MAX_STATEMENTS', 200)
+
+    def __call__(self, request):
+        with record_request(self.max_statements) as metrics, contextlib.ExitStack() as stack:
+            for connection in self.connections.all(initialized_only=False):
+                stack.enter_context(connection.execute_wrapper(sql_execute_wrapper))
+            response = self.get_response(request)
+        total_ms = metrics.elapsed_ms()
+
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(total_ms)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **metrics.summary(total_ms),
+        }
+        if total_ms >= self.slow_request_ms and random.random() < self.slow_sample_rate:
+            record['statements'] = metrics.fingerprints()
+            record['statements_dropped'] = metrics.dropped
+            logger.warning(json.dumps(record), extra={'request_metrics': record})
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record), extra={'request_metrics': record})
+        return response
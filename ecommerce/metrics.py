@@ -0,0 +1,394 @@
+"""
+Prometheus-style metrics: counters and fixed-bucket histograms, exposed in
+the text format at ``/metrics``.
+
+Every thread writes to its own shard, so ``inc`` / ``observe`` take no lock:
+
+* single process: the shard is a dict, and a scrape sums all shards of the
+  process;
+* several processes (gunicorn workers): set ``METRICS_MULTIPROC_DIR`` to an
+  empty directory shared by the workers. Each thread then writes to its own
+  mmap'd file ``<pid>-<thread id>.db``, and a scrape on any worker sums every
+  file in the directory. Files of dead workers are removed when a process
+  starts (or forks a worker), so a restart begins from zero like any
+  Prometheus counter reset.
+
+Histograms store non-cumulative bucket counts plus ``_sum`` / ``_count``;
+the ``le`` buckets are accumulated when the text is rendered.
+
+This module is imported by ``ecommerce.instrumentation``, so it must not
+touch ``django.conf.settings`` at import time.
+"""
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def sample_key(name, labels):
+    """Key của một sample trong shard: ``["name", [["label", "value"], ...]]``."""
+    return json.dumps([name, labels], separators=(',', ':'))
+
+
+class DictShard:
+    def __init__(self):
+        self.values = {}
+
+    def inc(self, key, amount):
+        # Chỉ thread sở hữu shard ghi vào dict này
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def items(self):
+        return list(self.values.items())
+
+
+class MmapShard:
+    """
+    File ``[used: u64][entry...]``, mỗi entry là
+    ``[len: u32][key utf-8, pad tới bội số của 8][value: f64]``.
+    ``used`` chỉ được cập nhật sau khi entry đã ghi xong, nên tiến trình đọc
+    không bao giờ thấy entry dở dang.
+    """
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self.INITIAL_SIZE:
+            self._file.truncate(self.INITIAL_SIZE)
+            size = self.INITIAL_SIZE
+        self._capacity = size
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from('Q', self._map, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            struct.pack_into('Q', self._map, 0, self._used)
+        self._positions = {key: position for key, _, position in read_entries(self._map, self._used)}
+
+    def inc(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        value = struct.unpack_from('d', self._map, position)[0]
+        struct.pack_into('d', self._map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        header = 4 + len(encoded)
+        header += -header % 8
+        if self._used + header + 8 > self._capacity:
+            self._grow(self._used + header + 8)
+        struct.pack_into(f'I{len(encoded)}s', self._map, self._used, len(encoded), encoded)
+        position = self._used + header
+        struct.pack_into('d', self._map, position, 0.0)
+        self._used = position + 8
+        struct.pack_into('Q', self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def _grow(self, needed):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._map.close()
+        self._file.truncate(capacity)
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+        self._capacity = capacity
+
+    def items(self):
+        return [(key, value) for key, value, _ in read_entries(self._map, self._used)]
+
+
+def read_entries(data, used):
+    position = 8
+    while position < used:
+        length = struct.unpack_from('I', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode('utf-8')
+        position += 4 + length
+        position += -position % 8
+        yield key, struct.unpack_from('d', data, position)[0], position
+        position += 8
+
+
+def read_multiprocess_dir(path):
+    """Tổng các sample của mọi file ``*.db`` trong ``path``."""
+    totals = {}
+    for filename in glob.glob(os.path.join(path, '*.db')):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if len(data) < 8:
+            continue
+        used = min(struct.unpack_from('Q', data, 0)[0], len(data))
+        for key, value, _ in read_entries(data, used):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Tiến trình của user khác vẫn đang chạy
+        return True
+    return True
+
+
+def remove_dead_process_files(path):
+    """Xoá các file ``<pid>-<thread id>.db`` của tiến trình đã chết trong ``path``."""
+    for filename in glob.glob(os.path.join(path, '*.db')):
+        pid = os.path.basename(filename).split('-', 1)[0]
+        if pid.isdigit() and not process_alive(int(pid)):
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                # Tiến trình khác vừa xoá trước
+                pass
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """Child đã bind nhãn (được cache: key của sample chỉ tạo một lần)."""
+        child = self._children.get(values)
+        if child is None:
+            labels = [[name, str(value)] for name, value in zip(self.labelnames, values)]
+            child = self._children.setdefault(values, self.bind(labels))
+        return child
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def bind(self, labels):
+        return BoundCounter(self.registry, sample_key(self.name, labels))
+
+
+class BoundCounter:
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def inc(self, amount=1.0):
+        self.registry.shard().inc(self.key, amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def bind(self, labels):
+        return BoundHistogram(self, labels)
+
+
+class BoundHistogram:
+    def __init__(self, histogram, labels):
+        self.registry = histogram.registry
+        self.buckets = histogram.buckets
+        self.bucket_keys = tuple(
+            sample_key(f'{histogram.name}_bucket', labels + [['le', format_value(bound)]])
+            for bound in self.buckets
+        )
+        self.sum_key = sample_key(f'{histogram.name}_sum', labels)
+        self.count_key = sample_key(f'{histogram.name}_count', labels)
+
+    def observe(self, value):
+        shard = self.registry.shard()
+        shard.inc(self.bucket_keys[bisect_left(self.buckets, value)], 1.0)
+        shard.inc(self.sum_key, value)
+        shard.inc(self.count_key, 1.0)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def escape_label(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{label}="{escape_label(label_value)}"' for label, label_value in labels)
+        return f'{name}{{{rendered}}} {format_value(value)}'
+    return f'{name} {format_value(value)}'
+
+
+class MetricsRegistry:
+    def __init__(self, multiprocess_dir=None):
+        self.multiprocess_dir = multiprocess_dir
+        self.metrics = {}
+        self._local = threading.local()
+        self._shards = []
+        self._generation = 0
+        self._lock = threading.Lock()
+        if multiprocess_dir:
+            remove_dead_process_files(multiprocess_dir)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name!r} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def shard(self):
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.shard = self._new_shard()
+            local.generation = self._generation
+        return local.shard
+
+    def _new_shard(self):
+        if self.multiprocess_dir:
+            shard = MmapShard(os.path.join(
+                self.multiprocess_dir, f'{os.getpid()}-{threading.get_native_id()}.db'
+            ))
+        else:
+            shard = DictShard()
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    def _after_fork(self):
+        # Tiến trình con ghi vào shard (file) riêng của nó
+        self._lock = threading.Lock()
+        self._shards = []
+        self._generation += 1
+        if self.multiprocess_dir:
+            # Worker mới thay cho worker đã chết: dọn file của worker cũ
+            remove_dead_process_files(self.multiprocess_dir)
+
+    def collect(self):
+        """``{sample key: value}``, cộng dồn qua các thread (và tiến trình)."""
+        if self.multiprocess_dir:
+            return read_multiprocess_dir(self.multiprocess_dir)
+        with self._lock:
+            shards = list(self._shards)
+        totals = {}
+        for shard in shards:
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def exposition(self):
+        """Text exposition format của Prometheus (version 0.0.4)."""
+        by_name = {}
+        for key, value in self.collect().items():
+            name, labels = json.loads(key)
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            if metric.type == 'histogram':
+                lines.extend(self._histogram_lines(metric, by_name))
+            else:
+                for labels, value in sorted(by_name.get(metric.name, ())):
+                    lines.append(format_sample(metric.name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram_lines(metric, by_name):
+        buckets = {}
+        for labels, value in by_name.get(f'{metric.name}_bucket', ()):
+            base = tuple(tuple(pair) for pair in labels if pair[0] != 'le')
+            buckets.setdefault(base, {})[labels[-1][1]] = value
+        totals = {
+            suffix: {tuple(tuple(pair) for pair in labels): value for labels, value in by_name.get(metric.name + suffix, ())}
+            for suffix in ('_sum', '_count')
+        }
+        lines = []
+        for base in sorted(totals['_count']):
+            cumulative = 0.0
+            for bound in metric.buckets:
+                le = format_value(bound)
+                cumulative += buckets.get(base, {}).get(le, 0.0)
+                lines.append(format_sample(f'{metric.name}_bucket', list(base) + [('le', le)], cumulative))
+            lines.append(format_sample(f'{metric.name}_sum', base, totals['_sum'].get(base, 0.0)))
+            lines.append(format_sample(f'{metric.name}_count', base, totals['_count'][base]))
+        return lines
+
+
+registry = MetricsRegistry(multiprocess_dir=os.environ.get('METRICS_MULTIPROC_DIR') or None)
+
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests handled, by view, method and status.',
+    ('view', 'method', 'status'),
+)
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency, by view, method and status.',
+    ('view', 'method', 'status'),
+)
+service_requests = registry.counter(
+    'service_requests_total', 'Outbound calls to other services, by service, method and status.',
+    ('service', 'method', 'status'),
+)
+service_request_duration = registry.histogram(
+    'service_request_duration_seconds', 'Outbound call latency, by service, method and status.',
+    ('service', 'method', 'status'),
+)
+
+
+def normalize_method(method):
+    """Method lạ gom vào ``other`` để số series không tăng theo input của client."""
+    method = method.upper()
+    return method if method in HTTP_METHODS else 'other'
+
+
+def observe_service_call(service, method, status, seconds):
+    labels = (service, normalize_method(method), status)
+    service_requests.labels(*labels).inc()
+    service_request_duration.labels(*labels).observe(seconds)
+
+
+class MetricsMiddleware:
+    """
+    Đếm request và đo latency theo view (tên URL), method và status. Request
+    không khớp URL nào được gom vào view ``unmatched``.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        labels = (match.view_name if match else 'unmatched', normalize_method(request.method),
+                  str(response.status_code))
+        http_requests.labels(*labels).inc()
+        http_request_duration.labels(*labels).observe(elapsed)
+        return response
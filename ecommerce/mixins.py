@@ -0,0 +1,76 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from ecommerce.product_cache import PRODUCT_BATCH_SIZE
+
+
+class BatchRetrieveMixin:
+    """
+    Thêm endpoint ``POST batch/`` cho các viewset MongoEngine của catalog.
+
+    Resolve nhiều sản phẩm bằng một truy vấn ``$in`` duy nhất thay vì N request.
+    Yêu cầu JSON: {"ids": ["<ObjectId>", ...], "fields": ["title", "price"]}
+    Kết quả: {"results": {"<id>": {...} | null}, "not_found": ["<id>", ...]}
+    """
+    # Cùng giới hạn với chunk của cart client (PRODUCT_BATCH_SIZE)
+    batch_max_ids = PRODUCT_BATCH_SIZE
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({"detail": "Please provide a non-empty list of 'ids'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.batch_max_ids:
+            return Response({"detail": f"At most {self.batch_max_ids} ids per batch."}, status=status.HTTP_400_BAD_REQUEST)
+
+        object_ids = {}
+        for raw_id in ids:
+            try:
+                object_ids[str(raw_id)] = ObjectId(str(raw_id))
+            except (InvalidId, TypeError):
+                continue
+
+        queryset = self.get_queryset().filter(id__in=list(object_ids.values()))
+        fields = self.get_batch_fields(request.data.get('fields'))
+        if fields:
+            queryset = queryset.only(*fields)
+        serializer = self.get_serializer(queryset, many=True)
+        found = {}
+        for item in serializer.data:
+            found[str(item['id'])] = {k: v for k, v in item.items() if not fields or k in fields}
+
+        results = {}
+        for raw_id in map(str, ids):
+            object_id = object_ids.get(raw_id)
+            results[raw_id] = found.get(str(object_id)) if object_id else None
+        return Response({
+            'results': results,
+            'not_found': [raw_id for raw_id, data in results.items() if data is None],
+        })
+
+    def get_batch_fields(self, fields):
+        """Danh sách field cần lấy (projection), luôn bao gồm 'id'."""
+        if not fields or not isinstance(fields, list):
+            return None
+        model_fields = self.get_queryset()._document._fields
+        return ['id'] + [name for name in fields if name in model_fields and name != 'id']
+
+
+class LazyQuerySet:
+    """
+    ``queryset = LazyQuerySet(Book)`` thay cho ``queryset = Book.objects.all()``
+    trên class view: ``Document.objects`` chỉ được gọi khi view đọc
+    ``self.queryset``, nên import urls (``manage.py check``, WSGI boot) không
+    kết nối tới MongoDB. Đọc trên class (``as_view``, router) trả về chính
+    descriptor.
+    """
+    def __init__(self, document):
+        self.document = document
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return self.document.objects.all()
@@ -0,0 +1,121 @@
+import base64
+import datetime
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.db.models import Q
+from mongoengine.queryset.base import BaseQuerySet
+from mongoengine.queryset.visitor import Q as MongoQ
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    """
+    Phân trang mặc định (?page=, ?page_size=) cho mọi endpoint dạng danh sách.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Phân trang theo keyset (cursor) trên cặp ``(ordering_field, id)``, mới nhất trước.
+
+    Trang sau được lọc bằng ``ordering_field < x OR (ordering_field = x AND id < y)``
+    thay vì ``skip``/``OFFSET``, nên chi phí mỗi trang không tăng theo độ sâu.
+    Hoạt động với cả QuerySet của Django ORM lẫn MongoEngine.
+    """
+    ordering_field = 'created'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.is_mongo = isinstance(queryset, BaseQuerySet)
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(f'-{self.ordering_field}', '-id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(*cursor))
+
+        # Lấy thêm 1 bản ghi để biết còn trang sau hay không
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_cursor_filter(self, position, pk):
+        q_class = MongoQ if self.is_mongo else Q
+        return (
+            q_class(**{f'{self.ordering_field}__lt': position}) |
+            q_class(**{self.ordering_field: position, 'id__lt': pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = datetime.datetime.fromisoformat(data['p'])
+            pk = ObjectId(data['id']) if self.is_mongo else int(data['id'])
+        except (TypeError, ValueError, KeyError, InvalidId, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, pk
+
+    def encode_cursor(self, instance):
+        data = {
+            'p': getattr(instance, self.ordering_field).isoformat(),
+            'id': str(instance.pk),
+        }
+        return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CreatedKeysetPagination(KeysetPagination):
+    """Keyset theo ``(created, id)``: các catalog MongoDB và Cart."""
+    ordering_field = 'created'
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """Keyset theo ``(created_at, id)``: Transaction."""
+    ordering_field = 'created_at'
@@ -0,0 +1,159 @@
+"""
+Read-through cache of product snapshots (title/name, price, ...) used by the cart.
+
+Entries live in an in-process LRU store with a TTL and are shared between
+workers through Django's cache framework (``CACHE_ALIAS``, the ``shared``
+alias by default). Catalog views call ``product_cache.invalidate`` whenever a
+product changes: it deletes the shared entry and bumps a per-type generation
+key in the shared cache. Every local entry remembers the generation it was
+stored under, and each worker re-reads the generations at most every
+``GENERATION_TTL`` seconds, so another worker's in-process copy of an updated
+product is dropped within that delay instead of living for the full ``TTL``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+PRODUCT_CACHE = getattr(settings, 'PRODUCT_CACHE', {})
+
+# Các field của sản phẩm mà cart cần lưu lại
+SNAPSHOT_FIELDS = ('id', 'title', 'name', 'price', 'available')
+
+# Số id tối đa mỗi request tới endpoint batch/ của catalog: giới hạn của
+# BatchRetrieveMixin và kích thước chunk của cart client dùng chung giá trị này
+PRODUCT_BATCH_SIZE = getattr(settings, 'PRODUCT_BATCH_SIZE', 100)
+
+
+class ProductCache:
+    """
+    LRU + TTL cache keyed by ``(product_type, product_id)``.
+    """
+    def __init__(self, maxsize=10000, ttl=60, cache_alias=None, generation_ttl=1):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self.generation_ttl = generation_ttl
+        self._data = OrderedDict()
+        self._generations = {}  # product_type -> (checked_at, generation)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(product_type, product_id):
+        return f"product:{product_type.lower()}:{product_id}"
+
+    @staticmethod
+    def generation_key(product_type):
+        return f"product-generation:{product_type.lower()}"
+
+    @property
+    def shared_cache(self):
+        if not self.cache_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    def generation(self, product_type):
+        """
+        Generation hiện tại của ``product_type`` trong shared cache, đọc lại tối
+        đa mỗi ``generation_ttl`` giây.
+        """
+        product_type = product_type.lower()
+        now = time.monotonic()
+        checked = self._generations.get(product_type)
+        if checked is not None and now - checked[0] < self.generation_ttl:
+            return checked[1]
+        shared_cache = self.shared_cache
+        generation = shared_cache.get(self.generation_key(product_type), 0) if shared_cache else 0
+        self._generations[product_type] = (now, generation)
+        return generation
+
+    def get(self, product_type, product_id):
+        """Return the cached snapshot or ``None``."""
+        key = self.make_key(product_type, product_id)
+        generation = self.generation(product_type)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, entry_generation, snapshot = entry
+                if expires_at > now and entry_generation == generation:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return snapshot
+                del self._data[key]
+
+        snapshot = self.shared_cache.get(key) if self.shared_cache else None
+        if snapshot is not None:
+            self._store(key, generation, snapshot)
+            with self._lock:
+                self.hits += 1
+            return snapshot
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, product_type, product_id, product_data):
+        key = self.make_key(product_type, product_id)
+        snapshot = {k: v for k, v in product_data.items() if k in SNAPSHOT_FIELDS}
+        self._store(key, self.generation(product_type), snapshot)
+        if self.shared_cache:
+            self.shared_cache.set(key, snapshot, self.ttl)
+        return snapshot
+
+    def _store(self, key, generation, snapshot):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, generation, snapshot)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, product_type, product_id):
+        """
+        Drop a product after it was updated or deleted in its catalog, here
+        and (through the generation) in every other worker.
+        """
+        key = self.make_key(product_type, product_id)
+        with self._lock:
+            self._data.pop(key, None)
+        shared_cache = self.shared_cache
+        if shared_cache:
+            shared_cache.delete(key)
+            generation = time.time_ns()
+            shared_cache.set(self.generation_key(product_type), generation, None)
+            self._generations[product_type.lower()] = (time.monotonic(), generation)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'generation_ttl': self.generation_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'miss_rate': self.misses / lookups if lookups else 0.0,
+            }
+
+
+product_cache = ProductCache(
+    maxsize=PRODUCT_CACHE.get('MAXSIZE', 10000),
+    ttl=PRODUCT_CACHE.get('TTL', 60),
+    cache_alias=PRODUCT_CACHE.get('CACHE_ALIAS', 'shared'),
+    generation_ttl=PRODUCT_CACHE.get('GENERATION_TTL', 1),
+)
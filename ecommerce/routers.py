@@ -1,45 +1,161 @@
+"""
+Database routing by app (``DATABASE_APPS_MAPPING``) with optional read replicas.
+
+The model -> alias map is computed once, when the router is instantiated
+(on the first ORM query, after the app registry is ready), so every routing
+call is a single dict lookup instead of a settings lookup.
+
+``DATABASE_REPLICAS`` maps a primary alias to its replica aliases and their
+weights (built from ``<ALIAS>_DB_REPLICAS``, see ``ecommerce.connections``)::
+
+    DATABASE_REPLICAS = {'postgresql': {'postgresql_replica_1': 3, 'postgresql_replica_2': 1}}
+
+Reads of models on that primary go to the replicas in smooth weighted
+round-robin order, except:
+
+* after a write to the primary in the same request (or, outside requests,
+  in the same thread / context): the rest of the request reads from the
+  primary, so it sees its own writes despite replication lag;
+* inside ``transaction.atomic()`` on the primary;
+* ``select_for_update()`` / ``get_or_create()`` etc., which Django routes
+  through ``db_for_write``.
+
+``PrimaryPinningMiddleware`` scopes the pinning to one request; ``pin_primary()``
+does the same for code that runs outside requests.
+"""
+import contextlib
+import itertools
+from contextvars import ContextVar
+
+from django.db import connections
+
+# Các primary alias đã có write trong request / context hiện tại
+_pinned = ContextVar('ecommerce_db_pinned', default=frozenset())
+
+
+def smooth_weighted_sequence(weights):
+    """
+    Thứ tự smooth weighted round-robin (như nginx) cho ``{alias: weight}``:
+    ``{'a': 3, 'b': 1}`` -> ``['a', 'a', 'b', 'a']``; alias có weight 0 bị bỏ qua.
+    """
+    weights = {alias: weight for alias, weight in weights.items() if weight > 0}
+    total = sum(weights.values())
+    current = dict.fromkeys(weights, 0)
+    sequence = []
+    for _ in range(total):
+        for alias, weight in weights.items():
+            current[alias] += weight
+        chosen = max(current, key=current.get)
+        current[chosen] -= total
+        sequence.append(chosen)
+    return sequence
+
+
+class WeightedRoundRobin:
+    def __init__(self, weights):
+        self.sequence = tuple(smooth_weighted_sequence(weights))
+        self._counter = itertools.count()
+
+    def __bool__(self):
+        return bool(self.sequence)
+
+    def next(self):
+        # next() trên itertools.count là atomic, không cần lock
+        return self.sequence[next(self._counter) % len(self.sequence)]
+
+
+@contextlib.contextmanager
+def pin_primary(*aliases):
+    """
+    Phạm vi pinning riêng (worker, management command): bắt đầu không pin
+    (hoặc pin sẵn ``aliases``) và trả lại trạng thái cũ khi thoát.
+    """
+    token = _pinned.set(frozenset(aliases))
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryPinningMiddleware:
+    """
+    Mỗi request bắt đầu đọc từ replica; sau write đầu tiên vào một primary, các
+    read còn lại của request đó đọc từ primary.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with pin_primary():
+            return self.get_response(request)
+
+
 class DatabaseRouter:
     """
     A router to control all database operations on models for different databases.
     """
+    def __init__(self):
+        from django.apps import apps
+        from django.conf import settings
+        self.app_aliases = dict(settings.DATABASE_APPS_MAPPING)
+        replicas = {
+            primary: WeightedRoundRobin(weights)
+            for primary, weights in getattr(settings, 'DATABASE_REPLICAS', {}).items()
+        }
+        self.replicas = {primary: robin for primary, robin in replicas.items() if robin}
+        self.replica_aliases = frozenset(
+            alias for replicas in self.replicas.values() for alias in replicas.sequence
+        )
+        self.model_aliases = {}
+        if apps.ready:
+            for model in apps.get_models(include_auto_created=True):
+                self.model_aliases[model] = self.app_aliases.get(model._meta.app_label)
+
+    def alias_for(self, model):
+        try:
+            return self.model_aliases[model]
+        except KeyError:
+            # Model lịch sử của migration, model tạo trong test...: không cache
+            meta = getattr(model, '_meta', None)
+            return self.app_aliases.get(meta.app_label) if meta is not None else None
+
     def db_for_read(self, model, **hints):
         """
-        Attempts to read auth and contenttypes models go to default db.
+        The app's database, or one of its replicas unless the primary is pinned.
         """
-        from django.conf import settings
-        if hasattr(model, '_meta'):
-            app_label = model._meta.app_label
-            if app_label in settings.DATABASE_APPS_MAPPING:
-                return settings.DATABASE_APPS_MAPPING[app_label]
-        return None
+        alias = self.alias_for(model)
+        replicas = self.replicas.get(alias)
+        if replicas is None or alias in _pinned.get() or connections[alias].in_atomic_block:
+            return alias
+        return replicas.next()
 
     def db_for_write(self, model, **hints):
         """
-        Attempts to write auth and contenttypes models go to default db.
+        The app's database; pins it for the reads that follow.
         """
-        from django.conf import settings
-        if hasattr(model, '_meta'):
-            app_label = model._meta.app_label
-            if app_label in settings.DATABASE_APPS_MAPPING:
-                return settings.DATABASE_APPS_MAPPING[app_label]
-        return None
+        alias = self.alias_for(model)
+        if alias in self.replicas:
+            pinned = _pinned.get()
+            if alias not in pinned:
+                _pinned.set(pinned | {alias})
+        return alias
 
     def allow_relation(self, obj1, obj2, **hints):
         """
-        Allow relations if a model in the auth or contenttypes apps is involved.
+        Allow relations between models that live in the same database.
         """
-        from django.conf import settings
-        db1 = settings.DATABASE_APPS_MAPPING.get(obj1._meta.app_label)
-        db2 = settings.DATABASE_APPS_MAPPING.get(obj2._meta.app_label)
+        db1 = self.alias_for(type(obj1))
+        db2 = self.alias_for(type(obj2))
         if db1 and db2:
             return db1 == db2
         return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         """
-        Make sure the auth and contenttypes apps only appear in the default database.
+        Each mapped app only migrates on its own database; replicas never migrate.
         """
-        from django.conf import settings
-        if app_label in settings.DATABASE_APPS_MAPPING:
-            return settings.DATABASE_APPS_MAPPING[app_label] == db
-        return None
\ No newline at end of file
+        if db in self.replica_aliases:
+            return False
+        if app_label in self.app_aliases:
+            return self.app_aliases[app_label] == db
+        return None
@@ -0,0 +1,258 @@
+"""
+Full-text search for the MongoDB catalogs (Book, Mobile, Shoe, Clothes).
+
+Each catalog Document declares a MongoDB text index in its ``meta['indexes']``;
+that declaration is the single source of truth for which fields are searched
+and how they are weighted.
+
+``MongoTextSearchBackend`` (the default) runs ``$text`` queries against
+those indexes and orders by relevance (``textScore``); MongoDB keeps the
+index current for every worker. ``InvertedIndexSearchBackend`` keeps an
+equivalent in-process inverted index (tokenizer + accent folding for
+Vietnamese titles) for tests and local setups without text indexes. Each
+process builds its own copy with a full scan, so writes bump a per-collection
+version in the shared cache and the other processes rebuild when they see it
+(checked at most every ``CATALOG_SEARCH['VERSION_CHECK_INTERVAL']`` seconds).
+Choose the backend with the ``CATALOG_SEARCH_BACKEND`` setting.
+"""
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+CATALOG_SEARCH_BACKEND = getattr(settings, 'CATALOG_SEARCH_BACKEND',
+                                 'ecommerce.search.MongoTextSearchBackend')
+CATALOG_SEARCH = getattr(settings, 'CATALOG_SEARCH', {})
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường: 'Đắc Nhân Tâm' -> 'dac nhan tam'."""
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(fold(text or ''))
+
+
+def get_text_index(document):
+    """Trả về ``{field: weight}`` của text index khai báo trong ``meta`` của Document."""
+    for spec in document._meta.get('index_specs', []):
+        fields = [name for name, kind in spec['fields'] if kind == 'text']
+        if fields:
+            weights = spec.get('weights', {})
+            return {name: weights.get(name, 1) for name in fields}
+    raise ValueError(f"{document.__name__} does not declare a text index")
+
+
+class SearchResults:
+    """
+    Kết quả đã xếp hạng dạng sequence lazy: chỉ load document của trang đang cần,
+    nên dùng được trực tiếp với paginator của DRF/Django.
+    """
+    def __init__(self, document, ranked_ids):
+        self.document = document
+        self.ranked_ids = ranked_ids
+
+    def count(self):
+        return len(self.ranked_ids)
+
+    def __len__(self):
+        return len(self.ranked_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ids = self.ranked_ids[index]
+            documents = {doc.id: doc for doc in self.document.objects(id__in=ids)}
+            return [documents[pk] for pk in ids if pk in documents]
+        return self[index:index + 1][0]
+
+
+class MongoTextSearchBackend:
+    """
+    Tìm kiếm bằng text index của MongoDB, sắp xếp theo độ liên quan.
+    """
+    def search(self, document, query):
+        return document.objects.search_text(query).order_by('$text_score')
+
+    def search_scored(self, document, query, limit, max_time_ms=None):
+        """``limit`` kết quả tốt nhất dạng ``[(score, document), ...]``."""
+        queryset = self.search(document, query)
+        if max_time_ms:
+            queryset = queryset.max_time_ms(max_time_ms)
+        return [(doc.get_text_score(), doc) for doc in queryset[:limit]]
+
+    def update(self, instance):
+        """MongoDB tự cập nhật text index khi ghi."""
+
+    def remove(self, document, pk):
+        """MongoDB tự cập nhật text index khi xóa."""
+
+
+class InvertedIndex:
+    """
+    Inverted index của một collection: token -> {id: điểm}.
+    """
+    def __init__(self, document):
+        self.document = document
+        self.weights = get_text_index(document)
+        self.postings = {}
+        self.doc_tokens = {}
+        self.vocabulary = []
+        self.lock = threading.RLock()
+        # Version dùng chung lúc build / cập nhật lần cuối, thời điểm kiểm tra lại
+        self.version = 0
+        self.checked_at = 0.0
+
+    def build(self):
+        with self.lock:
+            self.postings.clear()
+            self.doc_tokens.clear()
+            for instance in self.document.objects.only('id', *self.weights):
+                self._add(instance, keep_sorted=False)
+            self.vocabulary = sorted(self.postings)
+
+    def _add(self, instance, keep_sorted=True):
+        scores = {}
+        for field, weight in self.weights.items():
+            for token in tokenize(getattr(instance, field, None)):
+                scores[token] = scores.get(token, 0) + weight
+        for token, score in scores.items():
+            if keep_sorted and token not in self.postings:
+                bisect.insort(self.vocabulary, token)
+            self.postings.setdefault(token, {})[instance.id] = score
+        self.doc_tokens[instance.id] = list(scores)
+
+    def _remove(self, pk):
+        for token in self.doc_tokens.pop(pk, ()):
+            docs = self.postings.get(token)
+            if docs is not None:
+                docs.pop(pk, None)
+                if not docs:
+                    del self.postings[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+    def update(self, instance):
+        with self.lock:
+            self._remove(instance.id)
+            self._add(instance)
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def expand(self, token):
+        """Token cuối của query được khớp theo tiền tố (tìm trong vocabulary đã sắp xếp)."""
+        start = bisect.bisect_left(self.vocabulary, token)
+        end = bisect.bisect_left(self.vocabulary, token + '\uffff')
+        return self.vocabulary[start:end]
+
+    def search(self, query):
+        return [pk for pk, _ in self.search_scored(query)]
+
+    def search_scored(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self.lock:
+            total = max(len(self.doc_tokens), 1)
+            scores = {}
+            for position, token in enumerate(tokens):
+                matches = self.expand(token) if position == len(tokens) - 1 else [token]
+                for term in matches:
+                    docs = self.postings.get(term, {})
+                    idf = math.log(1 + total / len(docs)) if docs else 0
+                    for pk, score in docs.items():
+                        scores[pk] = scores.get(pk, 0) + score * idf
+        return sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+
+
+class InvertedIndexSearchBackend:
+    """
+    Search backend chạy trong tiến trình, thay thế được MongoDB ``$text`` khi test.
+    Index được build lười ở lần tìm kiếm đầu tiên, cập nhật khi catalog ghi dữ liệu
+    và build lại khi tiến trình khác đã ghi (version trong shared cache thay đổi).
+    """
+    def __init__(self, cache_alias='shared', check_interval=1):
+        self.cache_alias = cache_alias
+        self.check_interval = check_interval
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    @property
+    def shared_cache(self):
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def version_key(document):
+        return f"search-index-version:{document._get_collection_name()}"
+
+    def get_index(self, document):
+        index = self.indexes.get(document)
+        now = time.monotonic()
+        if index is not None and now - index.checked_at < self.check_interval:
+            return index
+        version = self.shared_cache.get(self.version_key(document), 0)
+        with self.lock:
+            index = self.indexes.get(document)
+            if index is None or index.version != version:
+                index = InvertedIndex(document)
+                index.build()
+                index.version = version
+                self.indexes[document] = index
+            index.checked_at = now
+            return index
+
+    def bump_version(self, document):
+        """Báo cho các tiến trình khác build lại; index của tiến trình này đã cập nhật."""
+        version = time.time_ns()
+        self.shared_cache.set(self.version_key(document), version, None)
+        index = self.indexes.get(document)
+        if index is not None:
+            index.version = version
+
+    def search(self, document, query):
+        return SearchResults(document, self.get_index(document).search(query))
+
+    def search_scored(self, document, query, limit, max_time_ms=None):
+        """``limit`` kết quả tốt nhất dạng ``[(score, document), ...]``."""
+        ranked = self.get_index(document).search_scored(query)[:limit]
+        queryset = document.objects(id__in=[pk for pk, _ in ranked])
+        if max_time_ms:
+            queryset = queryset.max_time_ms(max_time_ms)
+        documents = {doc.id: doc for doc in queryset}
+        return [(score, documents[pk]) for pk, score in ranked if pk in documents]
+
+    def update(self, instance):
+        index = self.indexes.get(type(instance))
+        if index is not None:
+            index.update(instance)
+        self.bump_version(type(instance))
+
+    def remove(self, document, pk):
+        index = self.indexes.get(document)
+        if index is not None:
+            index.remove(pk)
+        self.bump_version(document)
+
+
+def load_search_backend():
+    backend_class = import_string(CATALOG_SEARCH_BACKEND)
+    if issubclass(backend_class, InvertedIndexSearchBackend):
+        return backend_class(
+            cache_alias=CATALOG_SEARCH.get('CACHE_ALIAS', 'shared'),
+            check_interval=CATALOG_SEARCH.get('VERSION_CHECK_INTERVAL', 1),
+        )
+    return backend_class()
+
+
+search_backend = load_search_backend()
@@ -11,7 +11,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from mongoengine import connect
+
+from ecommerce.connections import (
+    env, install_mongo_fork_handler, mongo_database, sql_connection_tracker, sql_database, sql_replicas
+)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,12 +53,19 @@ INSTALLED_APPS = [
     'payment',
     'shipping',
     'customer',
+    'catalog',
 ]
 
 AUTH_USER_MODEL = 'customer.Customer'
 
 MIDDLEWARE = [
+    # Prometheus metrics theo view / method / status, scrape tại /metrics
+    # (nhiều worker: METRICS_MULTIPROC_DIR, xem ecommerce/metrics.py)
+    'ecommerce.metrics.MetricsMiddleware',
+    # Log JSON cho mỗi request, Server-Timing chỉ khi bật (INSTRUMENTATION, xem ecommerce/instrumentation.py)
+    'ecommerce.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'ecommerce.routers.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,47 +98,46 @@ WSGI_APPLICATION = 'ecommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Kết nối persistent (CONN_MAX_AGE) có health check; cấu hình qua biến môi trường
+# <ALIAS>_DB_* / DB_* (xem ecommerce/connections.py)
 DATABASES = {
+    'default': sql_database(
+        'default', 'django.db.backends.mysql',
+        name='ecommerce', user='root', password='root', host='localhost', port='3306',
+    ),
+    'postgresql': sql_database(
+        'postgresql', 'django.db.backends.postgresql',
+        name='ecommerce', user='postgres', password='postgres', host='localhost', port='5432',
+    ),
+}
+
+# Read replica (<ALIAS>_DB_REPLICAS): read được chia theo weight giữa các replica,
+# về primary sau write đầu tiên của request (xem ecommerce/routers.py)
+DATABASE_REPLICAS = sql_replicas(DATABASES)
+
+# Cache: 'default' là LocMem riêng của mỗi tiến trình; 'shared' dùng chung giữa
+# các worker (idempotency key, snapshot sản phẩm, danh sách payment method).
+# Mặc định là bảng cache trong database 'default', tạo sau mỗi `manage.py migrate`
+# (createcachetable, xem ecommerce.connections.create_cache_tables);
+# SHARED_CACHE_BACKEND / SHARED_CACHE_LOCATION để chuyển sang Redis / Memcached.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'ecommerce',
-        'USER': 'root',
-        'PASSWORD': 'root',
-        'HOST': 'localhost',
-        'PORT': '3306',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': env('SHARED_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': env('SHARED_CACHE_LOCATION', default='shared_cache'),
     },
-    'postgresql': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'ecommerce',
-        'USER': 'postgres',
-        'PASSWORD': 'postgres',
-        'HOST': 'localhost',
-        'PORT': '5432',
-    }
 }
 
-# MongoDB settings for specific apps
+# MongoDB settings for specific apps (pool / timeout: MONGO_<ALIAS>_* / MONGO_*)
 MONGODB_DATABASES = {
-    'book': {
-        'name': 'ecommerce_books',
-        'host': 'localhost',
-        'port': 27017,
-    },
-    'mobile': {
-        'name': 'ecommerce_mobile',
-        'host': 'localhost',
-        'port': 27017,
-    },
-    'shoes': {
-        'name': 'ecommerce_shoes',
-        'host': 'localhost',
-        'port': 27017,
-    },
-    'clothes': {
-        'name': 'ecommerce_clothes',
-        'port': 27017,
-        'host': 'localhost',
-    }
+    # Kết nối default để làm fallback
+    'default': mongo_database('default', 'default_db'),
+    'book': mongo_database('book', 'ecommerce_books'),
+    'mobile': mongo_database('mobile', 'ecommerce_mobile'),
+    'shoes': mongo_database('shoes', 'ecommerce_shoes'),
+    'clothes': mongo_database('clothes', 'ecommerce_clothes'),
 }
 
 # Database routers
@@ -156,30 +165,22 @@ DATABASE_APPS_MAPPING = {
     'gateway': 'default',
 }
 
-# Nếu muốn, định nghĩa kết nối default để làm fallback
-connect(
-    db='default_db',
-    alias='default',
-    host='localhost',
-    port=27017,
-    authentication_source='admin',
-)
+# django_mongoengine registers the MongoDB aliases when the apps are ready; each
+# alias connects on first use (MONGO_CONNECT_EAGERLY=1: at startup, as before)
+MONGO_CONNECT_EAGERLY = env('MONGO_CONNECT_EAGERLY', default=False, cast=bool)
+# Tiến trình con (sau fork) kết nối lại thay vì dùng client của tiến trình cha
+install_mongo_fork_handler()
 
-# Initialize MongoDB connections
-for app_name, db_config in MONGODB_DATABASES.items():
-    connect(
-        db=db_config['name'],
-        host=db_config['host'],
-        port=db_config['port'],
-        alias=app_name,
-        authentication_source='admin',
-    )
+# Đếm kết nối SQL cho ecommerce.connections.pool_stats()
+sql_connection_tracker.install()
 
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'ecommerce.pagination.StandardResultsSetPagination',
+    'PAGE_SIZE': 20,
 }
 
 SIMPLE_JWT = {
@@ -0,0 +1,269 @@
+import multiprocessing
+import tempfile
+import threading
+from unittest import mock, skipUnless
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from book.models import Book
+from cart.models import Cart, CartItem
+from customer.models import Customer
+from payment.models import Transaction
+from .idempotency import REPLAYED_HEADER, IdempotencyStore, idempotent
+from .instrumentation import RequestMetrics, sql_fingerprint
+from .metrics import MetricsRegistry
+from .product_cache import ProductCache
+from .routers import DatabaseRouter, pin_primary, smooth_weighted_sequence
+from .search import InvertedIndex, InvertedIndexSearchBackend
+
+
+class ProductCacheTests(TestCase):
+    """
+    Invalidate ở một worker phải làm các worker khác bỏ bản sao trong LRU.
+    """
+    def make_worker_cache(self):
+        cache = ProductCache(cache_alias='shared', generation_ttl=0)
+        self.addCleanup(cache.clear)
+        return cache
+
+    def test_invalidation_reaches_other_workers(self):
+        worker_a, worker_b = self.make_worker_cache(), self.make_worker_cache()
+        worker_a.set('book', '1', {'id': '1', 'price': '10.00'})
+        self.assertEqual(worker_b.get('book', '1')['price'], '10.00')
+
+        worker_a.invalidate('book', '1')
+        self.assertIsNone(worker_b.get('book', '1'))
+        self.assertIsNone(worker_a.get('book', '1'))
+
+    def test_generation_is_read_at_most_once_per_interval(self):
+        worker = ProductCache(cache_alias='shared', generation_ttl=3600)
+        worker.set('book', '1', {'id': '1', 'price': '10.00'})
+        with self.assertNumQueries(0):
+            self.assertEqual(worker.get('book', '1')['price'], '10.00')
+
+
+class InvertedIndexVersionTests(TestCase):
+    """
+    Ghi ở một worker làm các worker khác build lại inverted index.
+    """
+    def test_other_workers_rebuild_after_a_write(self):
+        worker_a = InvertedIndexSearchBackend(check_interval=0)
+        worker_b = InvertedIndexSearchBackend(check_interval=0)
+        with mock.patch.object(InvertedIndex, 'build') as build:
+            worker_a.get_index(Book)
+            worker_b.get_index(Book)
+            self.assertEqual(build.call_count, 2)
+
+            worker_a.update(Book(title='Đắc Nhân Tâm', author='Dale Carnegie'))
+            worker_a.get_index(Book)
+            self.assertEqual(build.call_count, 2)
+
+            worker_b.get_index(Book)
+            self.assertEqual(build.call_count, 3)
+
+
+class ChargeView(APIView):
+    authentication_classes = ()
+    permission_classes = ()
+    store = IdempotencyStore(cache_alias='shared')
+    # Gọi trong lúc request đang chạy (mô phỏng retry song song)
+    during_charge = None
+
+    @idempotent('test.charge', store=store)
+    def post(self, request):
+        ChargeView.charges += 1
+        if ChargeView.during_charge is not None:
+            return Response({'retry_status': ChargeView.during_charge()}, status=201)
+        return Response({'charge': ChargeView.charges}, status=201)
+
+
+class IdempotencyTests(TestCase):
+    """
+    Idempotency-Key: retry nhận lại response đã lưu, không chạy lại view.
+    """
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        ChargeView.charges = 0
+        ChargeView.during_charge = None
+        self.addCleanup(caches['shared'].clear)
+
+    def post(self, data, key='key-1'):
+        request = self.factory.post('/charge/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        return ChargeView.as_view()(request)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post({'amount': '10.00'})
+        retry = self.post({'amount': '10.00'})
+        self.assertEqual((retry.status_code, retry.data), (201, {'charge': 1}))
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertFalse(first.has_header(REPLAYED_HEADER))
+        self.assertEqual(ChargeView.charges, 1)
+
+    def test_retry_in_another_worker_is_replayed(self):
+        self.post({'amount': '10.00'})
+        # Worker khác: store riêng nhưng cùng cache 'shared'
+        other_worker = IdempotencyStore(cache_alias='shared')
+        cache_key = other_worker.make_key('test.charge', None, 'key-1')
+        self.assertEqual(other_worker.begin(cache_key)[1:], (201, {'charge': 1}))
+
+    def test_retry_while_in_progress_gets_409(self):
+        ChargeView.during_charge = lambda: self.post({'amount': '10.00'}).status_code
+        response = self.post({'amount': '10.00'})
+        self.assertEqual(response.data, {'retry_status': 409})
+        self.assertEqual(ChargeView.charges, 1)
+
+    def test_different_body_gets_422(self):
+        self.post({'amount': '10.00'})
+        response = self.post({'amount': '99.00'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ChargeView.charges, 1)
+
+    def test_server_error_releases_the_key(self):
+        ChargeView.during_charge = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            self.post({'amount': '10.00'})
+        ChargeView.during_charge = None
+        self.assertEqual(self.post({'amount': '10.00'}).data, {'charge': 2})
+
+
+@override_settings(DATABASE_REPLICAS={'default': {'default_replica_1': 3, 'default_replica_2': 1}})
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Read của cart đi tới replica theo weight, về primary sau write trong cùng request.
+    """
+    def setUp(self):
+        self.router = DatabaseRouter()
+
+    def test_weighted_round_robin(self):
+        self.assertEqual(smooth_weighted_sequence({'a': 3, 'b': 1, 'c': 0}), ['a', 'a', 'b', 'a'])
+        with pin_primary():
+            reads = [self.router.db_for_read(Cart) for _ in range(8)]
+        self.assertEqual(reads.count('default_replica_1'), 6)
+        self.assertEqual(reads.count('default_replica_2'), 2)
+
+    def test_reads_stick_to_primary_after_write(self):
+        with pin_primary():
+            self.assertNotEqual(self.router.db_for_read(Cart), 'default')
+            self.assertEqual(self.router.db_for_write(CartItem), 'default')
+            self.assertEqual(self.router.db_for_read(Cart), 'default')
+        with pin_primary():
+            self.assertNotEqual(self.router.db_for_read(Cart), 'default')
+
+    def test_apps_without_replicas_and_migrations(self):
+        with pin_primary():
+            self.assertEqual(self.router.db_for_read(Transaction), 'postgresql')
+        self.assertFalse(self.router.allow_migrate('default_replica_1', 'auth'))
+        self.assertTrue(self.router.allow_migrate('default', 'cart'))
+        self.assertFalse(self.router.allow_migrate('postgresql', 'cart'))
+
+
+@override_settings(INSTRUMENTATION={'SERVER_TIMING': True, 'SLOW_REQUEST_MS': 60000})
+class RequestInstrumentationTests(TestCase):
+    """
+    Server-Timing theo alias và fingerprint của các statement trong request chậm.
+    """
+    def test_server_timing_reports_queries_per_alias(self):
+        Cart.objects.create(customer_id='customer-1')
+        response = APIClient().get(reverse('cart-list'))
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertTrue(timing.startswith('total;dur='))
+        self.assertIn('sql-default;', timing)
+        self.assertIn('desc="2 queries"', timing)
+
+    def test_server_timing_is_off_by_default(self):
+        with self.settings(INSTRUMENTATION={}):
+            response = APIClient().get(reverse('cart-list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_slow_request_fingerprints(self):
+        self.assertEqual(
+            sql_fingerprint("SELECT * FROM cart WHERE id IN (1, 2,3) AND customer_id = 'c-1'"),
+            "SELECT * FROM cart WHERE id IN (...) AND customer_id = ?",
+        )
+        metrics = RequestMetrics()
+        for cart_id in range(5):
+            metrics.record('sql', 'default', f"SELECT * FROM cart_item WHERE cart_id = {cart_id}", 1.0)
+        metrics.record('http', '127.0.0.1:9191', 'POST 127.0.0.1:9191/api/books/batch/', 20.0)
+        self.assertEqual(
+            [(item['kind'], item['count']) for item in metrics.fingerprints()], [('http', 1), ('sql', 5)]
+        )
+        self.assertEqual(metrics.summary(30.0)['sql'], {'default': {'count': 5, 'ms': 5.0}})
+
+
+class MetricsTests(TestCase):
+    """
+    Endpoint /metrics và cộng dồn metrics của nhiều thread / tiến trình.
+    """
+    @override_settings(METRICS={'TOKEN': 'scrape-token'})
+    def test_metrics_endpoint(self):
+        client = APIClient()
+        client.get(reverse('cart-list'))
+        response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('# TYPE http_requests_total counter', text)
+        self.assertRegex(text, r'http_requests_total\{view="cart-list",method="GET",status="200"\} \d')
+        self.assertIn('http_request_duration_seconds_bucket{view="cart-list",method="GET",status="200",le="+Inf"}', text)
+
+    @override_settings(METRICS={'TOKEN': 'scrape-token'})
+    def test_metrics_endpoint_requires_the_token(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS={})
+    def test_metrics_endpoint_without_a_token_is_staff_only(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        staff = Customer.objects.create_superuser(email='ops@example.com', password='secret')
+        client.force_login(staff)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 200)
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), 'fork start method is not available')
+    def test_files_of_dead_processes_are_removed_on_startup(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        registry = MetricsRegistry(multiprocess_dir=directory.name)
+        counter = registry.counter('calls_total', 'Calls.').labels()
+        counter.inc()
+        child = multiprocessing.get_context('fork').Process(target=counter.inc, args=(3,))
+        child.start()
+        child.join()
+        self.assertIn('calls_total 4.0', registry.exposition())
+
+        # Khởi động lại: file của worker đã chết bị xoá, file của tiến trình còn sống được giữ
+        restarted = MetricsRegistry(multiprocess_dir=directory.name)
+        restarted.counter('calls_total', 'Calls.')
+        self.assertIn('calls_total 1.0', restarted.exposition())
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), 'fork start method is not available')
+    def test_multiprocess_files_are_summed(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        registry = MetricsRegistry(multiprocess_dir=directory.name)
+        counter = registry.counter('calls_total', 'Calls.', ('service',)).labels('product')
+        histogram = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1)).labels()
+
+        counter.inc(2)
+        histogram.observe(0.05)
+        thread = threading.Thread(target=counter.inc, args=(3,))
+        thread.start()
+        thread.join()
+        # Tiến trình con (như một gunicorn worker khác) ghi vào file của riêng nó
+        child = multiprocessing.get_context('fork').Process(target=histogram.observe, args=(5,))
+        child.start()
+        child.join()
+
+        text = registry.exposition()
+        self.assertIn('calls_total{service="product"} 5.0', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1.0', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 1.0', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2.0', text)
+        self.assertIn('latency_seconds_count 2.0', text)
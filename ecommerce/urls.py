@@ -19,6 +19,8 @@ from django.urls import path, include
 
 from django_mongoengine import mongo_admin
 
+from .views import ConnectionPoolStatsView, metrics_view
+
 urlpatterns = [
     # path('', include('book.urls')),
     path('admin/', admin.site.urls),
@@ -29,4 +31,10 @@ urlpatterns = [
     path('api/shoes/', include('shoes.urls')),
     path('api/clothes/', include('clothes.urls')),
     path('api/cart/', include('cart.urls')),
+    path('api/order/', include('order.urls')),
+    path('api/payment/', include('payment.urls')),
+    path('api/shipping/', include('shipping.urls')),
+    path('api/catalog/', include('catalog.urls')),
+    path('api/health/pools/', ConnectionPoolStatsView.as_view(), name='connection-pool-stats'),
+    path('metrics', metrics_view, name='metrics'),
 ]
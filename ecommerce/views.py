@@ -0,0 +1,37 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .connections import pool_stats
+from .metrics import CONTENT_TYPE, registry
+
+
+class ConnectionPoolStatsView(APIView):
+    """
+    Mức sử dụng pool kết nối SQL / MongoDB của tiến trình này (cho vận hành).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(pool_stats())
+
+
+def metrics_view(request):
+    """
+    Metrics cho Prometheus (text exposition format). Scraper phải gửi
+    ``Authorization: Bearer <METRICS['TOKEN']>``; không đặt token thì chỉ
+    staff (hoặc môi trường DEBUG) xem được.
+    """
+    token = getattr(settings, 'METRICS', {}).get('TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        allowed = True
+    else:
+        user = getattr(request, 'user', None)
+        allowed = settings.DEBUG or bool(user and user.is_staff)
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
@@ -15,7 +15,24 @@ class Mobile(Document):
     meta = {
         'db_alias': 'mobile',   # Dùng kết nối đã định nghĩa ở trên
         'collection': 'mobiles',     # Tên collection trong mobile_db
-        'ordering': ['-created']
+        'ordering': ['-created'],
+        # Index chỉ được tạo bởi `manage.py catalog_indexes --build`, không tạo ngầm khi save
+        'auto_create_index': False,
+        'indexes': [
+            # Text index cho tìm kiếm theo brand / model_name
+            {
+                'fields': ['$model_name', '$brand'],
+                'default_language': 'none',
+                'weights': {'model_name': 10, 'brand': 5},
+            },
+            # Danh sách mặc định + phân trang keyset theo (created, id)
+            ('-created', '-id'),
+            # Lọc sản phẩm còn hàng theo khoảng giá
+            ('available', 'price'),
+            'brand',
+            # Lọc theo cấu hình (RAM / dung lượng)
+            ('ram', 'storage_capacity'),
+        ]
     }
 
     def __str__(self):
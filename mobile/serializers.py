@@ -1,7 +1,8 @@
 from rest_framework_mongoengine.serializers import DocumentSerializer
+from ecommerce.fieldsets import SparseFieldsetSerializerMixin
 from .models import Mobile
 
-class MobileSerializer(DocumentSerializer):
+class MobileSerializer(SparseFieldsetSerializerMixin, DocumentSerializer):
     class Meta:
         model = Mobile
         fields = '__all__'
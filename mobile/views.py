@@ -3,33 +3,64 @@ from rest_framework_mongoengine.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from ecommerce.fieldsets import SparseFieldsetMixin
+from ecommerce.filters import CatalogFilterMixin, CatalogFilterSet
+from ecommerce.mixins import BatchRetrieveMixin, LazyQuerySet
+from ecommerce.pagination import CreatedKeysetPagination, StandardResultsSetPagination
+from ecommerce.product_cache import product_cache
+from ecommerce.search import search_backend
 from .models import Mobile
 from .serializers import MobileSerializer
 
-class MobileViewSet(ModelViewSet):
+class MobileViewSet(SparseFieldsetMixin, CatalogFilterMixin, BatchRetrieveMixin, ModelViewSet):
     serializer_class = MobileSerializer
     lookup_field = 'id'  # MongoEngine sử dụng id dạng ObjectId
-    queryset = Mobile.objects.all()
+    queryset = LazyQuerySet(Mobile)
+    pagination_class = CreatedKeysetPagination
+    filterset = CatalogFilterSet(
+        Mobile,
+        filters={
+            'brand': 'in',
+            'operating_system': 'in',
+            'ram': ('in', 'range'),
+            'storage_capacity': ('in', 'range'),
+            'available': 'bool',
+            'price': 'range',
+        },
+        ordering=('price', 'created', 'ram', 'storage_capacity'),
+        facets=('brand', 'operating_system', 'ram', 'storage_capacity'),
+        price_buckets=(0, 100, 250, 500, 1000, 2000),
+    )
 
     def perform_create(self, serializer):
         serializer.validated_data['created'] = serializer.validated_data.get('created', None) or datetime.datetime.now()
         serializer.validated_data['updated'] = datetime.datetime.now()
         serializer.save()
+        search_backend.update(serializer.instance)
 
     def perform_update(self, serializer):
         serializer.validated_data['updated'] = datetime.datetime.now()
         serializer.save()
+        search_backend.update(serializer.instance)
+        product_cache.invalidate('mobile', serializer.instance.id)
 
-    @action(detail=False, methods=['get'])
+    def perform_destroy(self, instance):
+        search_backend.remove(type(instance), instance.id)
+        product_cache.invalidate('mobile', instance.id)
+        instance.delete()
+
+    @action(detail=False, methods=['get'], pagination_class=StandardResultsSetPagination)
     def search(self, request):
         """
         Tìm kiếm điện thoại theo brand hoặc model_name.
         Ví dụ: /api/mobile/search/?q=iPhone
+        Kết quả được sắp xếp theo độ liên quan và phân trang (?page=).
         """
         query = request.query_params.get('q', '')
         if not query:
             return Response({"detail": "Please provide a search query using parameter 'q'."}, status=status.HTTP_400_BAD_REQUEST)
-        # Tìm kiếm theo brand hoặc model_name (không phân biệt hoa thường)
-        mobiles = Mobile.objects.filter(brand__icontains=query) | Mobile.objects.filter(model_name__icontains=query)
-        serializer = self.get_serializer(mobiles, many=True)
-        return Response(serializer.data)
+        # Tìm kiếm full-text (không phân biệt hoa thường và dấu), xếp theo độ liên quan
+        mobiles = search_backend.search(Mobile, query)
+        page = self.paginate_queryset(mobiles)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
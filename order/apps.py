@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'order'
+
+    def ready(self):
+        from payment.processing import transaction_processed
+        from .pipeline import update_order_status
+        transaction_processed.connect(update_order_status, dispatch_uid='order.update_order_status')
@@ -1,3 +1,78 @@
+from decimal import Decimal
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+
+class Order(models.Model):
+    """
+    Đơn hàng được tạo từ snapshot của một Cart khi checkout.
+
+    ``status`` đồng thời là tiến độ của checkout pipeline: mỗi stage chỉ chạy
+    khi order chưa đi qua stage đó, nên chạy lại checkout là an toàn.
+    """
+    STATUS_CHOICES = [
+        ('CREATED', 'Created'),
+        ('PRICED', 'Priced'),
+        ('SHIPPING_RESERVED', 'Shipping Reserved'),
+        ('PAYMENT_PENDING', 'Payment Pending'),
+        ('PLACED', 'Placed'),
+        ('PAYMENT_FAILED', 'Payment Failed'),
+        ('CANCELLED', 'Cancelled')
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
+    order_number = models.CharField(max_length=100, unique=True)  # = Transaction.order_id
+    # Cart nằm ở database khác (MySQL) nên chỉ lưu id; mỗi cart checkout một lần
+    cart_id = models.BigIntegerField(unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='CREATED')
+    currency = models.CharField(max_length=3, default='USD')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    shipping_method = models.CharField(max_length=100, blank=True)  # id của ShippingMethod
+    shipping_country = models.CharField(max_length=100, blank=True)
+    transaction = models.OneToOneField(
+        'payment.Transaction',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='order'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'orders'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_number} - {self.status}"
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='lines'
+    )
+    product_type = models.CharField(max_length=50)
+    product_id = models.CharField(max_length=100)
+    product_name = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        db_table = 'order_lines'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['order', 'product_type', 'product_id'],
+                name='order_line_unique_product',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} in Order {self.order_id}"
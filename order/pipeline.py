@@ -0,0 +1,226 @@
+"""
+Checkout pipeline: Cart -> Order.
+
+    snapshot -> price -> reserve_shipping -> create_transaction (+ queue payment)
+
+``price`` re-prices every line at the product service's current price (the
+cart keeps the price from when the item was added); a product that is no
+longer available stops the checkout at ``CREATED``.
+
+The gateway call runs in a payment worker (``payment.tasks``); when it
+finishes, ``update_order_status`` moves the order to ``PLACED`` or
+``PAYMENT_FAILED``.
+
+Every stage is idempotent: ``Order.status`` records how far the pipeline got,
+a stage that has already run is skipped, and the rows it writes are keyed by
+something unique (``Order.cart_id``, ``Transaction.order_id``). Running the
+checkout for the same cart again, after a crash or a client retry, resumes
+the existing order instead of creating a second one.
+
+Writes are batched: the order and all of its lines are inserted in one
+transaction (lines with a single ``bulk_create``), pricing and shipping are
+computed in memory (prices in one ``fetch_products`` batch, shipping from
+``shipping.rates.rate_table``), and their results are saved together with
+the ``Transaction`` in one more transaction.
+"""
+import uuid
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import IntegrityError, router, transaction as db_transaction
+from django.utils import timezone
+
+from cart.clients import product_client
+from cart.models import Cart, CartItem
+from payment.models import Transaction
+from payment.tasks import payment_queue
+from shipping.rates import rate_table
+from .models import Order, OrderLine
+
+CENTS = Decimal('0.01')
+
+# Tiến độ của pipeline; các trạng thái khác (PLACED, PAYMENT_FAILED, ...) là trạng thái cuối
+STAGES = ('CREATED', 'PRICED', 'SHIPPING_RESERVED', 'PAYMENT_PENDING')
+
+
+class CheckoutError(Exception):
+    """Checkout không thể tiếp tục (cart không tồn tại, cart rỗng, không có giá vận chuyển, ...)."""
+
+
+def money(value):
+    return Decimal(str(value)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def product_price(product_data):
+    """Giá của sản phẩm, ``None`` nếu thiếu, không phải số hoặc âm."""
+    try:
+        price = money(product_data['price'])
+    except (KeyError, TypeError, ArithmeticError):
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+
+def reached(order, status):
+    """Order đã đi qua (hoặc đang ở) stage ``status`` chưa."""
+    if order.status not in STAGES:
+        return True
+    return STAGES.index(order.status) >= STAGES.index(status)
+
+
+class CheckoutPipeline:
+    """
+    Checkout một cart cho ``user``. ``shipping`` là dict tùy chọn gồm
+    ``shipping_method``, ``country`` và ``weight`` (kg). ``fetch_products``
+    mặc định là ``product_client.fetch_products``.
+    """
+    def __init__(self, user, cart_id, payment_method_id, shipping=None, fetch_products=None):
+        self.user = user
+        self.cart_id = cart_id
+        self.payment_method_id = payment_method_id
+        self.shipping = shipping or {}
+        self.fetch_products = fetch_products or product_client.fetch_products
+        self.db = router.db_for_write(Order)
+        # Các line đã được định giá lại, lưu cùng transaction ở create_transaction
+        self.priced_lines = []
+        # True khi tiếp tục một order đã có (retry, crash, request song song)
+        self.resumed = False
+
+    def run(self):
+        order, lines = self.snapshot()
+        if order.status in STAGES:
+            self.price(order, lines)
+            self.reserve_shipping(order, lines)
+            self.create_transaction(order)
+        return order
+
+    def snapshot(self):
+        """
+        Tạo Order và OrderLine từ Cart (một transaction, các line ghi bằng một INSERT).
+        Nếu cart đã được checkout thì trả về order đã có.
+        """
+        order = Order.objects.filter(cart_id=self.cart_id).select_related('transaction').first()
+        if order is None:
+            items = list(
+                CartItem.objects.filter(cart_id=self.cart_id, cart__customer_id=str(self.user.pk)).order_by('id')
+            )
+            if not items:
+                if Cart.objects.filter(id=self.cart_id, customer_id=str(self.user.pk)).exists():
+                    raise CheckoutError("Cart is empty")
+                raise CheckoutError("Cart not found")
+
+            try:
+                with db_transaction.atomic(using=self.db):
+                    order = Order.objects.create(
+                        user_id=self.user.pk,
+                        cart_id=self.cart_id,
+                        order_number=f"ORD-{uuid.uuid4().hex[:12].upper()}",
+                    )
+                    lines = OrderLine.objects.bulk_create([
+                        OrderLine(
+                            order=order,
+                            product_type=item.product_type,
+                            product_id=item.product_id,
+                            product_name=item.product_name,
+                            quantity=item.quantity,
+                            unit_price=money(item.price),
+                            line_total=money(item.price * item.quantity),
+                        )
+                        for item in items
+                    ])
+                return order, lines
+            except IntegrityError:
+                # Một request khác vừa checkout cùng cart này
+                order = Order.objects.select_related('transaction').get(cart_id=self.cart_id)
+
+        self.resumed = True
+        if order.user_id != self.user.pk:
+            raise CheckoutError("Cart not found")
+        return order, list(order.lines.all())
+
+    def price(self, order, lines):
+        """
+        Định giá lại các line theo giá hiện tại của product service (một batch).
+        Sản phẩm không còn (``available`` false) hoặc không có giá hợp lệ làm checkout dừng ở ``CREATED``.
+        """
+        if reached(order, 'PRICED'):
+            return
+        products = self.fetch_products((line.product_type, line.product_id) for line in lines)
+        for line, (product_data, error) in zip(lines, products):
+            product = f"{line.product_type} {line.product_id}"
+            if product_data is None:
+                raise CheckoutError(f"Product {product} is unavailable: {error}")
+            if not product_data.get('available', True):
+                raise CheckoutError(f"Product {product} is unavailable")
+            line.unit_price = product_price(product_data)
+            if line.unit_price is None:
+                raise CheckoutError(f"Product {product} has no valid price")
+            line.line_total = money(line.unit_price * line.quantity)
+        self.priced_lines = lines
+        order.subtotal = sum((line.line_total for line in lines), Decimal('0.00'))
+        order.total = order.subtotal + order.shipping_cost
+        order.status = 'PRICED'
+
+    def reserve_shipping(self, order, lines):
+        if reached(order, 'SHIPPING_RESERVED'):
+            return
+        method = self.shipping.get('shipping_method')
+        if method:
+            country = self.shipping.get('country')
+            # Bảng giá trong bộ nhớ: không truy vấn MongoDB
+            options = rate_table.quote(country, self.shipping.get('weight') or 0, shipping_method=method)
+            if not options:
+                raise CheckoutError("No shipping options available for the specified criteria")
+            order.shipping_method = str(method)
+            order.shipping_country = country
+            order.shipping_cost = money(options[0]['cost'])
+        order.total = order.subtotal + order.shipping_cost
+        order.status = 'SHIPPING_RESERVED'
+
+    def create_transaction(self, order):
+        """
+        Tạo Transaction ``PENDING`` cho order và lưu kết quả pricing / shipping
+        trong cùng một transaction của database.
+        """
+        if reached(order, 'PAYMENT_PENDING'):
+            if order.transaction is not None and order.transaction.status == 'PENDING':
+                # Retry: đưa lại vào hàng đợi (xử lý thanh toán là idempotent)
+                payment_queue.enqueue(order.transaction)
+            return
+        values = {
+            'user_id': order.user_id,
+            'payment_method_id': self.payment_method_id,
+            'amount': order.total,
+            'currency': order.currency,
+            'status': 'PENDING',
+        }
+        with db_transaction.atomic(using=self.db):
+            if self.resumed:
+                # Transaction có thể đã được tạo trước khi lần chạy trước bị gián đoạn
+                order.transaction, _ = Transaction.objects.get_or_create(
+                    order_id=order.order_number, defaults=values
+                )
+            else:
+                order.transaction = Transaction.objects.create(order_id=order.order_number, **values)
+            if self.priced_lines:
+                OrderLine.objects.bulk_update(self.priced_lines, ['unit_price', 'line_total'])
+            payment_queue.enqueue(order.transaction)
+            order.status = 'PAYMENT_PENDING'
+            order.save(update_fields=[
+                'status', 'subtotal', 'shipping_cost', 'total',
+                'shipping_method', 'shipping_country', 'transaction', 'updated_at',
+            ])
+
+
+def update_order_status(sender, transaction, **kwargs):
+    """
+    Receiver của ``payment.processing.transaction_processed``: cập nhật order
+    đang chờ thanh toán theo kết quả của transaction.
+    """
+    if transaction.status == 'COMPLETED':
+        new_status = 'PLACED'
+    elif transaction.status == 'FAILED':
+        new_status = 'PAYMENT_FAILED'
+    else:
+        return
+    Order.objects.filter(transaction_id=transaction.id, status='PAYMENT_PENDING').update(
+        status=new_status, updated_at=timezone.now()
+    )
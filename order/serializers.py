@@ -0,0 +1,58 @@
+from decimal import Decimal
+from rest_framework import serializers
+from ecommerce.fieldsets import SparseFieldsetSerializerMixin
+from payment.models import PaymentMethod
+from .models import Order, OrderLine
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = ['id', 'product_type', 'product_id', 'product_name',
+                  'quantity', 'unit_price', 'line_total']
+        read_only_fields = fields
+
+class OrderSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """
+    Serializer for Order model with its lines.
+    """
+    lines = OrderLineSerializer(many=True, read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    transaction_status = serializers.CharField(source='transaction.status', read_only=True, default=None)
+
+    projection_dependencies = {
+        'status_display': ('status',),
+        'transaction_status': ('transaction',),
+    }
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'cart_id', 'status', 'status_display',
+            'currency', 'subtotal', 'shipping_cost', 'total',
+            'shipping_method', 'shipping_country', 'transaction', 'transaction_status',
+            'lines', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+class CheckoutSerializer(serializers.Serializer):
+    """
+    Input of the checkout endpoint.
+    """
+    cart_id = serializers.IntegerField()
+    payment_method = serializers.IntegerField()
+    shipping_method = serializers.CharField(required=False)
+    country = serializers.CharField(required=False)
+    weight = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=Decimal('0'))
+
+    def validate_payment_method(self, value):
+        user = self.context['request'].user
+        if not PaymentMethod.objects.filter(id=value, user_id=user.pk, is_active=True).exists():
+            raise serializers.ValidationError("Payment method not found")
+        return value
+
+    def validate(self, data):
+        if data.get('shipping_method') and not (data.get('country') and 'weight' in data):
+            raise serializers.ValidationError(
+                {"shipping_method": "country and weight are required with a shipping method"}
+            )
+        return data
@@ -1,3 +1,144 @@
+from decimal import Decimal
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from cart.models import Cart, CartItem
+from payment.models import PaymentMethod, Transaction
+from payment.tasks import payment_queue
+from payment.tests import PaymentTestMixin
+from .models import Order, OrderLine
+from .pipeline import CheckoutError, CheckoutPipeline, update_order_status
+
+
+class CheckoutPipelineTests(PaymentTestMixin, TestCase):
+    """
+    Checkout: cart ở 'default', order / transaction ở 'postgresql'; chạy lại phải tiếp tục order cũ.
+    """
+    def setUp(self):
+        self.user = self.create_user('checkout@example.com')
+        self.payment_method = PaymentMethod.objects.create(
+            user_id=self.user.pk, payment_type='COD', provider='COD', account_number='0000',
+        )
+        self.cart = Cart.objects.create(customer_id=str(self.user.pk))
+        for index, price in enumerate(('10.00', '4.50')):
+            CartItem.objects.create(
+                cart=self.cart, product_type='book', product_id=f'book-{index}',
+                product_name=f'Book {index}', quantity=index + 1, price=Decimal(price),
+            )
+        self.prices = {'book-0': '12.00', 'book-1': '4.50'}
+        self.fetch_products = mock.Mock(side_effect=lambda products: [
+            ({'price': self.prices[product_id]}, None) if product_id in self.prices
+            else (None, 'Product not found')
+            for _, product_id in products
+        ])
+        enqueue = mock.patch.object(payment_queue, 'enqueue')
+        self.enqueue = enqueue.start()
+        self.addCleanup(enqueue.stop)
+
+    def checkout(self):
+        return CheckoutPipeline(
+            self.user, self.cart.id, self.payment_method.id, fetch_products=self.fetch_products,
+        ).run()
+
+    def test_checkout_reprices_lines_and_creates_transaction(self):
+        order = self.checkout()
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAYMENT_PENDING')
+        # Giá hiện tại của product service, không phải giá lúc thêm vào cart
+        self.assertEqual(order.subtotal, Decimal('21.00'))
+        self.assertEqual(
+            dict(OrderLine.objects.filter(order=order).values_list('product_id', 'unit_price')),
+            {'book-0': Decimal('12.00'), 'book-1': Decimal('4.50')},
+        )
+        self.assertEqual(order.transaction.amount, Decimal('21.00'))
+        self.assertEqual(order.transaction.order_id, order.order_number)
+        self.assertTrue(Order.objects.using('postgresql').filter(cart_id=self.cart.id).exists())
+        self.assertTrue(Cart.objects.using('default').filter(id=self.cart.id).exists())
+        self.enqueue.assert_called_once_with(order.transaction)
+
+    def test_rerun_resumes_the_existing_order(self):
+        first = self.checkout()
+        second = self.checkout()
+
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Transaction.objects.filter(order_id=first.order_number).count(), 1)
+        # Order đã PAYMENT_PENDING: không định giá lại, chỉ đưa transaction PENDING vào hàng đợi lần nữa
+        self.assertEqual(self.fetch_products.call_count, 1)
+        self.assertEqual(self.enqueue.call_count, 2)
+
+    def test_rerun_after_final_status_does_nothing(self):
+        order = self.checkout()
+        Order.objects.filter(id=order.id).update(status='PLACED')
+
+        self.checkout()
+        self.assertEqual(self.fetch_products.call_count, 1)
+        self.assertEqual(self.enqueue.call_count, 1)
+
+    def test_unavailable_product_stops_at_created(self):
+        del self.prices['book-1']
+        with self.assertRaises(CheckoutError):
+            self.checkout()
+
+        order = Order.objects.get(cart_id=self.cart.id)
+        self.assertEqual(order.status, 'CREATED')
+        self.assertFalse(Transaction.objects.filter(order_id=order.order_number).exists())
+
+        self.prices['book-1'] = '5.00'
+        resumed = self.checkout()
+        self.assertEqual(resumed.id, order.id)
+        self.assertEqual(resumed.status, 'PAYMENT_PENDING')
+        self.assertEqual(resumed.subtotal, Decimal('22.00'))
+
+    def test_product_without_a_valid_price_is_rejected(self):
+        for price in (None, 'free', '-1.00'):
+            self.prices['book-1'] = price
+            with self.assertRaisesMessage(CheckoutError, 'has no valid price'):
+                self.checkout()
+        self.assertEqual(Order.objects.get(cart_id=self.cart.id).status, 'CREATED')
+
+    def test_product_marked_unavailable_is_rejected(self):
+        self.fetch_products.side_effect = lambda products: [
+            ({'price': self.prices[product_id], 'available': product_id != 'book-1'}, None)
+            for _, product_id in products
+        ]
+        with self.assertRaisesMessage(CheckoutError, 'Product book book-1 is unavailable'):
+            self.checkout()
+        order = Order.objects.get(cart_id=self.cart.id)
+        self.assertEqual(order.status, 'CREATED')
+        self.assertFalse(Transaction.objects.filter(order_id=order.order_number).exists())
+
+    def test_failed_enqueue_rolls_back_transaction_and_pricing(self):
+        self.enqueue.side_effect = RuntimeError('queue unavailable')
+        with self.assertRaises(RuntimeError):
+            self.checkout()
+
+        order = Order.objects.get(cart_id=self.cart.id)
+        self.assertEqual(order.status, 'CREATED')
+        self.assertFalse(Transaction.objects.filter(order_id=order.order_number).exists())
+        self.assertEqual(OrderLine.objects.get(order=order, product_id='book-0').unit_price, Decimal('10.00'))
+
+        self.enqueue.side_effect = None
+        self.assertEqual(self.checkout().status, 'PAYMENT_PENDING')
+        self.assertEqual(Transaction.objects.filter(order_id=order.order_number).count(), 1)
+
+    def test_payment_result_moves_order_to_final_status(self):
+        order = self.checkout()
+        order.transaction.status = 'FAILED'
+        update_order_status(Transaction, transaction=order.transaction)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAYMENT_FAILED')
+
+        # Trạng thái cuối không bị ghi đè bởi kết quả đến sau
+        order.transaction.status = 'COMPLETED'
+        update_order_status(Transaction, transaction=order.transaction)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAYMENT_FAILED')
+
+    def test_cart_of_another_customer_is_not_found(self):
+        other = self.create_user('other@example.com')
+        with self.assertRaisesMessage(CheckoutError, 'Cart not found'):
+            CheckoutPipeline(other, self.cart.id, self.payment_method.id, fetch_products=self.fetch_products).run()
+        self.assertFalse(Order.objects.exists())
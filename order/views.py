@@ -1,3 +1,60 @@
-from django.shortcuts import render
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ecommerce.fieldsets import SparseFieldsetMixin
+from ecommerce.idempotency import idempotent
+from ecommerce.pagination import CreatedAtKeysetPagination
+from payment.gateways import charge_lock_ttl
+from .models import Order
+from .pipeline import CheckoutError, CheckoutPipeline
+from .serializers import CheckoutSerializer, OrderSerializer
 
-# Create your views here.
+class CheckoutView(APIView):
+    """
+    Checkout a cart: snapshot it into an Order, price it, reserve shipping
+    and create the payment Transaction. Safe to retry for the same cart.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent('order.checkout', lock_ttl=charge_lock_ttl)
+    def post(self, request, *args, **kwargs):
+        serializer = CheckoutSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        pipeline = CheckoutPipeline(
+            user=request.user,
+            cart_id=data['cart_id'],
+            payment_method_id=data['payment_method'],
+            shipping={
+                'shipping_method': data.get('shipping_method'),
+                'country': data.get('country'),
+                'weight': data.get('weight'),
+            }
+        )
+        try:
+            order = pipeline.run()
+        except CheckoutError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+class OrderListView(SparseFieldsetMixin, generics.ListAPIView):
+    """
+    Orders of the current user, newest first.
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user).select_related('transaction').prefetch_related('lines')
+
+class OrderDetailView(SparseFieldsetMixin, generics.RetrieveAPIView):
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'order_number'
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user).select_related('transaction').prefetch_related('lines')
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class PaymentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payment'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .cache import invalidate_payment_methods
+        from .gateways import gateway_registry
+        from .models import PaymentGatewayConfig, PaymentMethod
+        post_save.connect(gateway_registry.invalidate, sender=PaymentGatewayConfig,
+                          dispatch_uid='payment.gateway_registry.save')
+        post_delete.connect(gateway_registry.invalidate, sender=PaymentGatewayConfig,
+                            dispatch_uid='payment.gateway_registry.delete')
+        post_save.connect(invalidate_payment_methods, sender=PaymentMethod,
+                          dispatch_uid='payment.payment_method_cache.save')
+        post_delete.connect(invalidate_payment_methods, sender=PaymentMethod,
+                            dispatch_uid='payment.payment_method_cache.delete')
@@ -0,0 +1,67 @@
+"""
+Per-user cache of the payment-method list (``GET payment-methods/``).
+
+Entries are keyed by user and query string under a per-user version number;
+``invalidate`` bumps the version, which drops every cached page of that user
+at once. Writes call it through the ``PaymentMethod`` save/delete signals and
+from ``PaymentMethodQuerySet.set_default`` (a queryset ``update`` sends no
+signal). The version is bumped once the write's DB transaction commits, and
+a read takes its key (with the version) before it queries the primary, so a
+list read before a write is at worst cached under the version that write
+retires.
+Configured with ``PAYMENT_METHOD_CACHE`` (``TTL``, ``CACHE_ALIAS``; the
+``shared`` cache by default, so a write in one worker reaches all of them).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+
+PAYMENT_METHOD_CACHE = getattr(settings, 'PAYMENT_METHOD_CACHE', {})
+
+
+class PaymentMethodCache:
+    def __init__(self, ttl=300, cache_alias='shared'):
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def version_key(user_id):
+        return f"payment_methods:{user_id}:version"
+
+    def make_key(self, user_id, query_string):
+        version = self.cache.get(self.version_key(user_id), 0)
+        digest = hashlib.sha256(query_string.encode('utf-8')).hexdigest()[:16]
+        return f"payment_methods:{user_id}:{version}:{digest}"
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, data):
+        # ``key`` lấy trước khi đọc DB: version đổi trong lúc đọc thì bản này không được dùng
+        self.cache.set(key, data, self.ttl)
+
+    def invalidate(self, user_id, using=None):
+        """Bump version sau khi transaction hiện tại trên ``using`` commit (ngay nếu không có)."""
+        db_transaction.on_commit(lambda: self.bump_version(user_id), using=using)
+
+    def bump_version(self, user_id):
+        # Version theo thời gian: không trùng version cũ kể cả khi key version bị evict
+        self.cache.set(self.version_key(user_id), time.time_ns(), None)
+
+
+payment_method_cache = PaymentMethodCache(
+    ttl=PAYMENT_METHOD_CACHE.get('TTL', 300),
+    cache_alias=PAYMENT_METHOD_CACHE.get('CACHE_ALIAS', 'shared'),
+)
+
+
+def invalidate_payment_methods(sender, instance, **kwargs):
+    """Receiver của ``post_save`` / ``post_delete`` trên ``PaymentMethod``."""
+    payment_method_cache.invalidate(instance.user_id, using=instance._state.db)
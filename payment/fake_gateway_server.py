@@ -0,0 +1,110 @@
+"""
+Local HTTP server speaking the ``HTTPGateway`` JSON API, for tests and local runs.
+
+    server = FakeGatewayServer(latency=0.05, failure_rate=0.1).start()
+    PaymentGatewayConfig.objects.create(gateway='STRIPE', config={'base_url': server.url})
+    ...
+    server.stop()
+
+or standalone with ``python manage.py fake_gateway``. Besides declines
+(``failure_rate``) it can answer with 5xx (``error_rate``) to exercise retries
+and the circuit breaker, or with a fixed status such as 429 (``busy_status``,
+with ``Retry-After: retry_after``). Charges are keyed by ``Idempotency-Key``: a retried
+charge gets the original answer back.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, như gateway thật
+
+    def do_POST(self):
+        gateway = self.server.gateway
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        gateway.requests += 1
+        if gateway.latency:
+            time.sleep(gateway.latency)
+        if self.path.rstrip('/').rsplit('/', 1)[-1] != 'charges':
+            return self.reply(404, {'error': 'Not found'})
+        if gateway.error_rate and random.random() < gateway.error_rate:
+            return self.reply(503, {'error': 'Service unavailable'})
+        if gateway.busy_status:
+            return self.reply(gateway.busy_status, {'error': 'Try again later'},
+                              headers={'Retry-After': str(gateway.retry_after)})
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return self.reply(400, {'error': 'Invalid JSON'})
+
+        key = self.headers.get('Idempotency-Key') or uuid.uuid4().hex
+        with gateway.lock:
+            charge = gateway.charges.get(key)
+            if charge is None:
+                charge = {'id': f"ch_{uuid.uuid4().hex[:16]}", 'order_id': payload.get('order_id'),
+                          'amount': payload.get('amount'), 'currency': payload.get('currency')}
+                if gateway.failure_rate and random.random() < gateway.failure_rate:
+                    charge.update(status='declined', error='Card declined')
+                else:
+                    charge['status'] = 'succeeded'
+                gateway.charges[key] = charge
+        self.reply(201, charge)
+
+    def reply(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client đã timeout và đóng kết nối
+
+    def log_message(self, format, *args):
+        if self.server.gateway.verbose:
+            super().log_message(format, *args)
+
+
+class FakeGatewayServer:
+    """
+    Fake gateway chạy trong một thread nền; ``port=0`` chọn cổng trống.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0, error_rate=0.0,
+                 busy_status=None, retry_after=1, verbose=False):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.busy_status = busy_status
+        self.retry_after = retry_after
+        self.verbose = verbose
+        self.charges = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), FakeGatewayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.gateway = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-gateway', daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,471 @@
+"""
+Payment gateway adapters.
+
+``gateway_registry`` turns the active ``PaymentGatewayConfig`` rows into
+adapters. The rows are loaded once and kept in memory; saving or deleting a
+config invalidates them, and ``PAYMENT_GATEWAYS['RELOAD_INTERVAL']`` bounds
+how stale another process can be. A reload keeps the adapter (session and
+circuit breaker state) of every gateway whose config did not change; a
+replaced adapter closes its session once its in-flight requests finish.
+Each adapter keeps a persistent
+``requests.Session`` (its own connection pool) and talks to its gateway with
+strict connect/read timeouts, retries transport errors and 5xx responses with
+jittered exponential backoff, and sits behind a ``CircuitBreaker`` so a
+failing gateway is failed fast instead of tying up the payment workers.
+Only a real decline is a final answer; 408 / 409 / 429 (timeout, charge
+still in flight, rate limited) raise ``GatewayBusyError`` so the payment
+queue retries after ``Retry-After``.
+
+``PaymentGatewayConfig.config`` of an HTTP gateway::
+
+    {
+        "base_url": "https://gateway.example.com/v1",
+        "api_key": "...",
+        "connect_timeout": 2, "read_timeout": 10,
+        "pool_size": 10, "max_retries": 2, "backoff": 0.2,
+        "failure_threshold": 5, "reset_timeout": 30
+    }
+
+``FakeGateway`` stands in for a real gateway locally and in tests: it waits
+``LATENCY`` seconds and fails a ``FAILURE_RATE`` fraction of the charges,
+both configured through ``PAYMENT_FAKE_GATEWAY``. It only charges when no
+gateway is configured and ``PAYMENT_GATEWAYS['FAKE_FALLBACK']`` (``DEBUG`` by
+default) is on; otherwise a payment without a gateway raises
+``ImproperlyConfigured``. ``payment.fake_gateway_server``
+serves the same JSON API as ``HTTPGateway`` over HTTP.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_FAKE_GATEWAY = getattr(settings, 'PAYMENT_FAKE_GATEWAY', {})
+PAYMENT_GATEWAYS = getattr(settings, 'PAYMENT_GATEWAYS', {})
+
+
+@dataclass
+class GatewayResult:
+    success: bool
+    reference: str = None
+    error: str = None
+    response: dict = field(default_factory=dict)
+
+
+class RetryableError(Exception):
+    """
+    Lỗi tạm thời: charge chưa có kết quả và có thể thử lại. Hàng đợi thanh toán
+    (``payment.tasks``) xử lý lại transaction thay vì đánh dấu ``FAILED``.
+    """
+    def __init__(self, message='', retry_after=None):
+        super().__init__(message)
+        # Số giây nên chờ trước khi thử lại (None: theo backoff của hàng đợi)
+        self.retry_after = retry_after
+
+
+class GatewayError(RetryableError):
+    """Không gọi được gateway (lỗi kết nối, timeout, 5xx sau khi đã retry)."""
+
+
+class GatewayBusyError(RetryableError):
+    """
+    Gateway trả lời nhưng chưa xử lý charge (408, 409 khi charge cùng
+    Idempotency-Key đang chạy, 429): thử lại sau ``retry_after`` (``Retry-After``).
+    """
+
+
+class CircuitOpenError(GatewayError):
+    """
+    Circuit breaker đang mở: gateway bị bỏ qua cho tới khi hết ``reset_timeout``.
+    Gateway chưa được gọi, nên hàng đợi hoãn transaction tới ``retry_after``
+    mà không tính là một lần thử.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker đếm lỗi liên tiếp.
+
+    ``closed`` -> ``open`` sau ``failure_threshold`` lỗi liên tiếp; sau
+    ``reset_timeout`` giây chuyển sang ``half-open`` và cho một request thử đi
+    qua: thành công thì đóng lại, lỗi thì mở tiếp.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def retry_after(self):
+        """Số giây tới khi circuit cho request thử đi qua (ít nhất 1 giây)."""
+        with self._lock:
+            if self.opened_at is None:
+                return 1.0
+            return max(self.reset_timeout - (time.monotonic() - self.opened_at), 1.0)
+
+    def allow(self):
+        """Request có được gửi tới gateway không."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+def parse_retry_after(value):
+    """Header ``Retry-After`` (số giây hoặc HTTP-date) -> số giây, ``None`` nếu không đọc được."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, backoff):
+    """Exponential backoff với full jitter: ngẫu nhiên trong ``[0, backoff * 2**attempt]``."""
+    return random.uniform(0, backoff * 2 ** attempt)
+
+
+class HTTPGateway:
+    """
+    Adapter cho gateway có JSON API ``POST <base_url>/charges``.
+
+    Request gửi ``Idempotency-Key: <order_id>`` nên retry không charge hai lần.
+    Gateway trả về ``{"id": ..., "status": "succeeded" | "declined", "error": ...}``;
+    chỉ decline (``status: declined``, 402, hay 400 có ``decline_code``) là kết
+    quả cuối. 408 / 409 / 429 raise ``GatewayBusyError``, lỗi gọi gateway và
+    các 4xx khác raise ``GatewayError``.
+    """
+    charge_path = 'charges'
+    busy_statuses = (408, 409, 429)
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.base_url = config['base_url'].rstrip('/')
+        self.api_key = config.get('api_key', '')
+        self.timeout = (config.get('connect_timeout', 2), config.get('read_timeout', 10))
+        self.max_retries = config.get('max_retries', 2)
+        self.backoff = config.get('backoff', 0.2)
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get('failure_threshold', 5),
+            reset_timeout=config.get('reset_timeout', 30),
+        )
+        pool_size = config.get('pool_size', 10)
+        self._in_flight = 0
+        self._closing = False
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        # Retry do adapter tự làm (có jitter và circuit breaker), không dùng retry của urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if self.api_key:
+            self.session.headers['Authorization'] = f"Bearer {self.api_key}"
+
+    def time_budget(self):
+        """Thời gian tối đa (giây) của một charge: timeout của mọi lần thử cộng backoff."""
+        attempts = self.max_retries + 1
+        return attempts * sum(self.timeout) + sum(self.backoff * 2 ** attempt for attempt in range(attempts - 1))
+
+    def close(self):
+        """Đóng session, sau khi các request đang chạy trên adapter này kết thúc."""
+        with self._lock:
+            self._closing = True
+            idle = not self._in_flight
+        if idle:
+            self.session.close()
+
+    def post(self, path, payload, idempotency_key):
+        """
+        POST tới gateway qua circuit breaker, retry lỗi kết nối / timeout / 5xx.
+        Trả về response (< 500) hoặc raise ``GatewayError``.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"{self.name} gateway is unavailable (circuit open)", retry_after=self.breaker.retry_after()
+            )
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return self._post(path, payload, idempotency_key)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                drained = self._closing and not self._in_flight
+            if drained:
+                self.session.close()
+
+    def _post(self, path, payload, idempotency_key):
+        url = f"{self.base_url}/{path}"
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(backoff_delay(attempt - 1, self.backoff))
+            try:
+                response = self.session.post(
+                    url, json=payload, timeout=self.timeout,
+                    headers={'Idempotency-Key': idempotency_key},
+                )
+            except requests.RequestException as e:
+                error = f"{self.name} gateway unavailable: {e}"
+                continue
+            if response.status_code >= 500:
+                error = f"{self.name} gateway error: {response.status_code}"
+                continue
+            self.breaker.record_success()
+            return response
+        self.breaker.record_failure()
+        raise GatewayError(error)
+
+    def charge(self, transaction):
+        payload = {
+            'amount': str(transaction.amount),
+            'currency': transaction.currency,
+            'order_id': transaction.order_id,
+            'payment_method': transaction.payment_method_id,
+        }
+        response = self.post(self.charge_path, payload, idempotency_key=transaction.order_id)
+        if response.status_code in self.busy_statuses:
+            raise GatewayBusyError(
+                f"{self.name} gateway busy: {response.status_code}",
+                retry_after=parse_retry_after(response.headers.get('Retry-After')),
+            )
+        try:
+            data = response.json()
+        except ValueError:
+            # Không biết charge đã thực hiện chưa: retry an toàn nhờ Idempotency-Key
+            raise GatewayError(f"{self.name} gateway returned an invalid response")
+
+        data['gateway'] = self.name
+        status = response.status_code
+        if status in (200, 201) and data.get('status') == 'succeeded':
+            return GatewayResult(success=True, reference=data.get('id'), response=data)
+        declined = (
+            status in (200, 201) and data.get('status') == 'declined'
+            or status == 402
+            or status == 400 and bool(data.get('decline_code'))
+        )
+        if declined:
+            return GatewayResult(
+                success=False,
+                error=data.get('error') or "Payment declined by gateway",
+                response=data,
+            )
+        # 401, 404, 400 không có decline_code...: lỗi cấu hình / của gateway, không phải của khách
+        logger.error("Unexpected %s answer from %s gateway: %s", status, self.name, data)
+        raise GatewayError(f"{self.name} gateway error: {status}")
+
+
+class FakeGateway:
+    """
+    Gateway giả lập: độ trễ và tỉ lệ lỗi cấu hình được.
+    """
+    name = 'FAKE'
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def charge(self, transaction):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            return GatewayResult(
+                success=False,
+                error="Payment declined by gateway",
+                response={'gateway': self.name, 'order_id': transaction.order_id, 'declined': True},
+            )
+        reference = f"TXN-{uuid.uuid4().hex[:16].upper()}"
+        return GatewayResult(
+            success=True,
+            reference=reference,
+            response={'gateway': self.name, 'order_id': transaction.order_id, 'reference': reference},
+        )
+
+    def time_budget(self):
+        return self.latency
+
+    def close(self):
+        pass
+
+
+fake_gateway = FakeGateway(
+    latency=PAYMENT_FAKE_GATEWAY.get('LATENCY', 0.0),
+    failure_rate=PAYMENT_FAKE_GATEWAY.get('FAILURE_RATE', 0.0),
+)
+
+# Adapter cho từng PaymentGatewayConfig.gateway; ghi đè bằng PAYMENT_GATEWAYS['ADAPTERS']
+GATEWAY_ADAPTERS = {
+    'STRIPE': 'payment.gateways.HTTPGateway',
+    'PAYPAL': 'payment.gateways.HTTPGateway',
+    'SQUARE': 'payment.gateways.HTTPGateway',
+    'RAZORPAY': 'payment.gateways.HTTPGateway',
+    **PAYMENT_GATEWAYS.get('ADAPTERS', {}),
+}
+
+
+class GatewayRegistry:
+    """
+    Adapter của các gateway đang active, nạp từ ``PaymentGatewayConfig`` một lần
+    và giữ trong bộ nhớ cho tới khi ``invalidate`` (hoặc quá ``reload_interval``).
+    """
+    def __init__(self, adapters=None, default=None, reload_interval=60, fake_fallback=False):
+        self.adapters = adapters if adapters is not None else GATEWAY_ADAPTERS
+        self.default = default
+        self.reload_interval = reload_interval
+        self.fake_fallback = fake_fallback
+        self._gateways = None
+        # None: phải nạp lại ở lần dùng kế tiếp
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def gateways(self):
+        retired = []
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_interval:
+                old = self._gateways or {}
+                self._gateways = self._load(old)
+                self._loaded_at = time.monotonic()
+                retired = [gateway for name, gateway in old.items() if self._gateways.get(name) is not gateway]
+            gateways = self._gateways
+        for gateway in retired:
+            gateway.close()
+        return gateways
+
+    def _load(self, current):
+        """Adapter cho các config active; adapter trong ``current`` có cùng config được dùng lại."""
+        from .models import PaymentGatewayConfig
+
+        gateways = {}
+        for config in PaymentGatewayConfig.objects.filter(is_active=True):
+            path = self.adapters.get(config.gateway)
+            if path is None:
+                logger.warning("No adapter for payment gateway %s", config.gateway)
+                continue
+            adapter_class = import_string(path)
+            options = config.config or {}
+            existing = current.get(config.gateway)
+            if type(existing) is adapter_class and getattr(existing, 'config', None) == options:
+                gateways[config.gateway] = existing
+                continue
+            try:
+                gateways[config.gateway] = adapter_class(config.gateway, options)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error("Invalid config for payment gateway %s: %s", config.gateway, e)
+        return gateways
+
+    def invalidate(self, **kwargs):
+        """
+        Receiver của ``post_save`` / ``post_delete`` trên ``PaymentGatewayConfig``:
+        nạp lại config ở lần dùng kế tiếp.
+        """
+        with self._lock:
+            self._loaded_at = None
+
+    def close(self):
+        """Đóng session của mọi adapter (tắt tiến trình, test)."""
+        with self._lock:
+            old, self._gateways, self._loaded_at = self._gateways, None, None
+        for gateway in (old or {}).values():
+            gateway.close()
+
+    def get(self, name):
+        return self.gateways().get(name)
+
+    def charge_time_budget(self):
+        """Thời gian tối đa (giây) của một charge trên các gateway đang active."""
+        gateways = list(self.gateways().values()) or ([fake_gateway] if self.fake_fallback else [])
+        return max((gateway.time_budget() for gateway in gateways), default=0.0)
+
+    def for_transaction(self, transaction):
+        """
+        Gateway theo ``PaymentMethod.provider`` (vd. ``PAYPAL``), nếu không có thì
+        gateway mặc định. Khi chưa cấu hình gateway nào: ``fake_gateway`` nếu bật
+        ``fake_fallback``, ngược lại raise ``ImproperlyConfigured``.
+        """
+        gateways = self.gateways()
+        provider = (transaction.payment_method.provider or '').upper()
+        gateway = gateways.get(provider) or gateways.get(self.default)
+        if gateway is None and len(gateways) == 1:
+            gateway = next(iter(gateways.values()))
+        if gateway is None:
+            if gateways:
+                raise GatewayError(f"No active payment gateway for provider {provider or '-'}")
+            if not self.fake_fallback:
+                raise ImproperlyConfigured(
+                    "No active PaymentGatewayConfig: configure a payment gateway "
+                    "(PAYMENT_GATEWAYS['FAKE_FALLBACK'] charges through FakeGateway, for development only)"
+                )
+            gateway = fake_gateway
+        return gateway
+
+
+gateway_registry = GatewayRegistry(
+    default=PAYMENT_GATEWAYS.get('DEFAULT'),
+    reload_interval=PAYMENT_GATEWAYS.get('RELOAD_INTERVAL', 60),
+    # FakeGateway duyệt mọi charge: chỉ dùng khi phát triển
+    fake_fallback=PAYMENT_GATEWAYS.get('FAKE_FALLBACK', settings.DEBUG),
+)
+
+
+def get_gateway(transaction):
+    """Gateway xử lý ``transaction``."""
+    return gateway_registry.for_transaction(transaction)
+
+
+def charge_lock_ttl():
+    """
+    TTL của lock ``Idempotency-Key`` cho endpoint có thể charge ngay trong
+    request (``SyncBackend``): dài hơn một charge tệ nhất (mọi lần retry), để
+    retry của client không chạy lại request khi charge đầu tiên chưa xong.
+    """
+    from ecommerce.idempotency import idempotency_store
+    return max(idempotency_store.lock_ttl, 2 * gateway_registry.charge_time_budget())
@@ -0,0 +1,90 @@
+"""
+Benchmark các query của TransactionViewSet / PaymentMethodViewSet trước / sau khi có index.
+
+    python manage.py bench_payment_queries                   # seed 1M transaction + payment method
+    python manage.py bench_payment_queries --rows 100000 --runs 500
+    python manage.py bench_payment_queries --skip-seed --keep
+    python manage.py bench_payment_queries --destructive     # đo thêm khi chưa có index (chỉ DEBUG)
+
+Dữ liệu seed có ``order_id`` / ``provider`` bắt đầu bằng ``BENCH-`` và bị xóa khi
+kết thúc (trừ khi có ``--keep``). ``user_id`` được gán trực tiếp, không cần Customer.
+"""
+import random
+from decimal import Decimal
+
+from ecommerce import benchmark
+from payment.models import PaymentMethod, Transaction
+
+BENCH_PREFIX = 'BENCH-'
+
+
+class Command(benchmark.QueryBenchmarkCommand):
+    help = 'Seed transactions and report p50/p99 latency of the payment view querysets with and without indexes.'
+    model = Transaction
+    rows_help = 'Transactions (and payment methods) to seed.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--users', type=int, default=50_000, help='Distinct user ids.')
+
+    def seeded_transactions(self, using):
+        return Transaction.objects.using(using).filter(order_id__startswith=BENCH_PREFIX)
+
+    def cases(self, using, options):
+        if not self.seeded_transactions(using).exists():
+            return {}
+        users = options['users']
+        rng = random.Random(0)
+        return {
+            'TransactionViewSet': lambda: list(
+                Transaction.objects.using(using).filter(user_id=rng.randrange(users))
+                .select_related('payment_method').order_by('-created_at', '-id')[:20]
+            ),
+            'PaymentMethodViewSet': lambda: list(
+                PaymentMethod.objects.using(using).filter(user_id=rng.randrange(users))
+                .order_by('-created_at', '-id')[:20]
+            ),
+        }
+
+    def indexes(self):
+        return (
+            benchmark.model_indexes(Transaction, ['transaction_user_created_idx']) +
+            benchmark.model_indexes(PaymentMethod, ['payment_method_user_idx'])
+        )
+
+    def describe(self, using):
+        return f"{self.seeded_transactions(using).count()} transactions"
+
+    def cleanup(self, using):
+        self.seeded_transactions(using).delete()
+        PaymentMethod.objects.using(using).filter(provider__startswith=BENCH_PREFIX).delete()
+
+    def seed(self, using, options):
+        rows, users, batch_size = options['rows'], options['users'], options['batch_size']
+        self.stdout.write(f"Seeding {rows} payment methods and {rows} transactions ...")
+        benchmark.seed(
+            PaymentMethod,
+            lambda i: PaymentMethod(
+                user_id=i % users,
+                payment_type='CREDIT_CARD',
+                provider=f'{BENCH_PREFIX}Visa',
+                account_number=f'{i:016d}',
+            ),
+            rows, using, batch_size=batch_size, progress=self.progress,
+        )
+        method_ids = list(
+            PaymentMethod.objects.using(using).filter(provider__startswith=BENCH_PREFIX)
+            .order_by('id').values_list('id', 'user_id')
+        )
+        benchmark.seed(
+            Transaction,
+            lambda i: Transaction(
+                user_id=method_ids[i % len(method_ids)][1],
+                payment_method_id=method_ids[i % len(method_ids)][0],
+                order_id=f'{BENCH_PREFIX}{i}',
+                amount=Decimal('10.00') + i % 100,
+                status='COMPLETED',
+                transaction_id=f'{BENCH_PREFIX}TXN-{i}',
+            ),
+            rows, using, batch_size=batch_size, progress=self.progress,
+        )
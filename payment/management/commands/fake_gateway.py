@@ -0,0 +1,36 @@
+"""
+Chạy fake payment gateway (``payment.fake_gateway_server``) để test ở local.
+
+    python manage.py fake_gateway                                  # http://127.0.0.1:9300
+    python manage.py fake_gateway --latency 0.3 --failure-rate 0.1
+    python manage.py fake_gateway --error-rate 0.5                 # 5xx để thử retry / circuit breaker
+
+Trỏ ``PaymentGatewayConfig.config['base_url']`` tới địa chỉ của server.
+"""
+from django.core.management.base import BaseCommand
+
+from payment.fake_gateway_server import FakeGatewayServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake payment gateway speaking the HTTPGateway JSON API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9300)
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait per request.')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of declined charges.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 503 responses.')
+
+    def handle(self, *args, **options):
+        server = FakeGatewayServer(
+            host=options['host'], port=options['port'], latency=options['latency'],
+            failure_rate=options['failure_rate'], error_rate=options['error_rate'], verbose=True,
+        )
+        self.stdout.write(f"Fake payment gateway listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
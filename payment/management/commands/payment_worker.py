@@ -0,0 +1,54 @@
+"""
+Worker của hàng đợi thanh toán trong DB (``payment.tasks.DatabaseQueueBackend``).
+
+    python manage.py payment_worker                      # chạy liên tục
+    python manage.py payment_worker --concurrency 16     # 16 thread gọi gateway song song
+    python manage.py payment_worker --once               # xử lý hết hàng đợi rồi thoát
+
+Có thể chạy nhiều tiến trình worker cùng lúc.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payment.tasks import DatabaseQueueBackend, payment_queue
+
+
+class Command(BaseCommand):
+    help = 'Process queued payment tasks (DatabaseQueueBackend).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Gateway calls running in parallel.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+
+    def handle(self, *args, **options):
+        queue = payment_queue if isinstance(payment_queue, DatabaseQueueBackend) else DatabaseQueueBackend()
+        concurrency = max(options['concurrency'], 1)
+        worker_id = queue.worker_id()
+        self.stdout.write(f"Payment worker {worker_id} ({concurrency} threads)")
+
+        def run(task):
+            try:
+                queue.run(task)
+            finally:
+                close_old_connections()
+
+        processed = 0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='payment-worker') as executor:
+            try:
+                while True:
+                    queue.requeue_stale()
+                    tasks = queue.claim(worker_id, limit=concurrency * 2)
+                    if not tasks:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    list(executor.map(run, tasks))
+                    processed += len(tasks)
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(f"Processed {processed} payment tasks")
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentmethod',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payment_method_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='transaction_user_created_idx'),
+        ),
+    ]
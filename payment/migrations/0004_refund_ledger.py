@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_refunds(apps, schema_editor):
+    """
+    Mỗi transaction đã refund trước khi có ledger nhận một Refund bằng
+    ``refund_amount``, để tổng ledger khớp với transaction.
+    """
+    Transaction = apps.get_model('payment', 'Transaction')
+    Refund = apps.get_model('payment', 'Refund')
+    db = schema_editor.connection.alias
+    refunded = (
+        Transaction.objects.using(db).filter(refund_amount__gt=0)
+        .order_by('id').values_list('id', 'refund_amount')
+    )
+    Refund.objects.using(db).bulk_create(
+        (Refund(transaction_id=transaction_id, amount=amount, reason='Backfilled from refund_amount')
+         for transaction_id, amount in refunded.iterator(chunk_size=1000)),
+        batch_size=1000,
+    )
+    # auto_now_add đặt created_at là lúc migrate: dùng lần cập nhật cuối của transaction
+    Refund.objects.using(db).update(created_at=models.Subquery(
+        Transaction.objects.using(db).filter(pk=models.OuterRef('transaction_id')).values('updated_at')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0003_payment_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Refund',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='refunds', to='payment.transaction')),
+            ],
+            options={
+                'db_table': 'refunds',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['transaction', '-created_at'], name='refund_transaction_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_refunds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+def keep_latest_default(apps, schema_editor):
+    """Trước khi có constraint: mỗi user chỉ giữ payment method mặc định mới nhất."""
+    PaymentMethod = apps.get_model('payment', 'PaymentMethod')
+    db = schema_editor.connection.alias
+    seen = set()
+    stale = []
+    defaults = (
+        PaymentMethod.objects.using(db).filter(is_default=True)
+        .order_by('user_id', '-updated_at', '-id').values_list('id', 'user_id')
+    )
+    for payment_method_id, user_id in defaults:
+        if user_id in seen:
+            stale.append(payment_method_id)
+        seen.add(user_id)
+    PaymentMethod.objects.using(db).filter(id__in=stale).update(is_default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0004_refund_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_default, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='paymentmethod',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('user',), name='payment_method_one_default'),
+        ),
+    ]
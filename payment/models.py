@@ -1,6 +1,43 @@
-from django.db import models
+from django.db import models, router, transaction as db_transaction
 from django.conf import settings
-from decimal import Decimal
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CENTS = Decimal('0.01')
+
+
+def refund_decimal(amount):
+    """Số tiền refund dạng ``Decimal`` 2 chữ số thập phân (không qua float)."""
+    try:
+        amount = Decimal(str(amount)).quantize(CENTS, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError("Invalid refund amount")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("Refund amount must be positive")
+    return amount
+
+class PaymentMethodQuerySet(models.QuerySet):
+    def set_default(self, user_id, payment_method_id):
+        """
+        Đặt ``payment_method_id`` làm phương thức mặc định của ``user_id``.
+
+        Chạy trong một transaction: khóa các payment method của user (các lần
+        đổi song song của cùng user chạy tuần tự), bỏ default cũ rồi đặt default
+        mới - theo thứ tự này để không vi phạm ``payment_method_one_default``.
+        Trả về ``False`` nếu payment method không tồn tại / không active.
+        """
+        db = self._db or router.db_for_write(self.model)
+        with db_transaction.atomic(using=db):
+            methods = self.model.objects.using(db).filter(user_id=user_id)
+            locked = dict(methods.select_for_update().order_by('id').values_list('id', 'is_active'))
+            if not locked.get(payment_method_id):
+                return False
+            methods.filter(is_default=True).exclude(id=payment_method_id).update(is_default=False)
+            methods.filter(id=payment_method_id, is_default=False).update(is_default=True, updated_at=timezone.now())
+        from .cache import payment_method_cache
+        payment_method_cache.invalidate(user_id, using=db)
+        return True
+
 
 class PaymentMethod(models.Model):
     PAYMENT_TYPES = [
@@ -21,18 +58,88 @@ class PaymentMethod(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PaymentMethodQuerySet.as_manager()
+
     class Meta:
         db_table = 'payment_methods'
         unique_together = ['user', 'payment_type', 'account_number']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='payment_method_user_idx'),
+        ]
+        constraints = [
+            # Partial unique index: mỗi user chỉ có một payment method mặc định
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(is_default=True),
+                name='payment_method_one_default',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.get_payment_type_display()} - {self.provider} (*{self.account_number[-4:]})"
 
     def save(self, *args, **kwargs):
-        if self.is_default:
+        if not self.is_default:
+            return super().save(*args, **kwargs)
+        db = kwargs.get('using') or router.db_for_write(PaymentMethod)
+        with db_transaction.atomic(using=db):
             # Set all other payment methods of this user to non-default
-            PaymentMethod.objects.filter(user=self.user).update(is_default=False)
-        super().save(*args, **kwargs)
+            # (khóa các dòng của user để các lần đổi default song song chạy tuần tự)
+            others = PaymentMethod.objects.using(db).filter(user_id=self.user_id).exclude(pk=self.pk)
+            list(others.select_for_update().order_by('id').values_list('id', flat=True))
+            others.filter(is_default=True).update(is_default=False)
+            super().save(*args, **kwargs)
+
+class TransactionQuerySet(models.QuerySet):
+    def bulk_refund(self, refunds, reason='', batch_size=500):
+        """
+        Refund nhiều transaction (vd. khi hủy hàng loạt).
+
+        ``refunds`` là các cặp ``(transaction_id, amount)``; ``amount=None``
+        refund toàn bộ phần còn lại. Mỗi batch chạy trong một transaction:
+        khóa các dòng (``SELECT ... FOR UPDATE`` theo thứ tự id), kiểm tra bằng
+        Decimal, rồi ghi bằng một ``bulk_update`` và một ``bulk_create`` vào
+        ledger ``Refund``.
+
+        Trả về ``(created_refunds, errors)`` với ``errors = {transaction_id: message}``.
+        """
+        db = self._db or router.db_for_write(self.model)
+        created, errors = [], {}
+        pending = []
+        for transaction_id, amount in refunds:
+            try:
+                pending.append((int(transaction_id), None if amount is None else refund_decimal(amount)))
+            except (TypeError, ValueError) as e:
+                errors[transaction_id] = str(e)
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            with db_transaction.atomic(using=db):
+                locked = {
+                    t.id: t for t in self.using(db).select_related(None).select_for_update()
+                    .filter(id__in={transaction_id for transaction_id, _ in batch}).order_by('id')
+                }
+                now = timezone.now()
+                changed, ledger = {}, []
+                for transaction_id, amount in batch:
+                    transaction = locked.get(transaction_id)
+                    if transaction is None:
+                        errors[transaction_id] = "Transaction not found"
+                        continue
+                    try:
+                        amount = transaction.apply_refund(amount)
+                    except ValueError as e:
+                        errors[transaction_id] = str(e)
+                        continue
+                    transaction.updated_at = now
+                    changed[transaction_id] = transaction
+                    ledger.append(Refund(transaction=transaction, amount=amount, reason=reason))
+                self.model.objects.using(db).bulk_update(
+                    changed.values(), ['refund_amount', 'status', 'updated_at']
+                )
+                created.extend(Refund.objects.using(db).bulk_create(ledger))
+        return created, errors
+
 
 class Transaction(models.Model):
     STATUS_CHOICES = [
@@ -57,9 +164,15 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TransactionQuerySet.as_manager()
+
     class Meta:
         db_table = 'transactions'
         ordering = ['-created_at']
+        indexes = [
+            # TransactionViewSet: filter user, keyset theo (-created_at, -id)
+            models.Index(fields=['user', '-created_at', '-id'], name='transaction_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Transaction {self.order_id} - {self.status}"
@@ -72,15 +185,63 @@ class Transaction(models.Model):
     def is_refundable(self):
         return self.status == 'COMPLETED' and self.refund_amount < self.amount
 
-    def process_refund(self, amount):
+    def apply_refund(self, amount=None):
+        """
+        Kiểm tra và cộng ``amount`` (``None``: toàn bộ phần còn lại) vào
+        ``refund_amount`` trên instance, chưa lưu. Trả về số tiền được refund.
+        """
         if not self.is_refundable:
             raise ValueError("Transaction is not refundable")
-        if amount > (self.amount - self.refund_amount):
+        remaining = self.amount - self.refund_amount
+        amount = remaining if amount is None else refund_decimal(amount)
+        if amount > remaining:
             raise ValueError("Refund amount exceeds available amount")
         self.refund_amount += amount
         if self.refund_amount == self.amount:
             self.status = 'REFUNDED'
-        self.save()
+        return amount
+
+    def process_refund(self, amount, reason=''):
+        """
+        Refund một phần / toàn bộ transaction. Dòng transaction bị khóa
+        (``select_for_update``) trong lúc kiểm tra và ghi, nên các refund song
+        song không thể vượt quá ``amount``. Trả về bản ghi ``Refund``.
+        """
+        db = router.db_for_write(Transaction)
+        with db_transaction.atomic(using=db):
+            locked = Transaction.objects.using(db).select_for_update().get(pk=self.pk)
+            amount = locked.apply_refund(amount)
+            locked.save(update_fields=['refund_amount', 'status', 'updated_at'])
+            refund = Refund.objects.using(db).create(transaction=locked, amount=amount, reason=reason)
+        self.refund_amount = locked.refund_amount
+        self.status = locked.status
+        self.updated_at = locked.updated_at
+        return refund
+
+
+class Refund(models.Model):
+    """
+    Ledger của các lần refund: tổng ``amount`` của một transaction luôn bằng
+    ``Transaction.refund_amount``.
+    """
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.PROTECT,
+        related_name='refunds'
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    reason = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'refunds'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['transaction', '-created_at'], name='refund_transaction_idx'),
+        ]
+
+    def __str__(self):
+        return f"Refund {self.amount} for Transaction {self.transaction_id}"
 
 class PaymentGatewayConfig(models.Model):
     GATEWAY_CHOICES = [
@@ -101,3 +262,34 @@ class PaymentGatewayConfig(models.Model):
 
     def __str__(self):
         return f"{self.get_gateway_display()} - {'Active' if self.is_active else 'Inactive'}"
+
+class PaymentTask(models.Model):
+    """
+    Hàng đợi xử lý thanh toán lưu trong DB, dùng khi worker chạy ở nhiều tiến trình
+    (``payment.tasks.DatabaseQueueBackend`` + ``manage.py payment_worker``).
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed')
+    ]
+
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='tasks')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'payment_tasks'
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='payment_task_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Task {self.id} for {self.transaction_id} - {self.status}"
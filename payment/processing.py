@@ -0,0 +1,127 @@
+"""
+Payment gateway step, run by the payment task queue (see ``payment.tasks``).
+
+``process_transaction`` moves a transaction ``PENDING -> PROCESSING ->
+COMPLETED / FAILED``. Both transitions are conditional UPDATEs: a
+transaction is charged by exactly one worker even if it was queued twice, and
+the result is only written while the row is still the one this worker
+claimed, so it never overwrites a concurrent cancel (or another worker's
+result after a stale claim).
+
+Only a definitive answer from the gateway (success or decline) is final. When
+the charge raises (``RetryableError`` such as a gateway timeout, or an
+unexpected error) the transaction goes back to ``PENDING`` and the exception
+propagates, so the task queue can retry it; once the queue gives up it calls
+``fail_transaction``.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .gateways import get_gateway
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_TASKS = getattr(settings, 'PAYMENT_TASKS', {})
+# Transaction PROCESSING quá thời gian này (worker chết giữa chừng) được xử lý lại
+PROCESSING_TIMEOUT = PAYMENT_TASKS.get('PROCESSING_TIMEOUT', 300)
+
+FINAL_STATUSES = ('COMPLETED', 'FAILED', 'REFUNDED', 'CANCELLED')
+
+# Gửi sau khi một transaction đã có kết quả từ gateway (kwargs: transaction)
+transaction_processed = Signal()
+
+
+class StatusNotifier:
+    """
+    Đánh thức các request long-poll trong cùng tiến trình khi có transaction đổi trạng thái.
+    Với worker ở tiến trình khác, long-poll vẫn đọc lại DB theo chu kỳ.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def wait(self, timeout):
+        with self.condition:
+            self.condition.wait(timeout)
+
+
+status_notifier = StatusNotifier()
+
+
+def process_transaction(transaction_id):
+    """
+    Charge một transaction qua gateway. Trả về transaction đã xử lý, hoặc
+    ``None`` nếu transaction không còn chờ xử lý (worker khác đã nhận) hay đã
+    đổi trạng thái trong lúc charge (bị cancel).
+    Lỗi khi charge được raise lại sau khi đưa transaction về ``PENDING``.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=PROCESSING_TIMEOUT)
+    claimed = Transaction.objects.filter(
+        Q(status='PENDING') | Q(status='PROCESSING', updated_at__lt=stale),
+        id=transaction_id,
+    ).update(status='PROCESSING', updated_at=now)
+    if not claimed:
+        return None
+    status_notifier.notify()
+
+    transaction = Transaction.objects.select_related('payment_method').get(id=transaction_id)
+    try:
+        result = get_gateway(transaction).charge(transaction)
+    except Exception as e:
+        # Chưa có kết quả: trả lại hàng đợi, hàng đợi quyết định retry hay fail_transaction
+        Transaction.objects.filter(id=transaction_id, status='PROCESSING').update(
+            status='PENDING', error_message=str(e), updated_at=timezone.now()
+        )
+        status_notifier.notify()
+        raise
+
+    if result.success:
+        transaction.status = 'COMPLETED'
+        transaction.transaction_id = result.reference
+    else:
+        transaction.status = 'FAILED'
+        transaction.error_message = result.error or "Payment processing failed"
+    transaction.gateway_response = result.response
+    transaction.updated_at = timezone.now()
+    # Chỉ ghi khi row vẫn là PROCESSING do worker này nhận (updated_at = lúc claim)
+    saved = Transaction.objects.filter(id=transaction_id, status='PROCESSING', updated_at=now).update(
+        status=transaction.status, transaction_id=transaction.transaction_id,
+        error_message=transaction.error_message, gateway_response=transaction.gateway_response,
+        updated_at=transaction.updated_at,
+    )
+    if not saved:
+        logger.error(
+            "Result of transaction %s (%s, reference %s) not saved: its status changed during the charge",
+            transaction_id, transaction.status, result.reference,
+        )
+        return None
+    status_notifier.notify()
+    transaction_processed.send(sender=Transaction, transaction=transaction)
+    return transaction
+
+
+def fail_transaction(transaction_id, error):
+    """
+    Đánh dấu ``FAILED`` một transaction mà hàng đợi đã hết số lần thử.
+    Trả về ``None`` nếu transaction không còn ``PENDING``.
+    """
+    updated = Transaction.objects.filter(id=transaction_id, status='PENDING').update(
+        status='FAILED', error_message=error, updated_at=timezone.now()
+    )
+    if not updated:
+        return None
+    status_notifier.notify()
+    transaction = Transaction.objects.get(id=transaction_id)
+    transaction_processed.send(sender=Transaction, transaction=transaction)
+    return transaction
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import PaymentMethod, Transaction, PaymentGatewayConfig
+from ecommerce.fieldsets import SparseFieldsetSerializerMixin
+from decimal import Decimal
+from .models import PaymentMethod, Transaction, PaymentGatewayConfig, Refund
 
 class PaymentMethodSerializer(serializers.ModelSerializer):
     payment_type_display = serializers.CharField(source='get_payment_type_display', read_only=True)
@@ -24,10 +26,16 @@ class PaymentMethodSerializer(serializers.ModelSerializer):
                 )
         return data
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     payment_method_details = PaymentMethodSerializer(source='payment_method', read_only=True)
 
+    projection_dependencies = {
+        'status_display': ('status',),
+        'is_successful': ('status',),
+        'is_refundable': ('status', 'amount', 'refund_amount'),
+    }
+
     class Meta:
         model = Transaction
         fields = [
@@ -41,6 +49,29 @@ class TransactionSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'is_successful', 'is_refundable'
         ]
 
+class RefundSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Refund
+        fields = ['id', 'transaction', 'amount', 'reason', 'created_at']
+        read_only_fields = fields
+
+class RefundRequestSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+class BulkRefundItemSerializer(serializers.Serializer):
+    transaction = serializers.IntegerField()
+    # Bỏ trống: refund toàn bộ phần còn lại
+    amount = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False, allow_null=True
+    )
+
+class BulkRefundSerializer(serializers.Serializer):
+    MAX_REFUNDS = 10000
+
+    refunds = BulkRefundItemSerializer(many=True, allow_empty=False, max_length=MAX_REFUNDS)
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
 class PaymentGatewayConfigSerializer(serializers.ModelSerializer):
     gateway_display = serializers.CharField(source='get_gateway_display', read_only=True)
 
@@ -0,0 +1,196 @@
+"""
+Pluggable task queue for payment processing.
+
+Request handlers only create the ``PENDING`` transaction and ``enqueue`` it;
+the gateway call runs in a worker (``payment.processing.process_transaction``).
+The backend is chosen with ``PAYMENT_TASKS['BACKEND']`` (constructor
+arguments in ``PAYMENT_TASKS['OPTIONS']``):
+
+* ``ThreadPoolBackend`` (default): an in-process thread pool, started once
+  the surrounding DB transaction commits.
+* ``DatabaseQueueBackend``: a ``PaymentTask`` row written in the same DB
+  transaction as the payment (so nothing is lost on a crash), consumed by
+  ``manage.py payment_worker`` in any number of processes.
+* ``SyncBackend``: processes inline after commit, for tests and scripts.
+
+When ``process_transaction`` raises (gateway timeout, 5xx, ...) the thread
+pool and the database queue retry after ``retry_delay * 2 ** (attempt - 1)``
+seconds (or the gateway's ``Retry-After``, if longer), up to ``max_attempts``
+attempts, then mark the transaction ``FAILED``. A ``CircuitOpenError`` means the gateway was not called at all:
+the transaction is deferred until the circuit lets a trial request through,
+without counting an attempt. ``SyncBackend`` does not retry.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction as db_transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .gateways import CircuitOpenError
+from .models import PaymentTask, Transaction
+from .processing import fail_transaction, process_transaction
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_TASKS = getattr(settings, 'PAYMENT_TASKS', {})
+
+
+def retry_delay(base_delay, attempts):
+    """Số giây chờ trước lần thử kế tiếp, sau ``attempts`` lần thất bại."""
+    return base_delay * 2 ** (attempts - 1)
+
+
+def next_delay(base_delay, attempts, error):
+    """Backoff của hàng đợi, nhưng không sớm hơn ``retry_after`` mà gateway yêu cầu (``Retry-After``)."""
+    return max(retry_delay(base_delay, attempts), getattr(error, 'retry_after', None) or 0)
+
+
+class SyncBackend:
+    """Xử lý ngay sau khi commit, trong thread của request (không retry)."""
+    def enqueue(self, transaction):
+        db_transaction.on_commit(
+            lambda: self.run(transaction.id),
+            using=router.db_for_write(Transaction)
+        )
+
+    def run(self, transaction_id):
+        try:
+            process_transaction(transaction_id)
+        except Exception as e:
+            logger.exception("Payment processing failed for transaction %s", transaction_id)
+            fail_transaction(transaction_id, str(e))
+
+
+class ThreadPoolBackend:
+    """
+    Thread pool trong tiến trình, request trả về ngay sau khi commit. Lần thử
+    lại được hẹn bằng timer, không chiếm thread của pool trong lúc chờ.
+    """
+    def __init__(self, max_workers=8, max_attempts=5, retry_delay=5):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='payment-worker')
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def enqueue(self, transaction):
+        db_transaction.on_commit(
+            lambda: self.submit(transaction.id),
+            using=router.db_for_write(Transaction)
+        )
+
+    def submit(self, transaction_id, attempt=1):
+        self.executor.submit(self.run, transaction_id, attempt)
+
+    def run(self, transaction_id, attempt):
+        """Chạy ``process_transaction`` trong thread của pool (dọn connection DB cũ)."""
+        close_old_connections()
+        try:
+            process_transaction(transaction_id)
+        except CircuitOpenError as e:
+            logger.warning("Payment for transaction %s deferred: %s", transaction_id, e)
+            self.schedule(e.retry_after, transaction_id, attempt)
+        except Exception as e:
+            logger.exception("Payment processing failed for transaction %s (attempt %s)", transaction_id, attempt)
+            if attempt >= self.max_attempts:
+                fail_transaction(transaction_id, str(e))
+            else:
+                self.schedule(next_delay(self.retry_delay, attempt, e), transaction_id, attempt + 1)
+        finally:
+            close_old_connections()
+
+    def schedule(self, delay, transaction_id, attempt):
+        timer = threading.Timer(delay, self.submit, (transaction_id, attempt))
+        timer.daemon = True
+        timer.start()
+
+
+class DatabaseQueueBackend:
+    """
+    Hàng đợi ``PaymentTask`` trong DB cho nhiều tiến trình worker.
+
+    Task được nhận bằng UPDATE có điều kiện (``QUEUED -> RUNNING``), nên chạy
+    được trên PostgreSQL, MySQL lẫn SQLite; task ``RUNNING`` quá
+    ``VISIBILITY_TIMEOUT`` (worker chết) được đưa lại vào hàng đợi.
+    """
+    def __init__(self, max_attempts=5, visibility_timeout=300, retry_delay=5):
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self.retry_delay = retry_delay
+
+    def enqueue(self, transaction):
+        PaymentTask.objects.create(transaction_id=transaction.id)
+
+    def requeue_stale(self):
+        stale = timezone.now() - timedelta(seconds=self.visibility_timeout)
+        return PaymentTask.objects.filter(status='RUNNING', locked_at__lt=stale).update(
+            status='QUEUED', locked_by='', locked_at=None
+        )
+
+    def claim(self, worker_id, limit=10):
+        """Nhận tối đa ``limit`` task đang chờ cho ``worker_id``."""
+        now = timezone.now()
+        candidates = list(
+            PaymentTask.objects.filter(status='QUEUED', available_at__lte=now)
+            .order_by('available_at', 'id').values_list('id', flat=True)[:limit]
+        )
+        if not candidates:
+            return []
+        PaymentTask.objects.filter(id__in=candidates, status='QUEUED').update(
+            status='RUNNING', locked_by=worker_id, locked_at=now
+        )
+        # Chỉ những task mà worker này thực sự nhận được (worker khác có thể nhanh hơn)
+        return list(PaymentTask.objects.filter(id__in=candidates, status='RUNNING', locked_by=worker_id, locked_at=now))
+
+    def run(self, task):
+        try:
+            process_transaction(task.transaction_id)
+        except CircuitOpenError as e:
+            self.defer(task, e)
+            return
+        except Exception as e:
+            task.attempts += 1
+            task.last_error = str(e)
+            if task.attempts >= self.max_attempts:
+                task.status = 'FAILED'
+                fail_transaction(task.transaction_id, str(e))
+            else:
+                task.status = 'QUEUED'
+                task.available_at = timezone.now() + timedelta(seconds=next_delay(self.retry_delay, task.attempts, e))
+            task.locked_by = ''
+            task.locked_at = None
+            task.save(update_fields=[
+                'attempts', 'last_error', 'status', 'available_at', 'locked_by', 'locked_at', 'updated_at'
+            ])
+            logger.exception("Payment task %s failed (attempt %s)", task.id, task.attempts)
+            return
+        task.status = 'DONE'
+        task.save(update_fields=['status', 'updated_at'])
+
+    def defer(self, task, error):
+        """Đưa task lại hàng đợi sau ``error.retry_after`` giây, không tính là một lần thử."""
+        task.status = 'QUEUED'
+        task.last_error = str(error)
+        task.available_at = timezone.now() + timedelta(seconds=error.retry_after)
+        task.locked_by = ''
+        task.locked_at = None
+        task.save(update_fields=['last_error', 'status', 'available_at', 'locked_by', 'locked_at', 'updated_at'])
+        logger.warning("Payment task %s deferred %.0fs: %s", task.id, error.retry_after, error)
+
+    @staticmethod
+    def worker_id():
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def get_backend():
+    """Backend theo ``PAYMENT_TASKS['BACKEND']``, khởi tạo với ``PAYMENT_TASKS['OPTIONS']``."""
+    backend_class = import_string(PAYMENT_TASKS.get('BACKEND', 'payment.tasks.ThreadPoolBackend'))
+    return backend_class(**PAYMENT_TASKS.get('OPTIONS', {}))
+
+
+payment_queue = get_backend()
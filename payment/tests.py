@@ -1,3 +1,559 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connections, transaction as db_transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import viewsets
+from rest_framework.test import APIClient
+
+from .cache import payment_method_cache
+from .fake_gateway_server import FakeGatewayServer
+from .gateways import (
+    CircuitBreaker, CircuitOpenError, GatewayBusyError, GatewayError, GatewayRegistry, GatewayResult, HTTPGateway,
+    charge_lock_ttl, fake_gateway, gateway_registry,
+)
+from .models import PaymentGatewayConfig, PaymentMethod, PaymentTask, Refund, Transaction
+from .processing import process_transaction
+from .tasks import DatabaseQueueBackend, ThreadPoolBackend
+
+
+def make_transaction(order_id='ORD-1', provider='STRIPE'):
+    return SimpleNamespace(
+        order_id=order_id, amount=Decimal('12.50'), currency='USD', payment_method_id=1,
+        payment_method=SimpleNamespace(provider=provider),
+    )
+
+
+class HTTPGatewayTests(SimpleTestCase):
+    """
+    Adapter HTTP chạy với fake gateway server thật (qua socket).
+    """
+    def start_server(self, **kwargs):
+        server = FakeGatewayServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def make_gateway(self, server, **config):
+        gateway = HTTPGateway('STRIPE', {'base_url': server.url, 'backoff': 0, **config})
+        self.addCleanup(gateway.close)
+        return gateway
+
+    def test_charge_succeeds(self):
+        server = self.start_server()
+        result = self.make_gateway(server).charge(make_transaction())
+        self.assertTrue(result.success)
+        self.assertTrue(result.reference.startswith('ch_'))
+        self.assertEqual(result.response['gateway'], 'STRIPE')
+
+    def test_charge_is_idempotent_per_order(self):
+        server = self.start_server()
+        gateway = self.make_gateway(server)
+        first = gateway.charge(make_transaction())
+        second = gateway.charge(make_transaction())
+        self.assertEqual(first.reference, second.reference)
+        self.assertEqual(len(server.charges), 1)
+
+    def test_declined_charge(self):
+        server = self.start_server(failure_rate=1)
+        result = self.make_gateway(server).charge(make_transaction())
+        self.assertFalse(result.success)
+        self.assertEqual(result.error, 'Card declined')
+
+    def test_rate_limited_charge_is_retryable(self):
+        server = self.start_server(busy_status=429, retry_after=7)
+        gateway = self.make_gateway(server, failure_threshold=1)
+        with self.assertRaises(GatewayBusyError) as raised:
+            gateway.charge(make_transaction())
+        self.assertEqual(raised.exception.retry_after, 7)
+        # Gateway vẫn trả lời: không retry ngay, không mở circuit
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.CLOSED)
+
+        server.busy_status = None
+        self.assertTrue(gateway.charge(make_transaction()).success)
+
+    def test_only_declines_are_final(self):
+        gateway = HTTPGateway('STRIPE', {'base_url': 'http://gateway.invalid'})
+        self.addCleanup(gateway.close)
+        answers = {
+            402: {'error': 'Card declined'},
+            400: {'error': 'Card declined', 'decline_code': 'insufficient_funds'},
+        }
+        for status_code, data in answers.items():
+            response = mock.Mock(status_code=status_code, headers={}, json=mock.Mock(return_value=data))
+            with mock.patch.object(gateway, 'post', return_value=response):
+                self.assertFalse(gateway.charge(make_transaction()).success)
+
+        for status_code in (400, 401, 404):
+            response = mock.Mock(status_code=status_code, headers={}, json=mock.Mock(return_value={'error': 'Bad'}))
+            with mock.patch.object(gateway, 'post', return_value=response), \
+                    self.assertRaises(GatewayError), self.assertLogs('payment.gateways', 'ERROR'):
+                gateway.charge(make_transaction())
+
+    def test_time_budget_covers_every_attempt(self):
+        gateway = HTTPGateway('STRIPE', {
+            'base_url': 'http://gateway.invalid', 'connect_timeout': 2, 'read_timeout': 10,
+            'max_retries': 2, 'backoff': 0.5,
+        })
+        self.addCleanup(gateway.close)
+        # 3 lần thử x 12s + backoff tối đa 0.5s + 1s
+        self.assertEqual(gateway.time_budget(), 37.5)
+        with mock.patch.object(gateway_registry, 'charge_time_budget', return_value=gateway.time_budget()):
+            self.assertEqual(charge_lock_ttl(), 75.0)
+
+    def test_server_errors_are_retried(self):
+        server = self.start_server(error_rate=1)
+        with self.assertRaises(GatewayError):
+            self.make_gateway(server, max_retries=2).charge(make_transaction())
+        self.assertEqual(server.requests, 3)
+
+    def test_read_timeout(self):
+        server = self.start_server(latency=0.5)
+        with self.assertRaisesMessage(GatewayError, 'unavailable'):
+            self.make_gateway(server, read_timeout=0.05, max_retries=0).charge(make_transaction())
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        server = self.start_server(error_rate=1)
+        gateway = self.make_gateway(server, max_retries=0, failure_threshold=2, reset_timeout=60)
+        for order_id in ('ORD-1', 'ORD-2'):
+            with self.assertRaises(GatewayError):
+                gateway.charge(make_transaction(order_id))
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaisesMessage(CircuitOpenError, 'circuit open'):
+            gateway.charge(make_transaction('ORD-3'))
+        # Circuit mở: không gửi request tới gateway nữa
+        self.assertEqual(server.requests, 2)
+
+    def test_half_open_trial_closes_circuit(self):
+        server = self.start_server(error_rate=1)
+        gateway = self.make_gateway(server, max_retries=0, failure_threshold=1, reset_timeout=0)
+        with self.assertRaises(GatewayError):
+            gateway.charge(make_transaction('ORD-1'))
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.HALF_OPEN)
+
+        server.error_rate = 0
+        self.assertTrue(gateway.charge(make_transaction('ORD-2')).success)
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.CLOSED)
+
+
+class GatewayRegistryTests(TestCase):
+    databases = {'default', 'postgresql'}
+
+    def setUp(self):
+        self.registry = GatewayRegistry(reload_interval=3600)
+        self.addCleanup(self.registry.close)
+
+    def test_configs_are_loaded_once(self):
+        PaymentGatewayConfig.objects.create(gateway='STRIPE', config={'base_url': 'http://127.0.0.1:1'})
+        with self.assertNumQueries(1, using='postgresql'):
+            self.registry.get('STRIPE')
+            self.registry.get('STRIPE')
+        self.assertIsInstance(self.registry.for_transaction(make_transaction(provider='stripe')), HTTPGateway)
+
+    def test_no_gateway_configured(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.registry.for_transaction(make_transaction())
+        registry = GatewayRegistry(fake_fallback=True)
+        self.assertIs(registry.for_transaction(make_transaction()), fake_gateway)
+
+    def test_saving_a_config_invalidates_the_registry(self):
+        config = PaymentGatewayConfig.objects.create(gateway='PAYPAL', config={'base_url': 'http://127.0.0.1:1'})
+        gateway_registry.invalidate()
+        self.assertEqual(gateway_registry.get('PAYPAL').base_url, 'http://127.0.0.1:1')
+
+        config.config = {'base_url': 'http://127.0.0.1:2'}
+        config.save()
+        self.assertEqual(gateway_registry.get('PAYPAL').base_url, 'http://127.0.0.1:2')
+
+        config.is_active = False
+        config.save()
+        self.assertIsNone(gateway_registry.get('PAYPAL'))
+
+    def test_reload_keeps_unchanged_gateways(self):
+        PaymentGatewayConfig.objects.create(gateway='STRIPE', config={'base_url': 'http://127.0.0.1:1'})
+        paypal = PaymentGatewayConfig.objects.create(gateway='PAYPAL', config={'base_url': 'http://127.0.0.1:2'})
+        stripe = self.registry.get('STRIPE')
+        stripe.breaker.record_failure()
+        old_paypal = self.registry.get('PAYPAL')
+
+        paypal.config = {'base_url': 'http://127.0.0.1:3'}
+        paypal.save()
+        self.registry.invalidate()
+        with mock.patch.object(old_paypal, 'close') as close:
+            # Gateway không đổi config: cùng adapter, giữ session và trạng thái breaker
+            self.assertIs(self.registry.get('STRIPE'), stripe)
+            self.assertEqual(stripe.breaker.failures, 1)
+            self.assertEqual(self.registry.get('PAYPAL').base_url, 'http://127.0.0.1:3')
+        close.assert_called_once_with()
+
+    def test_replaced_gateway_closes_its_session_after_in_flight_requests(self):
+        gateway = HTTPGateway('STRIPE', {'base_url': 'http://127.0.0.1:1'})
+        response = mock.Mock(status_code=201)
+
+        def post(*args, **kwargs):
+            # Registry thay adapter trong lúc request đang chạy
+            gateway.close()
+            close_session.assert_not_called()
+            return response
+
+        with mock.patch.object(gateway.session, 'close') as close_session, \
+                mock.patch.object(gateway.session, 'post', side_effect=post):
+            self.assertIs(gateway.post('charges', {}, idempotency_key='ORD-1'), response)
+            close_session.assert_called_once_with()
+
+
+class PaymentTestMixin:
+    databases = {'default', 'postgresql'}
+
+    @classmethod
+    def setUpClass(cls):
+        # PaymentMethod / Transaction có FK tới Customer: bảng customer phải có
+        # trong database của payment (router chỉ tạo nó ở 'default')
+        connection = connections['postgresql']
+        customer = get_user_model()
+        if customer._meta.db_table not in connection.introspection.table_names():
+            with connection.schema_editor() as editor:
+                editor.create_model(customer)
+        super().setUpClass()
+
+    def create_transaction(self, amount='100.00', status='COMPLETED', user=None):
+        if user is None:
+            user = self.user
+        payment_method, _ = PaymentMethod.objects.get_or_create(
+            user_id=user.pk, payment_type='COD', account_number='0000', defaults={'provider': 'COD'}
+        )
+        return Transaction.objects.create(
+            user_id=user.pk, payment_method=payment_method, amount=Decimal(amount),
+            order_id=f"ORD-{Transaction.objects.count() + 1}", status=status,
+        )
+
+    def create_user(self, email):
+        user = get_user_model().objects.create(email=email)
+        get_user_model().objects.using('postgresql').create(id=user.id, email=email)
+        return user
+
+
+class RefundTests(PaymentTestMixin, TestCase):
+    def setUp(self):
+        self.user = self.create_user('refund@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_partial_refunds_use_decimal_and_write_the_ledger(self):
+        transaction = self.create_transaction('10.00')
+        for amount in ('0.10', '0.20', '9.70'):
+            response = self.client.post(
+                reverse('transaction-refund', args=[transaction.id]), {'amount': amount}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.refund_amount, Decimal('10.00'))
+        self.assertEqual(transaction.status, 'REFUNDED')
+        self.assertEqual(
+            sorted(Refund.objects.filter(transaction=transaction).values_list('amount', flat=True)),
+            [Decimal('0.10'), Decimal('0.20'), Decimal('9.70')],
+        )
+
+    def test_refund_cannot_exceed_amount(self):
+        transaction = self.create_transaction('10.00')
+        transaction.process_refund('6.00')
+        with self.assertRaises(ValueError):
+            transaction.process_refund('4.01')
+        response = self.client.post(
+            reverse('transaction-refund', args=[transaction.id]), {'amount': '-1'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Refund.objects.count(), 1)
+
+    def test_bulk_refund(self):
+        transactions = [self.create_transaction('20.00') for _ in range(5)]
+        pending = self.create_transaction('20.00', status='PENDING')
+        other = self.create_transaction('20.00', user=self.create_user('other@example.com'))
+        payload = {
+            'reason': 'Event cancelled',
+            'refunds': [{'transaction': t.id} for t in transactions[:4]] + [
+                {'transaction': transactions[4].id, 'amount': '5.00'},
+                {'transaction': transactions[4].id, 'amount': '20.00'},
+                {'transaction': pending.id},
+                {'transaction': other.id},
+            ],
+        }
+        with self.settings(DEBUG=False):
+            response = self.client.post(reverse('transaction-bulk-refund'), payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['refunded'], 5)
+        self.assertEqual(response.data['total_amount'], Decimal('85.00'))
+        self.assertEqual(
+            {item['transaction'] for item in response.data['failed']},
+            {transactions[4].id, pending.id, other.id},
+        )
+        self.assertEqual(Transaction.objects.filter(status='REFUNDED').count(), 4)
+        self.assertEqual(Refund.objects.filter(reason='Event cancelled').count(), 5)
+
+    def test_bulk_refund_batches(self):
+        transactions = [self.create_transaction('1.00') for _ in range(7)]
+        refunds, errors = Transaction.objects.bulk_refund(
+            [(t.id, None) for t in transactions], batch_size=3
+        )
+        self.assertEqual((len(refunds), errors), (7, {}))
+        self.assertFalse(Transaction.objects.exclude(status='REFUNDED').exists())
+
+
+class DefaultPaymentMethodTests(PaymentTestMixin, TestCase):
+    def setUp(self):
+        self.user = self.create_user('default@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.methods = [
+            PaymentMethod.objects.create(
+                user_id=self.user.pk, payment_type='COD', provider='COD', account_number=f'000{index}'
+            )
+            for index in range(3)
+        ]
+
+    def test_set_default_switches_the_default(self):
+        for method in self.methods:
+            response = self.client.post(reverse('payment-method-set-default', args=[method.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                list(PaymentMethod.objects.filter(user_id=self.user.pk, is_default=True).values_list('id', flat=True)),
+                [method.id],
+            )
+
+    def test_one_default_per_user(self):
+        PaymentMethod.objects.set_default(self.user.pk, self.methods[0].id)
+        with self.assertRaises(IntegrityError), db_transaction.atomic(using='postgresql'):
+            PaymentMethod.objects.filter(id=self.methods[1].id).update(is_default=True)
+
+    def test_saving_a_default_clears_the_previous_one(self):
+        self.methods[0].is_default = True
+        self.methods[0].save()
+        self.methods[1].is_default = True
+        self.methods[1].save()
+        self.assertEqual(PaymentMethod.objects.filter(user_id=self.user.pk, is_default=True).get(), self.methods[1])
+
+    def test_list_is_cached_until_a_write(self):
+        url = reverse('payment-method-list')
+        self.client.get(url)
+        with self.assertNumQueries(0, using='postgresql'):
+            response = self.client.get(url)
+        self.assertFalse(any(item['is_default'] for item in response.data['results']))
+
+        with self.captureOnCommitCallbacks(using='postgresql') as callbacks:
+            self.client.post(reverse('payment-method-set-default', args=[self.methods[2].id]))
+            # Chưa commit: version chưa đổi, danh sách cũ vẫn được dùng
+            response = self.client.get(url)
+            self.assertFalse(any(item['is_default'] for item in response.data['results']))
+        for callback in callbacks:
+            callback()
+        response = self.client.get(url)
+        self.assertEqual([item['id'] for item in response.data['results'] if item['is_default']], [self.methods[2].id])
+
+        with self.captureOnCommitCallbacks(using='postgresql', execute=True):
+            self.methods[0].delete()
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_list_read_before_a_version_bump_is_not_served(self):
+        url = reverse('payment-method-list')
+        list_view = viewsets.ModelViewSet.list
+
+        def list_then_write(view, request, *args, **kwargs):
+            response = list_view(view, request, *args, **kwargs)
+            # Một write commit giữa lúc đọc DB và lúc ghi cache
+            PaymentMethod.objects.filter(id=self.methods[0].id).update(is_active=False)
+            payment_method_cache.bump_version(self.user.pk)
+            return response
+
+        with mock.patch.object(viewsets.ModelViewSet, 'list', list_then_write):
+            self.assertTrue(all(item['is_active'] for item in self.client.get(url).data['results']))
+        response = self.client.get(url)
+        self.assertEqual(
+            [item['id'] for item in response.data['results'] if not item['is_active']], [self.methods[0].id]
+        )
+
+
+class ConcurrentRefundTests(PaymentTestMixin, TransactionTestCase):
+    """
+    Refund song song trên cùng một transaction không được vượt quá số tiền.
+    """
+    threads = 8
+
+    def setUp(self):
+        if any(connections[alias].vendor == 'sqlite' for alias in self.databases):
+            self.skipTest('SQLite has no row locks (SELECT ... FOR UPDATE)')
+        self.user = self.create_user('concurrent@example.com')
+
+    def refund(self, transaction_id):
+        try:
+            Transaction.objects.get(id=transaction_id).process_refund('3.00')
+            return True
+        except ValueError:
+            return False
+        finally:
+            connections.close_all()
+
+    def test_concurrent_refunds_do_not_over_refund(self):
+        transaction = self.create_transaction('10.00')
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            results = list(executor.map(self.refund, [transaction.id] * self.threads))
+
+        transaction.refresh_from_db()
+        self.assertEqual(results.count(True), 3)
+        self.assertEqual(transaction.refund_amount, Decimal('9.00'))
+        self.assertEqual(Refund.objects.filter(transaction=transaction).count(), 3)
+
+
+class PaymentQueueTests(PaymentTestMixin, TestCase):
+    """
+    Lỗi tạm thời của gateway được retry với backoff; chỉ decline hoặc hết số lần thử mới là FAILED.
+    """
+    def setUp(self):
+        self.user = self.create_user('queue@example.com')
+        self.transaction = self.create_transaction(status='PENDING')
+        self.gateway = mock.Mock()
+        get_gateway = mock.patch('payment.processing.get_gateway', return_value=self.gateway)
+        get_gateway.start()
+        self.addCleanup(get_gateway.stop)
+
+    def refresh(self):
+        self.transaction.refresh_from_db()
+        return self.transaction
+
+    def test_database_queue_retries_with_backoff_then_fails(self):
+        queue = DatabaseQueueBackend(max_attempts=3, retry_delay=10)
+        queue.enqueue(self.transaction)
+        self.gateway.charge.side_effect = GatewayError('STRIPE gateway unavailable')
+
+        for attempt, delay in ((1, 10), (2, 20)):
+            [task] = queue.claim('worker-1')
+            with self.assertLogs('payment.tasks', 'ERROR'):
+                queue.run(task)
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), ('QUEUED', attempt))
+            self.assertAlmostEqual((task.available_at - timezone.now()).total_seconds(), delay, delta=2)
+            # Transaction trả lại hàng đợi, chưa FAILED
+            self.assertEqual(self.refresh().status, 'PENDING')
+            # Chưa tới available_at: không worker nào nhận được task
+            self.assertEqual(queue.claim('worker-2'), [])
+            PaymentTask.objects.filter(id=task.id).update(available_at=timezone.now())
+
+        [task] = queue.claim('worker-1')
+        with self.assertLogs('payment.tasks', 'ERROR'):
+            queue.run(task)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('FAILED', 3))
+        self.assertEqual(self.refresh().status, 'FAILED')
+        self.assertEqual(self.transaction.error_message, 'STRIPE gateway unavailable')
+
+    def test_database_queue_completes_after_a_transient_error(self):
+        queue = DatabaseQueueBackend(retry_delay=0)
+        queue.enqueue(self.transaction)
+        self.gateway.charge.side_effect = [
+            GatewayError('timeout'), GatewayResult(success=True, reference='ch_1'),
+        ]
+        with self.assertLogs('payment.tasks', 'ERROR'):
+            for _ in range(2):
+                [task] = queue.claim('worker-1')
+                queue.run(task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'DONE')
+        self.assertEqual((self.refresh().status, self.transaction.transaction_id), ('COMPLETED', 'ch_1'))
+
+    def test_retry_waits_for_the_gateway_retry_after(self):
+        queue = DatabaseQueueBackend(retry_delay=5)
+        queue.enqueue(self.transaction)
+        self.gateway.charge.side_effect = GatewayBusyError('STRIPE gateway busy: 429', retry_after=60)
+        [task] = queue.claim('worker-1')
+        with self.assertLogs('payment.tasks', 'ERROR'):
+            queue.run(task)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('QUEUED', 1))
+        self.assertAlmostEqual((task.available_at - timezone.now()).total_seconds(), 60, delta=2)
+        self.assertEqual(self.refresh().status, 'PENDING')
+
+    def test_decline_is_final(self):
+        queue = DatabaseQueueBackend()
+        queue.enqueue(self.transaction)
+        self.gateway.charge.return_value = GatewayResult(success=False, error='Card declined')
+        [task] = queue.claim('worker-1')
+        queue.run(task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'DONE')
+        self.assertEqual(self.refresh().status, 'FAILED')
+        self.assertEqual(self.gateway.charge.call_count, 1)
+
+    def test_open_circuit_defers_without_using_an_attempt(self):
+        queue = DatabaseQueueBackend(max_attempts=1, retry_delay=5)
+        queue.enqueue(self.transaction)
+        self.gateway.charge.side_effect = CircuitOpenError('STRIPE gateway is unavailable', retry_after=30)
+
+        [task] = queue.claim('worker-1')
+        with self.assertLogs('payment.tasks', 'WARNING'):
+            queue.run(task)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('QUEUED', 0))
+        self.assertAlmostEqual((task.available_at - timezone.now()).total_seconds(), 30, delta=2)
+        self.assertEqual(self.refresh().status, 'PENDING')
+
+        queue = ThreadPoolBackend(max_workers=1, max_attempts=1)
+        queue.executor = mock.Mock()
+        with mock.patch('payment.tasks.close_old_connections'), \
+                mock.patch.object(queue, 'schedule') as schedule, self.assertLogs('payment.tasks', 'WARNING'):
+            queue.run(self.transaction.id, 1)
+        schedule.assert_called_once_with(30, self.transaction.id, 1)
+        self.assertEqual(self.refresh().status, 'PENDING')
+
+    def test_thread_pool_submits_on_commit_and_schedules_retries(self):
+        queue = ThreadPoolBackend(max_workers=1, max_attempts=2, retry_delay=10)
+        queue.executor = mock.Mock()
+        self.gateway.charge.side_effect = GatewayError('timeout')
+
+        with self.captureOnCommitCallbacks(using='postgresql', execute=True):
+            queue.enqueue(self.transaction)
+            # Chưa commit: worker chưa được giao transaction
+            queue.executor.submit.assert_not_called()
+        queue.executor.submit.assert_called_once_with(queue.run, self.transaction.id, 1)
+
+        with mock.patch('payment.tasks.close_old_connections'), \
+                mock.patch.object(queue, 'schedule') as schedule, self.assertLogs('payment.tasks', 'ERROR'):
+            queue.run(self.transaction.id, 1)
+            schedule.assert_called_once_with(10, self.transaction.id, 2)
+            self.assertEqual(self.refresh().status, 'PENDING')
+
+            queue.run(self.transaction.id, 2)
+            self.assertEqual(schedule.call_count, 1)
+        self.assertEqual(self.refresh().status, 'FAILED')
+
+    def test_cancel_during_the_charge_is_kept(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('transaction-cancel', args=[self.transaction.id])
+
+        def charge(transaction):
+            # Transaction đang PROCESSING: cancel bị từ chối
+            self.assertEqual(client.post(url).status_code, 409)
+            # Giả lập cancel vừa kịp ghi trước kết quả của gateway
+            Transaction.objects.filter(id=transaction.id).update(status='CANCELLED')
+            return GatewayResult(success=True, reference='ch_1')
+
+        self.gateway.charge.side_effect = charge
+        with self.assertLogs('payment.processing', 'ERROR'):
+            self.assertIsNone(process_transaction(self.transaction.id))
+        self.assertEqual((self.refresh().status, self.transaction.transaction_id), ('CANCELLED', None))
+
+    def test_cancel_pending_transaction(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('transaction-cancel', args=[self.transaction.id]))
+        self.assertEqual((response.status_code, response.data['status']), (200, 'CANCELLED'))
+        self.assertIsNone(process_transaction(self.transaction.id))
+        self.gateway.charge.assert_not_called()
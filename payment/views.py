@@ -3,11 +3,32 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.db import router, transaction as db_transaction
+from django.utils import timezone
 from .models import PaymentMethod, Transaction, PaymentGatewayConfig
-from .serializers import PaymentMethodSerializer, TransactionSerializer
+from .processing import FINAL_STATUSES, PAYMENT_TASKS, status_notifier
+from .cache import payment_method_cache
+from .gateways import charge_lock_ttl
+from .tasks import payment_queue
+from .serializers import (
+    BulkRefundSerializer, PaymentMethodSerializer, RefundRequestSerializer, RefundSerializer,
+    TransactionSerializer
+)
+from ecommerce.fieldsets import SparseFieldsetMixin
+from ecommerce.idempotency import idempotent
+from ecommerce.pagination import CreatedAtKeysetPagination
+from decimal import Decimal
+import time
 import uuid
 
+# Long-poll của endpoint status: thời gian chờ tối đa và chu kỳ đọc lại DB (giây)
+LONG_POLL_MAX_WAIT = PAYMENT_TASKS.get('LONG_POLL_MAX_WAIT', 30)
+LONG_POLL_INTERVAL = PAYMENT_TASKS.get('LONG_POLL_INTERVAL', 0.5)
+# Số refund mỗi transaction DB của bulk refund
+BULK_REFUND_BATCH_SIZE = getattr(settings, 'BULK_REFUND_BATCH_SIZE', 500)
+
 # Create your views here.
 
 class PaymentMethodViewSet(viewsets.ModelViewSet):
@@ -15,7 +36,21 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return PaymentMethod.objects.filter(user=self.request.user)
+        queryset = PaymentMethod.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+        if self.action == 'list':
+            # Danh sách sẽ được cache: đọc từ primary, không cache dữ liệu replica đang trễ
+            queryset = queryset.using(router.db_for_write(PaymentMethod))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Danh sách được cache theo user, invalidate khi payment method thay đổi
+        cache_key = payment_method_cache.make_key(request.user.pk, request.META.get('QUERY_STRING', ''))
+        data = payment_method_cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        payment_method_cache.set(cache_key, response.data)
+        return response
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -23,8 +58,11 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def set_default(self, request, pk=None):
         payment_method = self.get_object()
-        payment_method.is_default = True
-        payment_method.save()
+        if not PaymentMethod.objects.set_default(request.user.pk, payment_method.pk):
+            return Response(
+                {'error': 'Inactive payment method cannot be the default'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response({'status': 'Default payment method set.'})
 
     @action(detail=True, methods=['post'])
@@ -34,13 +72,15 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         payment_method.save()
         return Response({'status': 'Payment method deactivated.'})
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
+        return Transaction.objects.filter(user=self.request.user).select_related('payment_method')
 
+    @idempotent('payment.transaction', lock_ttl=charge_lock_ttl)
     def create(self, request, *args, **kwargs):
         # Add order_id and user to the request data
         data = request.data.copy()
@@ -50,7 +90,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
 
-        # Process payment through payment gateway
+        # Queue the payment; the gateway call happens in a payment worker
         try:
             transaction = self._process_payment(serializer.validated_data)
             return Response(
@@ -65,54 +105,99 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
     def _process_payment(self, validated_data):
         # Create transaction with pending status
-        transaction = Transaction.objects.create(
-            **validated_data,
-            status='PENDING'
-        )
-
+        # (Customer nằm ở database khác nên chỉ gán user_id)
+        user = validated_data.pop('user')
+        with db_transaction.atomic(using=router.db_for_write(Transaction)):
+            transaction = Transaction.objects.create(
+                **validated_data,
+                user_id=user.pk,
+                status='PENDING'
+            )
+            payment_queue.enqueue(transaction)
+        return transaction
+
+    @action(detail=True, methods=['get'], url_path='status')
+    def payment_status(self, request, pk=None):
+        """
+        Trạng thái xử lý của transaction. ``?wait=<giây>`` long-poll cho tới khi
+        transaction có kết quả (COMPLETED / FAILED / ...) hoặc hết thời gian chờ.
+        """
         try:
-            # Here you would integrate with your payment gateway
-            # For example, Stripe, PayPal, etc.
-            # This is a placeholder for the actual payment processing
-            payment_successful = True  # Replace with actual payment processing
-
-            if payment_successful:
-                transaction.status = 'COMPLETED'
-                transaction.transaction_id = f"TXN-{uuid.uuid4().hex[:16].upper()}"
-            else:
-                transaction.status = 'FAILED'
-                transaction.error_message = "Payment processing failed"
-
-            transaction.save()
-            return transaction
+            wait = min(max(float(request.query_params.get('wait', 0)), 0), LONG_POLL_MAX_WAIT)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid wait value'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        except Exception as e:
-            transaction.status = 'FAILED'
-            transaction.error_message = str(e)
-            transaction.save()
-            raise
+        queryset = self.get_queryset().select_related(None).only(
+            'id', 'order_id', 'status', 'transaction_id', 'error_message', 'updated_at'
+        )
+        transaction = get_object_or_404(queryset, pk=pk)
+        deadline = time.monotonic() + wait
+        while transaction.status not in FINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            status_notifier.wait(min(remaining, LONG_POLL_INTERVAL))
+            transaction = queryset.get(pk=pk)
+
+        return Response({
+            'id': transaction.id,
+            'order_id': transaction.order_id,
+            'status': transaction.status,
+            'transaction_id': transaction.transaction_id,
+            'error_message': transaction.error_message,
+            'updated_at': transaction.updated_at,
+        })
 
     @action(detail=True, methods=['post'])
     def refund(self, request, pk=None):
         transaction = self.get_object()
-        amount = request.data.get('amount')
-
-        if not amount:
-            return Response(
-                {'error': 'Refund amount is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        serializer = RefundRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
         try:
-            amount = float(amount)
-            transaction.process_refund(amount)
+            transaction.process_refund(**serializer.validated_data)
             return Response(TransactionSerializer(transaction).data)
-        except (ValueError, TypeError) as e:
+        except ValueError as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=True, methods=['get'])
+    def refunds(self, request, pk=None):
+        transaction = self.get_object()
+        return Response(RefundSerializer(transaction.refunds.all(), many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-refund')
+    def bulk_refund(self, request):
+        """
+        Refund hàng loạt (hủy đơn hàng loạt): ``{"refunds": [{"transaction": id,
+        "amount": "10.00"}, ...], "reason": "..."}``, xử lý theo batch.
+        Staff có thể refund transaction của mọi user.
+        """
+        serializer = BulkRefundSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        queryset = Transaction.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(user=request.user)
+        refunds, errors = queryset.bulk_refund(
+            [(item['transaction'], item.get('amount')) for item in serializer.validated_data['refunds']],
+            reason=serializer.validated_data['reason'],
+            batch_size=BULK_REFUND_BATCH_SIZE,
+        )
+        return Response({
+            'refunded': len(refunds),
+            'total_amount': sum((refund.amount for refund in refunds), Decimal('0.00')),
+            'failed': [
+                {'transaction': transaction_id, 'error': error}
+                for transaction_id, error in errors.items()
+            ],
+        })
+
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         transaction = self.get_object()
@@ -122,6 +207,16 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        transaction.status = 'CANCELLED'
-        transaction.save()
+        # Chỉ cancel khi còn PENDING: worker có thể vừa nhận transaction để charge
+        cancelled = Transaction.objects.filter(pk=transaction.pk, status='PENDING').update(
+            status='CANCELLED', updated_at=timezone.now()
+        )
+        transaction.refresh_from_db()
+        if not cancelled:
+            return Response(
+                {'error': 'Transaction is being processed and can no longer be cancelled',
+                 'status': transaction.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        status_notifier.notify()
         return Response(TransactionSerializer(transaction).data)
@@ -1,6 +1,7 @@
 from django.db import models
 from mongoengine import Document, StringField, DecimalField, IntField, DateTimeField, BooleanField, EmbeddedDocument, EmbeddedDocumentField, ListField, ReferenceField
 from datetime import datetime
+from .rates import rate_table
 
 # Create your models here.
 
@@ -31,6 +32,17 @@ class ShippingMethod(Document):
     def __str__(self):
         return f"{self.carrier} - {self.name} ({self.estimated_days} days)"
 
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        # Bảng giá trong bộ nhớ chứa method đã serialize sẵn
+        rate_table.invalidate()
+        return result
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        rate_table.invalidate()
+        return result
+
 class ShippingRate(Document):
     shipping_method = ReferenceField(ShippingMethod, required=True)
     country = StringField(required=True)
@@ -51,10 +63,17 @@ class ShippingRate(Document):
     }
 
     def calculate_shipping_cost(self, weight):
-        if weight < self.min_weight or weight > self.max_weight:
+        if weight < self.min_weight or (self.max_weight is not None and weight > self.max_weight):
             raise ValueError("Weight is outside acceptable range")
         return self.base_rate + (weight * self.weight_rate)
 
     def save(self, *args, **kwargs):
         self.updated_at = datetime.utcnow()
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+        rate_table.invalidate()
+        return result
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        rate_table.invalidate()
+        return result
@@ -0,0 +1,187 @@
+"""
+In-memory shipping rate table.
+
+All active ``ShippingRate`` documents are compiled once into a table keyed by
+country. Each country holds the sorted weight bracket boundaries together
+with the rates that apply at and between them, and every rate carries its
+``ShippingMethod`` already serialized. A quote is then a dict lookup plus a
+``bisect``, with no MongoDB I/O.
+
+``ShippingRate`` / ``ShippingMethod`` ``save`` and ``delete`` invalidate the
+table, which is rebuilt (two queries) on the next quote. The invalidation
+bumps a version in the shared cache (``SHIPPING_RATE_TABLE['CACHE_ALIAS']``,
+``shared`` by default); every process re-reads it at most every
+``CHECK_INTERVAL`` seconds before a quote and rebuilds when it changed, so an
+admin edit reaches all workers within that delay. Writes through
+``QuerySet.update`` do not invalidate it; ``RELOAD_INTERVAL`` bounds how stale
+the table can get then.
+"""
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+
+SHIPPING_RATE_TABLE = getattr(settings, 'SHIPPING_RATE_TABLE', {})
+
+CENTS = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class CompiledRate:
+    method_id: str
+    min_weight: Decimal
+    max_weight: Decimal  # None: không giới hạn
+    base_rate: Decimal
+    weight_rate: Decimal
+    method: dict  # ShippingMethodSerializer(...).data
+    estimated_days: int
+
+    def cost(self, weight):
+        return (self.base_rate + weight * self.weight_rate).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+    def option(self, weight):
+        return {
+            'shipping_method': self.method,
+            'cost': self.cost(weight),
+            'estimated_days': self.estimated_days,
+        }
+
+
+class CountryRates:
+    """
+    Các rate của một country. ``bounds`` là các mốc min/max weight đã sắp xếp;
+    ``at_bound[i]`` là các rate áp dụng đúng tại ``bounds[i]``, ``between[i]``
+    là các rate áp dụng trong khoảng mở ``(bounds[i-1], bounds[i])``
+    (``between[0]``: dưới mốc đầu, ``between[-1]``: trên mốc cuối).
+    """
+    def __init__(self, rates):
+        self.bounds = sorted(
+            {rate.min_weight for rate in rates}
+            | {rate.max_weight for rate in rates if rate.max_weight is not None}
+        )
+        self.at_bound = [
+            tuple(rate for rate in rates if self.covers(rate, bound, bound))
+            for bound in self.bounds
+        ]
+        self.between = [()] + [
+            tuple(rate for rate in rates if self.covers(rate, low, high))
+            for low, high in zip(self.bounds, self.bounds[1:])
+        ] + [
+            tuple(rate for rate in rates if self.covers(rate, self.bounds[-1], None))
+        ]
+
+    @staticmethod
+    def covers(rate, low, high):
+        """Rate áp dụng cho cả đoạn ``[low, high]`` (``high=None``: vô hạn)."""
+        if rate.min_weight > low:
+            return False
+        if rate.max_weight is None:
+            return True
+        return high is not None and rate.max_weight >= high
+
+    def lookup(self, weight):
+        index = bisect_left(self.bounds, weight)
+        if index < len(self.bounds) and self.bounds[index] == weight:
+            return self.at_bound[index]
+        return self.between[index]
+
+
+class ShippingRateTable:
+    version_key = 'shipping-rate-table-version'
+
+    def __init__(self, reload_interval=300, cache_alias='shared', check_interval=1):
+        self.reload_interval = reload_interval
+        self.cache_alias = cache_alias
+        self.check_interval = check_interval
+        self._countries = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def shared_cache(self):
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    def countries(self):
+        now = time.monotonic()
+        countries = self._countries
+        if countries is not None and now - self._checked_at < self.check_interval \
+                and now - self._loaded_at <= self.reload_interval:
+            return countries
+        version = self.shared_cache.get(self.version_key, 0)
+        with self._lock:
+            if self._countries is None or self._version != version or now - self._loaded_at > self.reload_interval:
+                self._countries = self.build()
+                self._version = version
+                self._loaded_at = now
+            self._checked_at = now
+            return self._countries
+
+    @staticmethod
+    def build():
+        """Một query cho các method active, một query cho các rate active."""
+        from .models import ShippingMethod, ShippingRate
+        from .serializers import ShippingMethodSerializer
+
+        methods = {method.id: method for method in ShippingMethod.objects(is_active=True)}
+        serialized = {
+            method_id: ShippingMethodSerializer(method).data for method_id, method in methods.items()
+        }
+        by_country = {}
+        for rate in ShippingRate.objects(is_active=True).no_dereference():
+            method_id = rate.shipping_method.id if rate.shipping_method is not None else None
+            if method_id not in methods:
+                continue
+            by_country.setdefault(rate.country, []).append(CompiledRate(
+                method_id=str(method_id),
+                min_weight=Decimal(str(rate.min_weight or 0)),
+                max_weight=None if rate.max_weight is None else Decimal(str(rate.max_weight)),
+                base_rate=Decimal(str(rate.base_rate)),
+                weight_rate=Decimal(str(rate.weight_rate)),
+                method=serialized[method_id],
+                estimated_days=methods[method_id].estimated_days,
+            ))
+        return {country: CountryRates(rates) for country, rates in by_country.items()}
+
+    def invalidate(self):
+        """Build lại ở lần quote kế tiếp, trong mọi tiến trình (version trong shared cache)."""
+        self.shared_cache.set(self.version_key, time.time_ns(), None)
+        with self._lock:
+            self._countries = None
+
+    def quote(self, country, weight, shipping_method=None):
+        """
+        Các lựa chọn vận chuyển cho ``(country, weight)``, rẻ nhất trước.
+        ``shipping_method`` (id) lọc theo một method.
+        """
+        weight = Decimal(str(weight))
+        rates = self.countries().get(country)
+        if rates is None:
+            return []
+        matches = rates.lookup(weight)
+        if shipping_method is not None:
+            matches = [rate for rate in matches if rate.method_id == str(shipping_method)]
+        return sorted((rate.option(weight) for rate in matches), key=lambda option: option['cost'])
+
+    def quote_many(self, quotes):
+        """``quotes``: các dict ``country`` / ``weight`` / ``shipping_method`` (tùy chọn)."""
+        return [
+            {
+                'country': quote['country'],
+                'weight': quote['weight'],
+                'shipping_options': self.quote(quote['country'], quote['weight'], quote.get('shipping_method')),
+            }
+            for quote in quotes
+        ]
+
+
+rate_table = ShippingRateTable(
+    reload_interval=SHIPPING_RATE_TABLE.get('RELOAD_INTERVAL', 300),
+    cache_alias=SHIPPING_RATE_TABLE.get('CACHE_ALIAS', 'shared'),
+    check_interval=SHIPPING_RATE_TABLE.get('CHECK_INTERVAL', 1),
+)
@@ -1 +1,30 @@
- 
\ No newline at end of file
+from decimal import Decimal
+from rest_framework import serializers
+from rest_framework_mongoengine.serializers import DocumentSerializer, EmbeddedDocumentSerializer
+from .models import Address, ShippingMethod, ShippingRate
+
+class ShippingMethodSerializer(DocumentSerializer):
+    class Meta:
+        model = ShippingMethod
+        fields = '__all__'
+
+class ShippingRateSerializer(DocumentSerializer):
+    class Meta:
+        model = ShippingRate
+        fields = '__all__'
+
+class AddressSerializer(EmbeddedDocumentSerializer):
+    class Meta:
+        model = Address
+        fields = '__all__'
+
+class ShippingQuoteSerializer(serializers.Serializer):
+    country = serializers.CharField(max_length=100)
+    weight = serializers.DecimalField(max_digits=10, decimal_places=3, min_value=Decimal('0'))
+    # Tùy chọn: chỉ báo giá cho một shipping method
+    shipping_method = serializers.CharField(max_length=50, required=False)
+
+class BatchShippingQuoteSerializer(serializers.Serializer):
+    MAX_QUOTES = 1000
+
+    quotes = ShippingQuoteSerializer(many=True, allow_empty=False, max_length=MAX_QUOTES)
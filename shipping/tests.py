@@ -1,3 +1,75 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from .rates import CompiledRate, CountryRates, ShippingRateTable
+
+
+def make_rate(method_id, min_weight, max_weight, base_rate='0', weight_rate='1'):
+    return CompiledRate(
+        method_id=method_id,
+        min_weight=Decimal(min_weight),
+        max_weight=None if max_weight is None else Decimal(max_weight),
+        base_rate=Decimal(base_rate),
+        weight_rate=Decimal(weight_rate),
+        method={'id': method_id},
+        estimated_days=1,
+    )
+
+
+class CountryRatesTests(SimpleTestCase):
+    """
+    Tra cứu theo khoảng cân nặng phải giống với điều kiện min_weight <= weight <= max_weight.
+    """
+    def setUp(self):
+        self.rates = [
+            make_rate('standard', '0', '10'),
+            make_rate('standard-heavy', '10', None),
+            make_rate('express', '0', '5'),
+            make_rate('bulky', '2.5', '7.5'),
+        ]
+        self.table = CountryRates(self.rates)
+
+    def expected(self, weight):
+        return {
+            rate.method_id for rate in self.rates
+            if rate.min_weight <= weight and (rate.max_weight is None or weight <= rate.max_weight)
+        }
+
+    def test_lookup_matches_bracket_conditions(self):
+        for weight in ('0', '0.01', '2.5', '3', '5', '5.01', '7.5', '9.99', '10', '10.01', '1000'):
+            weight = Decimal(weight)
+            with self.subTest(weight=weight):
+                self.assertEqual({rate.method_id for rate in self.table.lookup(weight)}, self.expected(weight))
+
+    def test_weight_below_every_bracket(self):
+        table = CountryRates([make_rate('standard', '1', '10')])
+        self.assertEqual(table.lookup(Decimal('0.5')), ())
+
+    def test_cost_is_decimal(self):
+        rate = make_rate('standard', '0', '10', base_rate='2.10', weight_rate='0.35')
+        self.assertEqual(rate.cost(Decimal('3')), Decimal('3.15'))
+
+
+class ShippingRateTableTests(TestCase):
+    """
+    Invalidate ở một worker làm các worker khác build lại bảng giá.
+    """
+    def test_invalidation_reaches_other_workers(self):
+        self.addCleanup(caches['shared'].clear)
+        worker_a = ShippingRateTable(check_interval=0)
+        worker_b = ShippingRateTable(check_interval=0)
+        with mock.patch.object(ShippingRateTable, 'build', return_value={}) as build:
+            worker_a.quote('VN', 1)
+            worker_b.quote('VN', 1)
+            worker_b.quote('VN', 1)
+            self.assertEqual(build.call_count, 2)
+
+            worker_a.invalidate()
+            worker_b.quote('VN', 1)
+            self.assertEqual(build.call_count, 3)
+            worker_a.quote('VN', 1)
+            self.assertEqual(build.call_count, 4)
@@ -1 +1,12 @@
- 
\ No newline at end of file
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import AddressViewSet, ShippingMethodViewSet, ShippingRateViewSet
+
+router = DefaultRouter()
+router.register(r'methods', ShippingMethodViewSet, basename='shipping-method')
+router.register(r'rates', ShippingRateViewSet, basename='shipping-rate')
+router.register(r'addresses', AddressViewSet, basename='address')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -3,14 +3,20 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.shortcuts import get_object_or_404
+from rest_framework_mongoengine.viewsets import ModelViewSet
+from ecommerce.mixins import LazyQuerySet
 from .models import ShippingMethod, ShippingRate
-from .serializers import ShippingMethodSerializer, ShippingRateSerializer, AddressSerializer
+from .rates import rate_table
+from .serializers import (
+    AddressSerializer, BatchShippingQuoteSerializer, ShippingMethodSerializer, ShippingQuoteSerializer,
+    ShippingRateSerializer
+)
 
 # Create your views here.
 
-class ShippingMethodViewSet(viewsets.ModelViewSet):
-    queryset = ShippingMethod.objects.all()
+class ShippingMethodViewSet(ModelViewSet):
+    lookup_field = 'id'  # MongoEngine sử dụng id dạng ObjectId
+    queryset = LazyQuerySet(ShippingMethod)
     serializer_class = ShippingMethodSerializer
     permission_classes = [IsAuthenticated]
 
@@ -20,7 +26,7 @@ class ShippingMethodViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
     @action(detail=True, methods=['post'])
-    def toggle_active(self, request, pk=None):
+    def toggle_active(self, request, id=None):
         shipping_method = self.get_object()
         shipping_method.is_active = not shipping_method.is_active
         shipping_method.save()
@@ -29,8 +35,9 @@ class ShippingMethodViewSet(viewsets.ModelViewSet):
             'is_active': shipping_method.is_active
         })
 
-class ShippingRateViewSet(viewsets.ModelViewSet):
-    queryset = ShippingRate.objects.all()
+class ShippingRateViewSet(ModelViewSet):
+    lookup_field = 'id'
+    queryset = LazyQuerySet(ShippingRate)
     serializer_class = ShippingRateSerializer
     permission_classes = [IsAuthenticated]
 
@@ -49,58 +56,39 @@ class ShippingRateViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def calculate_shipping(self, request):
         """Calculate shipping cost for given weight and destination."""
-        country = request.data.get('country')
-        weight = request.data.get('weight')
-
-        if not country or not weight:
+        if not request.data.get('country') or request.data.get('weight') in (None, ''):
             return Response(
                 {'error': 'Both country and weight are required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        try:
-            weight = float(weight)
-        except ValueError:
+        serializer = ShippingQuoteSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response(
-                {'error': 'Invalid weight value'},
+                {'error': 'Invalid weight value', 'errors': serializer.errors},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Find all applicable shipping rates for the country
-        shipping_rates = ShippingRate.objects.filter(
-            country=country,
-            is_active=True,
-            min_weight__lte=weight,
-            max_weight__gte=weight
-        )
-
-        if not shipping_rates:
+        # Báo giá từ bảng giá trong bộ nhớ (không truy vấn MongoDB)
+        quote = rate_table.quote_many([serializer.validated_data])[0]
+        if not quote['shipping_options']:
             return Response(
                 {'error': 'No shipping options available for the specified criteria'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(quote)
 
-        # Calculate costs for all available shipping methods
-        shipping_options = []
-        for rate in shipping_rates:
-            try:
-                cost = rate.calculate_shipping_cost(weight)
-                shipping_options.append({
-                    'shipping_method': ShippingMethodSerializer(rate.shipping_method).data,
-                    'cost': cost,
-                    'estimated_days': rate.shipping_method.estimated_days
-                })
-            except ValueError as e:
-                continue
-
-        return Response({
-            'country': country,
-            'weight': weight,
-            'shipping_options': shipping_options
-        })
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """
+        Báo giá nhiều cặp (country, weight) một lần cho trang cart / checkout:
+        ``{"quotes": [{"country": "VN", "weight": "1.5"}, ...]}``.
+        """
+        serializer = BatchShippingQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': rate_table.quote_many(serializer.validated_data['quotes'])})
 
     @action(detail=True, methods=['post'])
-    def toggle_active(self, request, pk=None):
+    def toggle_active(self, request, id=None):
         shipping_rate = self.get_object()
         shipping_rate.is_active = not shipping_rate.is_active
         shipping_rate.save()
@@ -1,7 +1,8 @@
 from rest_framework_mongoengine.serializers import DocumentSerializer
+from ecommerce.fieldsets import SparseFieldsetSerializerMixin
 from .models import Shoe
 
-class ShoeSerializer(DocumentSerializer):
+class ShoeSerializer(SparseFieldsetSerializerMixin, DocumentSerializer):
     class Meta:
         model = Shoe
         fields = '__all__'
@@ -3,34 +3,64 @@ from rest_framework_mongoengine.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from ecommerce.fieldsets import SparseFieldsetMixin
+from ecommerce.filters import CatalogFilterMixin, CatalogFilterSet
+from ecommerce.mixins import BatchRetrieveMixin, LazyQuerySet
+from ecommerce.pagination import CreatedKeysetPagination, StandardResultsSetPagination
+from ecommerce.product_cache import product_cache
+from ecommerce.search import search_backend
 from .models import Shoe
 from .serializers import ShoeSerializer
 
-class ShoeViewSet(ModelViewSet):
+class ShoeViewSet(SparseFieldsetMixin, CatalogFilterMixin, BatchRetrieveMixin, ModelViewSet):
     serializer_class = ShoeSerializer
     lookup_field = 'id'  # MongoEngine sử dụng id dạng ObjectId
-    queryset = Shoe.objects.all()
+    queryset = LazyQuerySet(Shoe)
+    pagination_class = CreatedKeysetPagination
+    filterset = CatalogFilterSet(
+        Shoe,
+        filters={
+            'brand': 'in',
+            'size': ('in', 'range'),
+            'color': 'in',
+            'available': 'bool',
+            'price': 'range',
+        },
+        ordering=('price', 'created', 'size'),
+        facets=('brand', 'size', 'color'),
+        price_buckets=(0, 50, 100, 200, 500),
+    )
 
     def perform_create(self, serializer):
         # Thiết lập thời gian tạo và cập nhật
         serializer.validated_data['created'] = serializer.validated_data.get('created', None) or datetime.datetime.now()
         serializer.validated_data['updated'] = datetime.datetime.now()
         serializer.save()
+        search_backend.update(serializer.instance)
 
     def perform_update(self, serializer):
         serializer.validated_data['updated'] = datetime.datetime.now()
         serializer.save()
+        search_backend.update(serializer.instance)
+        product_cache.invalidate('shoes', serializer.instance.id)
 
-    @action(detail=False, methods=['get'])
+    def perform_destroy(self, instance):
+        search_backend.remove(type(instance), instance.id)
+        product_cache.invalidate('shoes', instance.id)
+        instance.delete()
+
+    @action(detail=False, methods=['get'], pagination_class=StandardResultsSetPagination)
     def search(self, request):
         """
         Tìm kiếm giày theo tên hoặc thương hiệu.
         Ví dụ: /api/shoes/search/?q=Nike
+        Kết quả được sắp xếp theo độ liên quan và phân trang (?page=).
         """
         query = request.query_params.get('q', '')
         if not query:
             return Response({"detail": "Vui lòng cung cấp tham số tìm kiếm 'q'."}, status=status.HTTP_400_BAD_REQUEST)
-        # Tìm kiếm theo tên sản phẩm hoặc thương hiệu (không phân biệt hoa thường)
-        shoes = Shoe.objects.filter(name__icontains=query) | Shoe.objects.filter(brand__icontains=query)
-        serializer = self.get_serializer(shoes, many=True)
-        return Response(serializer.data)
+        # Tìm kiếm full-text (không phân biệt hoa thường và dấu), xếp theo độ liên quan
+        shoes = search_backend.search(Shoe, query)
+        page = self.paginate_queryset(shoes)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)